@@ -0,0 +1,144 @@
+# autenticacion/autenticacion.py
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .credenciales import (
+    credencial_verificada, hash_vigente, limite_superado, olvidar_credenciales, recordar_credencial,
+    registrar_fallo,
+)
+from .identidad import RELACIONES, guardar_identidad, identidad_cacheada, identidad_desde_usuario
+from .tokens import identidad_desde_token
+
+
+class JWTConIdentidadAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` que deja resuelta la identidad del usuario.
+
+    Si la identidad está en caché solo se lee ``auth_user``; si no, el
+    usuario se carga junto con su perfil, paciente y médico en una sola
+    consulta y la identidad se guarda en caché para las siguientes.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        identidad = identidad_cacheada(user_id)
+        usuarios = self.user_model.objects.all()
+        if identidad is None:
+            usuarios = usuarios.select_related(*RELACIONES)
+
+        try:
+            user = usuarios.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        if identidad is None:
+            identidad = identidad_desde_usuario(user)
+            guardar_identidad(identidad)
+        user._identidad = identidad
+        return user
+
+
+class JWTSinEstadoAuthentication(JWTConIdentidadAuthentication):
+    """
+    Autenticación JWT sin cargar el usuario para tokens emitidos con la
+    identidad en sus claims (ver autenticacion/tokens.py).
+
+    Devuelve un ``TokenUser`` (id y username del token, sin modelo detrás)
+    con la identidad resuelta: solo sirve para vistas que autorizan con
+    ``obtener_identidad`` y no usan ``request.user`` como modelo. Si el token
+    no trae la identidad, si esta cambió después de emitirlo o si el
+    usuario no está activo, se resuelve como en
+    ``JWTConIdentidadAuthentication``.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            identidad = identidad_desde_token(validated_token)
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if identidad is None:
+            return super().get_user(validated_token)
+
+        user = TokenUser(validated_token)
+        user._identidad = identidad
+        return user
+
+
+class BasicCacheadaAuthentication(BasicAuthentication):
+    """
+    ``BasicAuthentication`` que no repite la verificación de la contraseña
+    (PBKDF2) mientras la credencial siga en caché, y que corta con 429 los
+    intentos fallidos repetidos por IP o usuario (ver
+    autenticacion/credenciales.py). Con la credencial en caché solo se lee
+    ``auth_user``.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        verificada = credencial_verificada(userid, password)
+        if verificada is not None:
+            user_model = get_user_model()
+            user = user_model._default_manager.filter(**{user_model.USERNAME_FIELD: userid}).first()
+            user_id, huella_hash = verificada
+            if user is not None and user.pk == user_id and user.is_active and hash_vigente(user, huella_hash):
+                return (user, None)
+            olvidar_credenciales(userid)
+
+        if request is not None and limite_superado(request, userid):
+            raise exceptions.Throttled(
+                wait=settings.CREDENCIALES_BASIC['VENTANA_SEGUNDOS'],
+                detail='Demasiados intentos fallidos. Intenta más tarde.',
+            )
+
+        try:
+            user, _auth = super().authenticate_credentials(userid, password, request)
+        except exceptions.AuthenticationFailed:
+            if request is not None:
+                registrar_fallo(request, userid)
+            raise
+
+        recordar_credencial(user, password)
+        return (user, None)
+
+
+@lru_cache(maxsize=None)
+def _clases_autenticacion(rutas):
+    return tuple(import_string(ruta) for ruta in rutas)
+
+
+class AutenticacionPorVista:
+    """
+    Mixin de vistas DRF: usa la cadena de autenticación de
+    ``settings.AUTENTICACION['VISTAS']`` para el nombre de la clase, si
+    figura ahí; si no, ``authentication_classes``.
+    """
+
+    def get_authenticators(self):
+        rutas = settings.AUTENTICACION['VISTAS'].get(type(self).__name__)
+        if rutas is None:
+            return super().get_authenticators()
+        return [clase() for clase in _clases_autenticacion(tuple(rutas))]
@@ -0,0 +1,103 @@
+# autenticacion/credenciales.py
+"""
+Credenciales HTTP Basic: caché de las ya verificadas y límite de intentos
+fallidos (ver ``BasicCacheadaAuthentication`` en autenticacion/autenticacion.py).
+
+Verificar una contraseña con PBKDF2 cuesta cientos de milisegundos de CPU y
+``BasicAuthentication`` lo hace en cada petición. Tras una verificación
+exitosa se guarda, por usuario, una huella HMAC (con ``SECRET_KEY``) de la
+contraseña y del hash guardado en ``auth_user``; mientras no expire, la
+misma contraseña se acepta comparando huellas. Un cambio de contraseña
+cambia el hash y descarta la entrada aunque no se haya llamado a
+``olvidar_credenciales``.
+
+Los intentos fallidos se cuentan por IP y por usuario en ventanas de
+``CREDENCIALES_BASIC['VENTANA_SEGUNDOS']``; al superar el límite se responde
+429 sin verificar la contraseña.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.throttling import BaseThrottle
+
+from citas_medicas.cache import contar, estadisticas_region
+
+_SAL = 'autenticacion.credenciales'
+
+
+def _huella(valor, uso):
+    return salted_hmac(f'{_SAL}.{uso}', valor, algorithm='sha256').hexdigest()
+
+
+def _clave(username):
+    return f'credenciales:{_huella(username, "usuario")}'
+
+
+# ==================== CACHÉ DE VERIFICADAS ====================
+
+def credencial_verificada(username, password):
+    """
+    ``(user_id, huella_del_hash)`` si ``password`` ya se verificó para
+    ``username`` y la entrada no expiró; si no, None.
+    """
+    fila = cache.get(_clave(username))
+    if fila is None or not constant_time_compare(fila[0], _huella(f'{username}\0{password}', 'password')):
+        contar('credenciales', 'fallos')
+        return None
+    contar('credenciales', 'aciertos')
+    return fila[1], fila[2]
+
+
+def hash_vigente(user, huella_hash):
+    """Si el hash de contraseña de ``user`` sigue siendo el verificado."""
+    return constant_time_compare(_huella(user.password, 'hash'), huella_hash)
+
+
+def recordar_credencial(user, password):
+    username = user.get_username()
+    cache.set(
+        _clave(username),
+        (_huella(f'{username}\0{password}', 'password'), user.pk, _huella(user.password, 'hash')),
+        settings.CREDENCIALES_BASIC['CACHE_SEGUNDOS'],
+    )
+
+
+def olvidar_credenciales(username):
+    cache.delete(_clave(username))
+
+
+def estadisticas_cache():
+    """Aciertos y fallos de la caché de credenciales en este proceso."""
+    return estadisticas_region('credenciales')
+
+
+# ==================== INTENTOS FALLIDOS ====================
+
+def _claves_fallos(request, username):
+    # Misma IP que usa el throttling de DRF (respeta NUM_PROXIES)
+    ip = BaseThrottle().get_ident(request)
+    return (
+        f'credenciales_fallos:ip:{ip}',
+        f'credenciales_fallos:usuario:{_huella(username, "usuario")}',
+    )
+
+
+def limite_superado(request, username):
+    configuracion = settings.CREDENCIALES_BASIC
+    clave_ip, clave_usuario = _claves_fallos(request, username)
+    fallos = cache.get_many([clave_ip, clave_usuario])
+    return (
+        fallos.get(clave_ip, 0) >= configuracion['MAX_FALLOS_IP']
+        or fallos.get(clave_usuario, 0) >= configuracion['MAX_FALLOS_USUARIO']
+    )
+
+
+def registrar_fallo(request, username):
+    ventana = settings.CREDENCIALES_BASIC['VENTANA_SEGUNDOS']
+    for clave in _claves_fallos(request, username):
+        # add() abre la ventana; incr() no cambia su vencimiento
+        if not cache.add(clave, 1, ventana):
+            try:
+                cache.incr(clave)
+            except ValueError:
+                cache.add(clave, 1, ventana)
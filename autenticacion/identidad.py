@@ -0,0 +1,169 @@
+# autenticacion/identidad.py
+"""
+Identidad del usuario autenticado: rol y filas de Paciente/Médico asociadas.
+
+Se resuelve una sola vez por petición y se guarda en el ``HttpRequest``, de
+modo que permisos, ``get_queryset`` y acciones comparten el mismo resultado
+en lugar de leer ``request.user.perfil`` y consultar ``Medico``/``Paciente``
+por separado.
+
+Entre peticiones se guarda en la caché de Django (``identidad:<user_id>``)
+durante ``IDENTIDAD_CACHE_SEGUNDOS``. Las señales de ``User``,
+``PerfilUsuario``, ``Paciente`` y ``Medico`` la invalidan al cambiar.
+
+Los access tokens emitidos en el login también la llevan como claims (ver
+autenticacion/tokens.py).
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from citas_medicas.cache import contar, estadisticas_region
+
+
+class Identidad:
+    __slots__ = ('user_id', 'tipo_usuario', 'perfil_id', 'paciente_id', 'medico_id')
+
+    def __init__(self, user_id, tipo_usuario=None, perfil_id=None, paciente_id=None, medico_id=None):
+        self.user_id = user_id
+        self.tipo_usuario = tipo_usuario
+        self.perfil_id = perfil_id
+        self.paciente_id = paciente_id
+        self.medico_id = medico_id
+
+    def __repr__(self):
+        return f"<Identidad user={self.user_id} {self.tipo_usuario} paciente={self.paciente_id} medico={self.medico_id}>"
+
+    @property
+    def tiene_perfil(self):
+        return self.tipo_usuario is not None
+
+    @property
+    def es_admin(self):
+        return self.tipo_usuario == 'admin'
+
+    @property
+    def es_medico(self):
+        return self.tipo_usuario == 'medico'
+
+    @property
+    def es_paciente(self):
+        return self.tipo_usuario == 'paciente'
+
+
+ANONIMA = Identidad(None)
+
+# Relaciones inversas de User que forman la identidad
+RELACIONES = ('perfil', 'paciente', 'medico')
+
+
+# ==================== CACHÉ ENTRE PETICIONES ====================
+
+def _clave(user_id):
+    return f'identidad:{user_id}'
+
+
+def identidad_cacheada(user_id):
+    """Identidad guardada en caché para ``user_id`` o None (cuenta acierto/fallo)."""
+    fila = cache.get(_clave(user_id))
+    if fila is None:
+        contar('identidad', 'fallos')
+        return None
+    contar('identidad', 'aciertos')
+    return Identidad(user_id, *fila)
+
+
+def guardar_identidad(identidad):
+    cache.set(
+        _clave(identidad.user_id),
+        (identidad.tipo_usuario, identidad.perfil_id, identidad.paciente_id, identidad.medico_id),
+        settings.IDENTIDAD_CACHE_SEGUNDOS,
+    )
+
+
+def invalidar_identidad(user_id):
+    """
+    Invalida los claims de los tokens ya emitidos para ``user_id`` (en la
+    transacción en curso) y borra su identidad de la caché al confirmarse:
+    antes, otra petición podría volver a guardarla con los datos anteriores.
+    """
+    from .tokens import incrementar_version
+
+    if user_id is not None:
+        incrementar_version(user_id)
+        transaction.on_commit(lambda: cache.delete(_clave(user_id)))
+
+
+def estadisticas_cache():
+    """Aciertos y fallos de la caché de identidad en este proceso."""
+    return estadisticas_region('identidad')
+
+
+def cargar_identidad(user_id):
+    """
+    Identidad de ``user_id`` desde la caché o, si no está, con una sola
+    consulta que une perfil, paciente y médico.
+    """
+    identidad = identidad_cacheada(user_id)
+    if identidad is not None:
+        return identidad
+
+    fila = User.objects.filter(pk=user_id).values_list(
+        'perfil__tipo_usuario', 'perfil__id', 'paciente__id', 'medico__id'
+    ).first()
+    if fila is None:
+        return Identidad(user_id)
+
+    identidad = Identidad(user_id, *fila)
+    guardar_identidad(identidad)
+    return identidad
+
+
+def identidad_desde_usuario(user):
+    """
+    Construye la identidad sin consultas si ``user`` se cargó con
+    ``select_related('perfil', 'paciente', 'medico')``; si no, devuelve None.
+    """
+    if not all(getattr(User, nombre).related.is_cached(user) for nombre in RELACIONES):
+        return None
+
+    perfil = getattr(user, 'perfil', None)
+    paciente = getattr(user, 'paciente', None)
+    medico = getattr(user, 'medico', None)
+    return Identidad(
+        user.pk,
+        perfil.tipo_usuario if perfil else None,
+        perfil.id if perfil else None,
+        paciente.id if paciente else None,
+        medico.id if medico else None,
+    )
+
+
+def obtener_identidad(request):
+    """
+    Identidad del usuario de ``request`` (DRF ``Request`` o ``HttpRequest``).
+
+    El resultado se guarda en el ``HttpRequest`` subyacente y se reutiliza
+    mientras el usuario autenticado sea el mismo.
+    """
+    base = getattr(request, '_request', request)
+    user = request.user
+
+    if not user.is_authenticated:
+        return ANONIMA
+
+    identidad = getattr(base, '_identidad', None)
+    if identidad is not None and identidad.user_id == user.pk:
+        return identidad
+
+    identidad = getattr(user, '_identidad', None)
+    if identidad is None:
+        identidad = identidad_desde_usuario(user)
+        if identidad is not None:
+            guardar_identidad(identidad)
+        else:
+            identidad = cargar_identidad(user.pk)
+
+    base._identidad = identidad
+    return identidad
@@ -1,34 +1,33 @@
 # autenticacion/middleware.py - COMPLETO
 from django.shortcuts import redirect
+from citas_medicas import trazas
 
 class LoginRequiredMiddleware:
-    
+    # Únicas rutas que este middleware redirige; en el resto no se toca
+    # request.user para no cargar la sesión ni el usuario sin necesidad.
+    RUTAS_CONTROLADAS = frozenset(['/', '/login/', '/app/'])
+
     def __init__(self, get_response):
         self.get_response = get_response
-    
+
     def __call__(self, request):
         path = request.path
-        
-        print(f"🛡️  Middleware: {path} | Autenticado: {request.user.is_authenticated} | Usuario: {request.user}")
-        
-        if path == '/login/' and request.user.is_authenticated:
-            print(f"📍 Middleware: Usuario ya autenticado en /login/, redirigiendo a /app/")
+
+        if path not in self.RUTAS_CONTROLADAS:
+            return self.get_response(request)
+
+        autenticado = request.user.is_authenticated
+
+        if trazas.activo():
+            trazas.emitir('login_required', ruta=path, autenticado=autenticado, user_id=request.user.pk)
+
+        if path == '/login/' and autenticado:
             return redirect('/app/')
-        
-        if path == '/' and request.user.is_authenticated:
-            print(f"📍 Middleware: Usuario ya autenticado en raíz, redirigiendo a /app/")
+
+        if path == '/' and autenticado:
             return redirect('/app/')
-        
-        if not request.user.is_authenticated and path == '/app/':
-            print(f"🔒 Middleware: Usuario no autenticado intentando acceder a /app/, redirigiendo a /login/")
-            return redirect('/login/')
-        
-        return self.get_response(request)
 
+        if not autenticado and path == '/app/':
+            return redirect('/login/')
 
-class RolMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
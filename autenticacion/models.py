@@ -1,8 +1,9 @@
 # autenticacion/models.py - COMPLETO
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
 from django.dispatch import receiver
+from .identidad import invalidar_identidad
 
 class PerfilUsuario(models.Model):
     TIPO_USUARIO_CHOICES = [
@@ -16,6 +17,8 @@ class PerfilUsuario(models.Model):
     telefono = models.CharField(max_length=20, blank=True, null=True)
     direccion = models.TextField(blank=True, null=True)
     fecha_nacimiento = models.DateField(null=True, blank=True)
+    # Va en los access tokens; se incrementa con cada cambio de identidad (ver tokens.py)
+    version_identidad = models.PositiveIntegerField(default=0)
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
     
@@ -25,10 +28,47 @@ class PerfilUsuario(models.Model):
     def save(self, *args, **kwargs):
         if self.user.is_superuser and self.tipo_usuario != 'admin':
             self.tipo_usuario = 'admin'
+        # version_identidad solo cambia con UPDATE ... + 1: una instancia
+        # cargada antes de un cambio no debe devolverle su valor anterior
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'version_identidad'
+            ]
         super().save(*args, **kwargs)
 
+# Citas, médicos y pacientes muestran el nombre del usuario: sus señales de
+# User solo actúan si cambió (ver cambio_nombre)
+CAMPOS_NOMBRE = ('first_name', 'last_name')
+
+def _nombre(user):
+    # Desde __dict__ para no cargar campos diferidos (only/defer)
+    return tuple(user.__dict__.get(campo) for campo in CAMPOS_NOMBRE)
+
+@receiver(post_init, sender=User)
+def recordar_nombre_usuario(sender, instance, **kwargs):
+    instance._nombre_guardado = _nombre(instance)
+
+@receiver(pre_save, sender=User)
+def detectar_cambio_nombre(sender, instance, update_fields=None, **kwargs):
+    # En pre_save, para que todos los receptores de post_save vean lo mismo
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_NOMBRE):
+        instance._nombre_cambiado = False
+        return
+    anterior, actual = instance._nombre_guardado, _nombre(instance)
+    # Sin el nombre cargado no se sabe si cambió: se asume que sí
+    instance._nombre_cambiado = None in anterior or anterior != actual
+    instance._nombre_guardado = actual
+
+def cambio_nombre(user, created):
+    """Si el ``save()`` que disparó ``post_save`` cambió el nombre de un usuario existente."""
+    return not created and getattr(user, '_nombre_cambiado', True)
+
 @receiver(post_save, sender=User)
-def crear_o_actualizar_perfil_usuario(sender, instance, created, **kwargs):
+def crear_o_actualizar_perfil_usuario(sender, instance, created, update_fields=None, **kwargs):
+    # El login solo guarda last_login, que no cambia la identidad
+    if not (update_fields is not None and set(update_fields) <= {'last_login'}):
+        invalidar_identidad(instance.pk)
     try:
         perfil, perfil_creado = PerfilUsuario.objects.get_or_create(user=instance)
         
@@ -52,4 +92,13 @@ def crear_o_actualizar_perfil_usuario(sender, instance, created, **kwargs):
             else:
                 PerfilUsuario.objects.create(user=instance)
         except Exception as emergency_error:
-            print(f"🔥 Error de emergencia: No se pudo crear perfil para {instance.username}: {str(emergency_error)}")
\ No newline at end of file
+            print(f"🔥 Error de emergencia: No se pudo crear perfil para {instance.username}: {str(emergency_error)}")
+
+@receiver(post_save, sender=PerfilUsuario)
+@receiver(post_delete, sender=PerfilUsuario)
+def invalidar_identidad_perfil(sender, instance, **kwargs):
+    invalidar_identidad(instance.user_id)
+
+@receiver(post_delete, sender=User)
+def invalidar_identidad_usuario(sender, instance, **kwargs):
+    invalidar_identidad(instance.pk)
@@ -1,3 +1,363 @@
-from django.test import TestCase
+# autenticacion/tests.py
+import base64
+import time as reloj
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db.models import F, QuerySet
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from pacientes.models import Paciente
+from pacientes.serializers import PacienteSerializer
+
+from .credenciales import credencial_verificada
+from .identidad import cargar_identidad, identidad_cacheada, invalidar_identidad
+from .models import PerfilUsuario
+from .tokens import INVALIDADA, clave_version, emitir_tokens, identidad_desde_token, version_vigente
+from .usernames import REINTENTOS, AsignadorUsernames, base_de_username, crear_usuario, siguiente_sufijo
+
+# Cualquier backend que no sea CacheLocal cuenta como compartido (Redis en producción)
+CACHE_COMPARTIDA = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas'}}
+
+
+class InvalidacionIdentidadTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('paciente', password='x')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_se_invalida_al_confirmar_la_transaccion(self):
+        cargar_identidad(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.perfil.tipo_usuario = 'medico'
+            self.user.perfil.save()
+            # Otra petición todavía ve la identidad confirmada
+            self.assertEqual(identidad_cacheada(self.user.pk).tipo_usuario, 'paciente')
+
+        self.assertIsNone(identidad_cacheada(self.user.pk))
+        self.assertEqual(cargar_identidad(self.user.pk).tipo_usuario, 'medico')
+
+    def test_no_se_invalida_si_la_transaccion_se_revierte(self):
+        cargar_identidad(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.user.perfil.tipo_usuario = 'medico'
+            self.user.perfil.save()
+
+        self.assertTrue(callbacks)
+        self.assertEqual(identidad_cacheada(self.user.pk).tipo_usuario, 'paciente')
+
+
+class CambioNombreTests(TestCase):
+    """Las señales de User que tocan pacientes, médicos y citas solo actúan si cambia el nombre."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('paciente', password='x', first_name='Ana', last_name='Pérez')
+        self.paciente = Paciente.objects.create(user=self.user, dni='001-010190-0001A')
+
+    def actualizado_en(self):
+        return Paciente.objects.values_list('actualizado_en', flat=True).get(pk=self.paciente.pk)
+
+    def test_guardar_sin_cambiar_el_nombre(self):
+        antes = self.actualizado_en()
+        user = User.objects.get(pk=self.user.pk)
+
+        user.set_password('otra')
+        user.save()
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+
+        self.assertEqual(self.actualizado_en(), antes)
+
+    def test_guardar_con_otro_nombre(self):
+        antes = self.actualizado_en()
+        user = User.objects.get(pk=self.user.pk)
+
+        user.last_name = 'Gómez'
+        user.save()
+
+        self.assertGreater(self.actualizado_en(), antes)
+        self.assertTrue(self.paciente.claves_busqueda.exists())
+
+    def test_nombre_no_cargado(self):
+        antes = self.actualizado_en()
+        user = User.objects.only('id', 'username').get(pk=self.user.pk)
+
+        # Sin el nombre cargado save() no lo escribe
+        user.save()
+        self.assertEqual(self.actualizado_en(), antes)
+
+        # Si se asigna, no hay con qué compararlo: se asume que cambió
+        user.first_name = 'Ana'
+        user.save()
+        self.assertGreater(self.actualizado_en(), antes)
+
+
+class IdentidadEnTokenTests(TestCase):
+    """Los claims de identidad solo valen mientras la versión del perfil no cambie."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('medico', password='x')
+        self.user.perfil.tipo_usuario = 'medico'
+        self.user.perfil.save()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_claims_vigentes(self):
+        _refresh, access = emitir_tokens(self.user)
+
+        identidad = identidad_desde_token(access)
+
+        self.assertEqual((identidad.user_id, identidad.tipo_usuario), (self.user.pk, 'medico'))
+
+    def test_cambio_de_rol(self):
+        _refresh, access = emitir_tokens(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.perfil.tipo_usuario = 'paciente'
+            self.user.perfil.save()
+
+        self.assertIsNone(identidad_desde_token(access))
+        self.assertEqual(identidad_desde_token(emitir_tokens(self.user)[1]).tipo_usuario, 'paciente')
+
+    def test_usuario_desactivado_sin_senales(self):
+        _refresh, access = emitir_tokens(self.user)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertIsNone(identidad_desde_token(access))
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(cliente.get('/api/citas/').status_code, 401)
+
+    @override_settings(CACHES=CACHE_COMPARTIDA)
+    def test_con_cache_compartida_sin_consultas(self):
+        # setUp limpia la caché por defecto, no la compartida que activa el decorador
+        cache.clear()
+        _refresh, access = emitir_tokens(self.user)
+
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(identidad_desde_token(access))
+
+    @override_settings(CACHES=CACHE_COMPARTIDA)
+    def test_version_desalojada_de_la_cache(self):
+        cache.clear()
+        _refresh, access = emitir_tokens(self.user)
+        PerfilUsuario.objects.filter(user=self.user).update(version_identidad=F('version_identidad') + 1)
+
+        self.assertIsNotNone(identidad_desde_token(access))
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertIsNone(identidad_desde_token(access))
+
+    @override_settings(CACHES=CACHE_COMPARTIDA)
+    def test_lectura_anterior_al_incremento_no_vuelve_a_la_cache(self):
+        cache.clear()
+        _refresh, access = emitir_tokens(self.user)
+        cache.clear()
+        first = QuerySet.first
+
+        def leer_e_invalidar(queryset):
+            # La lectura ya tiene la versión anterior cuando otra petición la incrementa
+            fila = first(queryset)
+            with self.captureOnCommitCallbacks(execute=True):
+                invalidar_identidad(self.user.pk)
+            return fila
+
+        with mock.patch.object(QuerySet, 'first', leer_e_invalidar):
+            anterior = version_vigente(self.user.pk)
+
+        self.assertEqual(cache.get(clave_version(self.user.pk)), INVALIDADA)
+        self.assertEqual(version_vigente(self.user.pk), (anterior[0] + 1, True))
+        self.assertIsNone(identidad_desde_token(access))
+
+    @override_settings(CACHES=CACHE_COMPARTIDA, IDENTIDAD_INVALIDACION_SEGUNDOS=0.05)
+    def test_se_vuelve_a_cachear_al_vencer_la_marca(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_identidad(self.user.pk)
+        version_vigente(self.user.pk)
+        self.assertEqual(cache.get(clave_version(self.user.pk)), INVALIDADA)
+
+        with mock.patch('time.time', return_value=reloj.time() + 1):
+            vigente = version_vigente(self.user.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual(version_vigente(self.user.pk), vigente)
+
+
+def basic(username, password):
+    return 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+
+
+@override_settings(CREDENCIALES_BASIC={
+    'CACHE_SEGUNDOS': 300, 'MAX_FALLOS_IP': 5, 'MAX_FALLOS_USUARIO': 3, 'VENTANA_SEGUNDOS': 300,
+})
+class BasicCacheadaTests(TestCase):
+    """``BasicCacheadaAuthentication``: credenciales verificadas en caché y límite de fallos."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('paciente', password='secreta1', first_name='Ana')
+        self.paciente = Paciente.objects.create(user=self.user, dni='001-010190-0001A')
+
+    def tearDown(self):
+        cache.clear()
+
+    def pedir(self, password, username='paciente'):
+        # CitaViewSet encabeza su cadena con JWT: sin credenciales válidas responde 401, no 403
+        return self.client.get('/api/citas/', HTTP_AUTHORIZATION=basic(username, password))
+
+    def verificaciones(self, *passwords):
+        """Respuestas a cada petición y cuántas veces se verificó la contraseña con el hasher."""
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as verificar:
+            codigos = [self.pedir(password).status_code for password in passwords]
+        return codigos, verificar.call_count
+
+    def test_segunda_peticion_sin_verificar_la_contrasena(self):
+        self.assertEqual(self.verificaciones('secreta1', 'secreta1', 'secreta1'), ([200, 200, 200], 1))
+        self.assertIsNotNone(credencial_verificada('paciente', 'secreta1'))
+
+    def test_otra_contrasena_no_usa_la_cache(self):
+        self.pedir('secreta1')
+
+        self.assertEqual(self.verificaciones('otra'), ([401], 1))
+
+    def test_cambio_password_descarta_la_credencial(self):
+        self.pedir('secreta1')
+
+        respuesta = self.client.post('/api/autenticacion/cambiar-password/', {
+            'old_password': 'secreta1', 'new_password': 'secreta2', 'confirm_password': 'secreta2',
+        }, HTTP_AUTHORIZATION=basic('paciente', 'secreta1'))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIsNone(credencial_verificada('paciente', 'secreta1'))
+        self.assertEqual(self.pedir('secreta1').status_code, 401)
+        self.assertEqual(self.pedir('secreta2').status_code, 200)
+
+    def test_set_password_del_serializer_descarta_la_credencial(self):
+        self.pedir('secreta1')
+
+        PacienteSerializer().update(self.paciente, {'password': 'secreta2', 'confirm_password': 'secreta2'})
+
+        self.assertIsNone(credencial_verificada('paciente', 'secreta1'))
+        self.assertEqual(self.pedir('secreta1').status_code, 401)
+
+    def test_hash_cambiado_sin_olvidar_la_credencial(self):
+        self.pedir('secreta1')
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('secreta2')
+        User.objects.filter(pk=user.pk).update(password=user.password)
+
+        # La huella del hash ya no coincide aunque la entrada siga en caché
+        self.assertIsNotNone(credencial_verificada('paciente', 'secreta1'))
+        self.assertEqual(self.pedir('secreta1').status_code, 401)
+        self.assertIsNone(credencial_verificada('paciente', 'secreta1'))
+
+    def test_usuario_desactivado_con_la_credencial_en_cache(self):
+        self.pedir('secreta1')
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.pedir('secreta1').status_code, 401)
+        self.assertIsNone(credencial_verificada('paciente', 'secreta1'))
+
+    def test_fallos_repetidos_por_usuario(self):
+        codigos = [self.pedir('mala').status_code for _ in range(3)]
+
+        self.assertEqual(codigos, [401] * 3)
+        # Superado el límite ni la contraseña correcta se verifica
+        self.assertEqual(self.verificaciones('secreta1'), ([429], 0))
+
+    def test_fallos_repetidos_por_ip(self):
+        codigos = [self.pedir('mala', username=f'usuario{i}').status_code for i in range(5)]
+
+        self.assertEqual(codigos, [401] * 5)
+        self.assertEqual(self.pedir('secreta1').status_code, 429)
+
+    def test_credencial_en_cache_no_cuenta_para_el_limite(self):
+        self.pedir('secreta1')
+        for _ in range(3):
+            self.pedir('mala')
+
+        self.assertEqual(self.pedir('secreta1').status_code, 200)
+
+
+class UsernamesTests(TestCase):
+    """Siguiente username libre con una consulta (ver autenticacion/usernames.py)."""
+
+    def ocupar(self, *usernames):
+        for username in usernames:
+            User.objects.create_user(username, password=None)
+
+    def test_base_vacia(self):
+        self.assertEqual(base_de_username(''), 'usuario')
+        self.assertEqual(base_de_username('  ¿? '), 'usuario')
+        self.ocupar('usuario')
+
+        self.assertEqual(crear_usuario(base_de_username('')).username, 'usuario1')
+
+    def test_base_libre_y_ocupada(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(siguiente_sufijo('ana.perez'), 0)
+
+        self.ocupar('ana.perez')
+
+        self.assertEqual(siguiente_sufijo('ana.perez'), 1)
+        self.assertEqual(crear_usuario('ana.perez').username, 'ana.perez1')
+
+    def test_no_rellena_huecos(self):
+        self.ocupar('ana.perez', 'ana.perez1', 'ana.perez7')
+
+        self.assertEqual(siguiente_sufijo('ana.perez'), 8)
+
+    def test_sufijos_no_numericos(self):
+        self.ocupar('ana.perez', 'ana.perez.x', 'ana.perez2x', 'ana.perezz', 'ana.perez0000000000001')
+
+        self.assertEqual(siguiente_sufijo('ana.perez'), 1)
+        self.assertEqual(siguiente_sufijo('ana.pere'), 0)
+
+    def test_base_con_tildes(self):
+        base = base_de_username('María López Ruiz')
+        self.assertEqual(base, 'maría.lópez')
+        self.ocupar(base, 'maria.lopez5')
+
+        self.assertEqual(crear_usuario(base).username, 'maría.lópez1')
+
+    def test_asignador_reparte_sufijos_en_bloque(self):
+        self.ocupar('ana.perez', 'ana.perez3')
+        asignador = AsignadorUsernames()
+
+        with self.assertNumQueries(2):
+            usernames = asignador.asignar(['ana.perez', 'luis.gomez', 'ana.perez', 'luis.gomez'])
+
+        self.assertEqual(usernames, ['ana.perez4', 'luis.gomez', 'ana.perez5', 'luis.gomez1'])
+
+    def test_reintenta_si_otra_peticion_toma_el_username(self):
+        self.ocupar('ana.perez')
+
+        # La primera consulta no ve el username que otra petición acaba de insertar
+        with mock.patch('autenticacion.usernames.siguiente_sufijo', side_effect=[0, 1]):
+            with self.assertLogs('autenticacion.usernames', 'WARNING'):
+                user = crear_usuario('ana.perez', password='x')
+
+        self.assertEqual(user.username, 'ana.perez1')
+        self.assertEqual(user.email, 'ana.perez1@clinica.com')
+
+    def test_agota_los_reintentos(self):
+        self.ocupar('ana.perez')
+
+        with mock.patch('autenticacion.usernames.siguiente_sufijo', return_value=0) as siguiente:
+            with self.assertLogs('autenticacion.usernames', 'WARNING'), self.assertRaises(IntegrityError):
+                crear_usuario('ana.perez')
+
+        self.assertEqual(siguiente.call_count, REINTENTOS)
@@ -0,0 +1,106 @@
+# autenticacion/tokens.py
+"""
+Tokens JWT que llevan la identidad del usuario (rol, perfil, paciente y
+médico) como claims del access token.
+
+``JWTSinEstadoAuthentication`` (ver autenticacion/autenticacion.py) arma la
+identidad a partir de esos claims sin cargar el usuario ni su perfil. Cada
+token lleva además la versión de identidad del perfil
+(``PerfilUsuario.version_identidad``), que ``invalidar_identidad``
+incrementa en la base con cada cambio de rol, de paciente/médico, de
+contraseña o de estado del usuario. Los claims solo se aceptan si la
+versión sigue siendo la misma y el usuario está activo; si no, o si no se
+puede comprobar, se vuelve al camino con base de datos.
+
+La versión vigente se guarda en la caché (``identidad_version:<user_id>``)
+solo si la caché es compartida (Redis): con ``CacheLocal`` otro proceso no
+vería la invalidación, así que se lee de la base en cada petición.
+
+Al confirmarse un incremento, la clave no se borra sino que se marca como
+``INVALIDADA`` durante ``IDENTIDAD_INVALIDACION_SEGUNDOS``, y las lecturas
+la guardan con ``cache.add``: una lectura que empezó antes del incremento y
+termina después no puede volver a dejar la versión anterior en la caché.
+
+Los claims solo van en el access token: un refresh posterior emitiría un
+access token nuevo con claims copiados y ya viejos.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from citas_medicas.cache import cache_compartida, contar
+
+from .identidad import Identidad, cargar_identidad
+from .models import PerfilUsuario
+
+CLAIM_VERSION = 'identidad_version'
+CLAIMS_IDENTIDAD = ('tipo_usuario', 'perfil_id', 'paciente_id', 'medico_id')
+# Marca que ocupa la clave de la versión justo después de incrementarla
+INVALIDADA = 'invalidada'
+
+
+def clave_version(user_id):
+    return f'identidad_version:{user_id}'
+
+
+def incrementar_version(user_id):
+    """
+    Invalida los claims de los tokens ya emitidos para ``user_id`` (en la
+    transacción en curso) y marca la versión cacheada como ``INVALIDADA``
+    al confirmarse.
+    """
+    PerfilUsuario.objects.filter(user_id=user_id).update(version_identidad=F('version_identidad') + 1)
+    transaction.on_commit(
+        lambda: cache.set(clave_version(user_id), INVALIDADA, settings.IDENTIDAD_INVALIDACION_SEGUNDOS)
+    )
+
+
+def version_vigente(user_id):
+    """``(version_identidad, is_active)`` de ``user_id`` o None si no tiene perfil."""
+    compartida = cache_compartida()
+    if compartida:
+        fila = cache.get(clave_version(user_id))
+        if fila is not None and fila != INVALIDADA:
+            contar('version_identidad', 'aciertos')
+            return fila
+        contar('version_identidad', 'fallos')
+
+    fila = PerfilUsuario.objects.filter(user_id=user_id).values_list('version_identidad', 'user__is_active').first()
+    if fila is not None and compartida:
+        # ``add`` y no ``set``: no pisa la marca de un incremento posterior a la lectura
+        cache.add(clave_version(user_id), fila, settings.IDENTIDAD_CACHE_SEGUNDOS)
+    return fila
+
+
+def emitir_tokens(user):
+    """``(refresh, access)`` para ``user``; el access token lleva su identidad."""
+    refresh = RefreshToken.for_user(user)
+    access = refresh.access_token
+    access['username'] = user.get_username()
+
+    vigente = version_vigente(user.pk)
+    if vigente is not None:
+        identidad = cargar_identidad(user.pk)
+        access[CLAIM_VERSION] = vigente[0]
+        for claim in CLAIMS_IDENTIDAD:
+            access[claim] = getattr(identidad, claim)
+    return refresh, access
+
+
+def identidad_desde_token(token):
+    """
+    Identidad según los claims de ``token`` o None si no los tiene, si la
+    identidad cambió después de emitirlo o si el usuario ya no está activo.
+    """
+    version = token.get(CLAIM_VERSION)
+    if version is None:
+        return None
+
+    user_id = token[api_settings.USER_ID_CLAIM]
+    if version_vigente(user_id) != (version, True):
+        return None
+
+    return Identidad(user_id, *(token.get(claim) for claim in CLAIMS_IDENTIDAD))
@@ -0,0 +1,111 @@
+# autenticacion/usernames.py
+"""
+Asignación de usernames únicos: ``base``, ``base1``, ``base2``...
+
+En lugar de probar candidatos de a uno (``while ...exists()``), el
+siguiente sufijo sale de una sola consulta agregada: el rango
+``base <= username <= base999...`` sobre el índice único de ``username``
+y el mayor sufijo numérico. No se rellenan huecos: después de ``base7``
+viene ``base8`` aunque ``base3`` esté libre.
+
+No se verifica antes de insertar: la unicidad la garantiza la BD y, si
+otra petición toma el mismo username entre la consulta y el INSERT, se
+recalcula y se reintenta (``crear_usuario``).
+"""
+import logging
+import re
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
+
+logger = logging.getLogger(__name__)
+
+# Sufijos de hasta 9 dígitos (caben en un entero en cualquier motor)
+DIGITOS = 9
+LARGO_BASE = 150 - DIGITOS
+# Con N altas simultáneas de la misma base, la última puede perder N - 1 veces
+REINTENTOS = 20
+
+
+def base_de_username(nombre):
+    """``'María López'`` → ``'maría.lópez'``: nombre y primer apellido en minúsculas."""
+    nombres = nombre.lower().split()
+    base = f'{nombres[0]}.{nombres[1]}' if len(nombres) >= 2 else (nombres[0] if nombres else '')
+    # Solo caracteres que acepta el validador de username de Django
+    base = re.sub(r'[^\w.@+-]', '', base)[:LARGO_BASE]
+    return base or 'usuario'
+
+
+def siguiente_sufijo(base):
+    """
+    Sufijo del siguiente username libre para ``base``: 0 (la base sola está
+    libre) o el mayor sufijo usado + 1. Una consulta.
+    """
+    datos = User.objects.filter(
+        # El rango usa el índice de username; startswith descarta lo que una
+        # collation no binaria pudiera colar en el rango
+        username__gte=base, username__lte=base + '9' * DIGITOS, username__startswith=base,
+    ).annotate(
+        sufijo=Substr('username', len(base) + 1),
+    ).aggregate(
+        exacta=Count('id', filter=Q(username=base)),
+        maximo=Max(Cast('sufijo', IntegerField()), filter=Q(sufijo__regex=rf'^[0-9]{{1,{DIGITOS}}}$')),
+    )
+    if datos['maximo'] is not None:
+        return datos['maximo'] + 1
+    return 1 if datos['exacta'] else 0
+
+
+def con_sufijo(base, numero):
+    return f'{base}{numero}' if numero else base
+
+
+class AsignadorUsernames:
+    """
+    Reparte usernames para muchas altas (importaciones, lotes): una consulta
+    por base distinta, y recuerda el siguiente sufijo de cada una.
+    """
+
+    def __init__(self):
+        self.siguientes = {}
+
+    def asignar(self, bases):
+        """Un username libre por cada elemento de ``bases`` (pueden repetirse)."""
+        nuevas = set(bases) - set(self.siguientes)
+        if nuevas:
+            # La mayoría de las bases no existen: se descartan con una consulta
+            ocupadas = set(User.objects.filter(username__in=nuevas).values_list('username', flat=True))
+            for base in nuevas:
+                self.siguientes[base] = siguiente_sufijo(base) if base in ocupadas else 0
+
+        usernames = []
+        for base in bases:
+            numero = self.siguientes[base]
+            usernames.append(con_sufijo(base, numero))
+            self.siguientes[base] = numero + 1
+        return usernames
+
+    def olvidar(self):
+        """Tras un IntegrityError: otra petición pudo tomar usernames, se recalculan."""
+        self.siguientes.clear()
+
+
+def crear_usuario(base, **campos):
+    """
+    ``User.objects.create_user`` con el siguiente username libre para
+    ``base`` (y email ``<username>@clinica.com``). Si otra petición lo toma
+    antes del INSERT, se recalcula y se reintenta.
+    """
+    for intento in range(1, REINTENTOS + 1):
+        username = con_sufijo(base, siguiente_sufijo(base))
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(
+                    username=username, email=f'{username}@clinica.com', **campos,
+                )
+        except IntegrityError:
+            if intento == REINTENTOS:
+                raise
+            logger.warning(f"⚠️ Username {username} tomado por otra petición; reintentando ({intento})")
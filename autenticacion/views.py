@@ -12,9 +12,15 @@ from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.settings import api_settings
 from .serializers import *
 from .models import PerfilUsuario
+from .identidad import invalidar_identidad, estadisticas_cache, obtener_identidad
+from .credenciales import estadisticas_cache as estadisticas_cache_credenciales, olvidar_credenciales
+from .tokens import emitir_tokens
+from citas_medicas import trazas
+from citas_medicas.cache import estadisticas as estadisticas_cache_regiones
+from citas_medicas.streaming import NDJSONRenderer, modo_streaming, representar_en_lotes, respuesta_streaming
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,27 +28,26 @@ logger = logging.getLogger(__name__)
 # ==================== VISTAS HTML ====================
 
 def login_view(request):
-    print(f"🔐 LoginView HTML accedida por: {request.user} - Autenticado: {request.user.is_authenticated}")
-    
     if request.user.is_authenticated:
-        print(f"✅ Usuario ya autenticado ({request.user.username}), redirigiendo a /app/")
+        if trazas.activo():
+            trazas.emitir('login_view', resultado='ya_autenticado', user_id=request.user.pk)
         return redirect('/app/')
     
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
         
-        print(f"📝 Intento de login HTML: {username}")
-        
         user = authenticate(request, username=username, password=password)
         
         if user is not None:
             login(request, user)
-            print(f"✅ Login HTML exitoso para {username}")
+            if trazas.activo():
+                trazas.emitir('login_view', resultado='exitoso', username=username, user_id=user.pk)
             
             return redirect('/app/')
         else:
-            print(f"❌ Credenciales inválidas para {username}")
+            if trazas.activo():
+                trazas.emitir('login_view', resultado='credenciales_invalidas', username=username)
             return render(request, 'autenticacion/login.html', {
                 'error': 'Credenciales inválidas. Intenta nuevamente.'
             })
@@ -50,7 +55,8 @@ def login_view(request):
     return render(request, 'autenticacion/login.html')
 
 def logout_view(request):
-    print(f"👋 Logout de {request.user.username}")
+    if trazas.activo():
+        trazas.emitir('logout_view', user_id=request.user.pk)
     logout(request)
     return redirect('/login/')
 
@@ -75,10 +81,11 @@ class LoginAPIView(APIView):
                     perfil.save()
                     logger.info(f"✅ Superuser {user.username} configurado como admin")
             
-            refresh = RefreshToken.for_user(user)
-            
             login(request, user)
             
+            # Después del login: el access token lleva la identidad vigente
+            refresh, access = emitir_tokens(user)
+            
             perfil_data = {}
             if hasattr(user, 'perfil'):
                 perfil_data = {
@@ -91,7 +98,7 @@ class LoginAPIView(APIView):
                 'perfil': perfil_data,
                 'tokens': {
                     'refresh': str(refresh),
-                    'access': str(refresh.access_token),
+                    'access': str(access),
                 },
                 'message': 'Login exitoso'
             }, status=status.HTTP_200_OK)
@@ -154,6 +161,7 @@ class CambioPasswordAPIView(APIView):
             
             user.set_password(serializer.validated_data['new_password'])
             user.save()
+            olvidar_credenciales(user.get_username())
             
             update_session_auth_hash(request, user)
             
@@ -165,9 +173,16 @@ class CambioPasswordAPIView(APIView):
 
 class UserListAPIView(APIView):
     permission_classes = [IsAdminUser]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
     
     def get(self, request):
-        users = User.objects.all().order_by('-date_joined')
+        # tipo_usuario y perfil_id salen del perfil: se trae en el mismo JOIN
+        users = User.objects.select_related('perfil').order_by('-date_joined')
+        
+        modo = modo_streaming(request)
+        if modo:
+            return respuesta_streaming(representar_en_lotes(UserSerializer, users), modo)
+        
         serializer = UserSerializer(users, many=True)
         return Response(serializer.data)
 
@@ -201,6 +216,8 @@ class UserAdminAPIView(APIView):
                 user.groups.clear()
                 grupo, created = Group.objects.get_or_create(name=tipo_usuario)
                 user.groups.add(grupo)
+                
+                invalidar_identidad(user.id)
             
             return Response(serializer.data)
         
@@ -304,6 +321,7 @@ def debug_info(request):
     from pacientes.models import Paciente
     from medicos.models import Medico
     from citas.models import Cita
+    from citas.estadisticas import total_citas
     
     info = {
         'request_user': request.user.username if request.user.is_authenticated else 'No autenticado',
@@ -312,39 +330,47 @@ def debug_info(request):
         'total_users': User.objects.count(),
         'total_pacientes': Paciente.objects.count(),
         'total_medicos': Medico.objects.count(),
-        'total_citas': Cita.objects.count(),
+        'total_citas': total_citas(),
+        'cache_identidad': estadisticas_cache(),
+        'cache_credenciales': estadisticas_cache_credenciales(),
+        'cache': estadisticas_cache_regiones(),
     }
     
     if request.user.is_authenticated:
-        if hasattr(request.user, 'perfil'):
+        identidad = obtener_identidad(request)
+        
+        if identidad.tiene_perfil:
+            perfil = request.user.perfil
             info['perfil'] = {
-                'tipo_usuario': request.user.perfil.tipo_usuario,
-                'perfil_id': request.user.perfil.id,
-                'telefono': request.user.perfil.telefono,
+                'tipo_usuario': perfil.tipo_usuario,
+                'perfil_id': perfil.id,
+                'telefono': perfil.telefono,
             }
         
-        if hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'paciente':
-            try:
-                paciente = Paciente.objects.get(user=request.user)
+        if identidad.es_paciente:
+            paciente = Paciente.objects.filter(id=identidad.paciente_id).only('id', 'dni').first()
+            if paciente:
+                citas_count = Cita.objects.filter(paciente_id=paciente.id).count()
                 info['paciente_info'] = {
                     'id': paciente.id,
                     'dni': paciente.dni,
-                    'has_citas': Cita.objects.filter(paciente=paciente).exists(),
-                    'citas_count': Cita.objects.filter(paciente=paciente).count(),
+                    'has_citas': citas_count > 0,
+                    'citas_count': citas_count,
                 }
-            except Paciente.DoesNotExist:
+            else:
                 info['paciente_info'] = 'ERROR: No tiene objeto Paciente'
         
-        if hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'medico':
-            try:
-                medico = Medico.objects.get(user=request.user)
+        if identidad.es_medico:
+            medico = Medico.objects.filter(id=identidad.medico_id).select_related('especialidad').first()
+            if medico:
+                citas_count = total_citas(medico_id=medico.id)
                 info['medico_info'] = {
                     'id': medico.id,
                     'especialidad': medico.especialidad.nombre if medico.especialidad else 'Sin especialidad',
-                    'has_citas': Cita.objects.filter(medico=medico).exists(),
-                    'citas_count': Cita.objects.filter(medico=medico).count(),
+                    'has_citas': citas_count > 0,
+                    'citas_count': citas_count,
                 }
-            except Medico.DoesNotExist:
+            else:
                 info['medico_info'] = 'ERROR: No tiene objeto Medico'
     
     return Response(info)
\ No newline at end of file
@@ -0,0 +1,61 @@
+# benchmarks/entorno.py
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def base_de_datos_temporal(concurrente=False):
+    """
+    Crea una base de datos de prueba desechable (como ``manage.py test``) y
+    la destruye al salir, para no tocar los datos reales.
+
+    Con ``concurrente=True`` y SQLite se usa un archivo temporal en lugar de
+    la BD en memoria, que no admite escrituras desde varios hilos.
+
+    La caché es la local en proceso (vacía), aunque esté configurado Redis:
+    las entradas de la BD real no valen para la temporal.
+    """
+    setup_test_environment()
+    cambio_cache = override_settings(CACHES={'default': settings.CACHE_LOCAL})
+    cambio_cache.enable()
+    cache.clear()
+    if connection.vendor == 'sqlite':
+        # Sin hilos, en memoria aunque settings indique un archivo para manage.py test
+        connection.settings_dict['TEST']['NAME'] = (
+            os.path.join(tempfile.gettempdir(), 'benchmarks.sqlite3') if concurrente else None
+        )
+        connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        cache.clear()
+        cambio_cache.disable()
+        teardown_test_environment()
+
+
+@contextmanager
+def sin_logs(nivel=logging.WARNING):
+    """Silencia los logs de las vistas (incluidos los 4xx de django.request) mientras se mide."""
+    logging.disable(nivel)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    indice = max(0, min(len(valores_ordenados) - 1, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
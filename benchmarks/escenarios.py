@@ -0,0 +1,91 @@
+# benchmarks/escenarios.py
+"""
+Escenarios del benchmark de la API.
+
+Cada escenario es un generador ``(ctx, rol)`` que produce tuplas
+``(metodo, url, datos)``. El código entre un ``yield`` y el siguiente es
+preparación y no se mide (p. ej. crear la cita pendiente que luego se
+confirma).
+"""
+from django.utils import timezone
+
+from citas.models import Cita
+
+ROLES = ('admin', 'medico', 'paciente')
+
+
+def _cita_pendiente(ctx):
+    fecha, hora = ctx.siguiente_slot()
+    return Cita.objects.create(
+        paciente_id=ctx.paciente_id, medico_id=ctx.medico_id,
+        fecha=fecha, hora=hora, motivo='benchmark',
+    )
+
+
+def citas_list(ctx, rol):
+    while True:
+        yield 'get', '/api/citas/', None
+
+
+def citas_list_pagina(ctx, rol):
+    while True:
+        yield 'get', '/api/citas/?page_size=50', None
+
+
+def citas_retrieve(ctx, rol):
+    while True:
+        yield 'get', f'/api/citas/{ctx.cita_visible[rol]}/', None
+
+
+def citas_create(ctx, rol):
+    while True:
+        fecha, hora = ctx.siguiente_slot()
+        yield 'post', '/api/citas/', {
+            'paciente': ctx.paciente_id,
+            'medico': ctx.medico_id,
+            'fecha': fecha.isoformat(),
+            'hora': hora.isoformat(),
+            'motivo': 'benchmark',
+        }
+
+
+def citas_confirmar(ctx, rol):
+    while True:
+        cita = _cita_pendiente(ctx)
+        yield 'put', f'/api/citas/{cita.id}/confirmar/', None
+
+
+def citas_cancelar(ctx, rol):
+    while True:
+        cita = _cita_pendiente(ctx)
+        yield 'put', f'/api/citas/{cita.id}/cancelar/', None
+
+
+def citas_finalizar(ctx, rol):
+    while True:
+        cita = _cita_pendiente(ctx)
+        Cita.objects.filter(pk=cita.pk).update(estado='confirmada', actualizado_en=timezone.now())
+        yield 'put', f'/api/citas/{cita.id}/finalizar/', None
+
+
+def pacientes_list(ctx, rol):
+    while True:
+        yield 'get', '/api/pacientes/', None
+
+
+def medicos_list(ctx, rol):
+    while True:
+        yield 'get', '/api/medicos/medicos/', None
+
+
+ESCENARIOS = {
+    'citas_list': citas_list,
+    'citas_list_pagina': citas_list_pagina,
+    'citas_retrieve': citas_retrieve,
+    'citas_create': citas_create,
+    'citas_confirmar': citas_confirmar,
+    'citas_cancelar': citas_cancelar,
+    'citas_finalizar': citas_finalizar,
+    'pacientes_list': pacientes_list,
+    'medicos_list': medicos_list,
+}
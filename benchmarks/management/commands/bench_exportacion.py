@@ -0,0 +1,112 @@
+# benchmarks/management/commands/bench_exportacion.py
+import csv
+import io
+import json
+import time as reloj
+import tracemalloc
+import zipfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+from rest_framework.test import APIClient
+
+from benchmarks.entorno import base_de_datos_temporal, sin_logs
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra --citas citas en una BD temporal y mide GET /api/citas/export/ '
+        'en CSV y XLSX: filas por segundo, tamaño y pico de memoria de Python '
+        '(tracemalloc, en una segunda pasada para no distorsionar el tiempo). '
+        'El pico no debería crecer con --citas. También verifica que el '
+        'archivo tenga todas las filas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--citas', type=int, default=200000)
+        parser.add_argument('--formatos', default='csv,xlsx')
+        parser.add_argument('--sin-memoria', action='store_true', help='Omite la pasada con tracemalloc')
+        parser.add_argument('--json', dest='salida_json', help='Escribe el resultado en este archivo')
+
+    def handle(self, *args, **options):
+        from django.contrib.auth.models import User
+
+        from citas.models import Cita
+
+        with base_de_datos_temporal(), sin_logs():
+            call_command(
+                'seed_load', citas=options['citas'], medicos=max(1, options['citas'] // 2000),
+                pacientes=max(1, options['citas'] // 10), semilla=1, stdout=io.StringIO(),
+            )
+            admin = User.objects.create_user('bench.admin', password='x', is_staff=True)
+            admin.perfil.tipo_usuario = 'admin'
+            admin.perfil.save()
+            cliente = APIClient()
+            cliente.force_authenticate(admin)
+            # Todo lo sembrado, dentro de CITAS_EXPORTACION_MAX_DIAS
+            rango = Cita.objects.aggregate(desde=Min('fecha'), hasta=Max('fecha'))
+
+            resultado = {'motor': connection.vendor, 'citas': options['citas'], 'formatos': {}}
+            for formato in options['formatos'].split(','):
+                medicion = self._exportar(cliente, formato, rango, options['citas'])
+                if not options['sin_memoria']:
+                    tracemalloc.start()
+                    self._exportar(cliente, formato, rango, options['citas'], verificar=False)
+                    medicion['pico_memoria_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024)
+                    tracemalloc.stop()
+                resultado['formatos'][formato] = medicion
+
+        self._reportar(resultado, options.get('salida_json'))
+
+    def _exportar(self, cliente, formato, rango, esperadas, verificar=True):
+        """Consume la respuesta bloque a bloque, como haría el servidor al enviarla."""
+        inicio = reloj.perf_counter()
+        respuesta = cliente.get('/api/citas/export/', {'formato': formato, **rango})
+        primer_bloque = None
+        tamano = 0
+        # Solo se guarda el archivo para verificarlo si es chico
+        contenido = [] if verificar and esperadas <= 200000 else None
+        for bloque in respuesta.streaming_content:
+            if primer_bloque is None:
+                primer_bloque = reloj.perf_counter() - inicio
+            tamano += len(bloque)
+            if contenido is not None:
+                contenido.append(bloque)
+        duracion = reloj.perf_counter() - inicio
+
+        medicion = {
+            'status': respuesta.status_code,
+            'segundos': round(duracion, 2),
+            'primer_bloque_ms': round((primer_bloque or 0) * 1000, 1),
+            'filas_por_segundo': round(esperadas / duracion) if duracion else None,
+            'mb': round(tamano / 1024 / 1024, 1),
+        }
+        if contenido is not None:
+            medicion['filas'] = self._contar_filas(formato, b''.join(contenido))
+        return medicion
+
+    def _contar_filas(self, formato, datos):
+        if formato == 'csv':
+            return sum(1 for _ in csv.reader(io.StringIO(datos.decode('utf-8-sig'), newline=''))) - 1
+        with zipfile.ZipFile(io.BytesIO(datos)) as archivo:
+            return sum(
+                archivo.read(nombre).count(b'<row>') - 1
+                for nombre in archivo.namelist() if nombre.startswith('xl/worksheets/')
+            )
+
+    def _reportar(self, resultado, salida_json):
+        if salida_json:
+            with open(salida_json, 'w') as archivo:
+                json.dump(resultado, archivo, indent=2)
+
+        self.stdout.write(json.dumps(resultado, indent=2))
+        incompletos = [
+            formato for formato, medicion in resultado['formatos'].items()
+            if medicion['status'] != 200 or medicion.get('filas', resultado['citas']) != resultado['citas']
+        ]
+        if incompletos:
+            self.stderr.write(self.style.ERROR(f"❌ Exportación incompleta: {', '.join(incompletos)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Exportaciones completas'))
@@ -0,0 +1,132 @@
+# benchmarks/management/commands/bench_reservas.py
+import json
+import random
+import statistics
+import time as reloj
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks.entorno import base_de_datos_temporal, percentil, sin_logs
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide POST /api/citas/ con varios clientes compitiendo por los mismos '
+        'horarios. Usa una base de datos temporal y verifica que ningún slot '
+        'quede reservado dos veces.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--reservas', type=int, default=400, help='Total de intentos de reserva')
+        parser.add_argument('--slots', type=int, default=16, help='Horarios distintos en disputa')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--json', dest='salida_json', help='Escribe el resultado en este archivo')
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal(concurrente=True), sin_logs():
+            medico, pacientes, slots = self._preparar_datos(options['slots'])
+            resultado = self._ejecutar(medico, pacientes, slots, options)
+
+        self._reportar(resultado, options.get('salida_json'))
+
+    def _preparar_datos(self, cantidad_slots):
+        from medicos.models import Medico, Especialidad
+        from medicos.disponibilidad import slots_del_medico
+        from pacientes.models import Paciente
+
+        especialidad = Especialidad.objects.create(nombre='Benchmark')
+        user = User.objects.create_user('bench.medico', password='x', first_name='Bench', last_name='Medico')
+        user.perfil.tipo_usuario = 'medico'
+        user.perfil.save()
+        medico = Medico.objects.create(
+            user=user, especialidad=especialidad, telefono='0',
+            horario_inicio=time(7), horario_fin=time(19),
+        )
+
+        pacientes = []
+        for i in range(20):
+            user = User.objects.create_user(f'bench.paciente{i}', password='x', first_name='Bench', last_name=str(i))
+            user.perfil.tipo_usuario = 'paciente'
+            user.perfil.save()
+            Paciente.objects.create(user=user, dni=f'999-000000-{i:04d}B', telefono='0', direccion='-')
+            pacientes.append(user)
+
+        fecha = timezone.localdate() + timedelta(days=2)
+        horas = slots_del_medico(medico)[:cantidad_slots]
+        return medico, pacientes, [(fecha, hora) for hora in horas]
+
+    def _ejecutar(self, medico, pacientes, slots, options):
+        hilos = options['hilos']
+        por_hilo = options['reservas'] // hilos
+
+        def trabajador(numero):
+            azar = random.Random(options['semilla'] + numero)
+            cliente = APIClient()
+            cliente.force_authenticate(pacientes[numero % len(pacientes)])
+            muestras = []
+            try:
+                for _ in range(por_hilo):
+                    fecha, hora = azar.choice(slots)
+                    inicio = reloj.perf_counter()
+                    respuesta = cliente.post('/api/citas/', {
+                        'medico': medico.id,
+                        'fecha': fecha.isoformat(),
+                        'hora': hora.isoformat(),
+                        'motivo': 'benchmark',
+                    }, format='json')
+                    muestras.append((respuesta.status_code, reloj.perf_counter() - inicio))
+            finally:
+                connection.close()
+            return muestras
+
+        inicio = reloj.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            muestras = [m for lote in pool.map(trabajador, range(hilos)) for m in lote]
+        duracion = reloj.perf_counter() - inicio
+
+        from citas.models import Cita
+        activas = Cita.objects.filter(medico=medico, estado__in=Cita.ESTADOS_ACTIVOS)
+        duplicados = activas.values('fecha', 'hora').annotate(n=Count('id')).filter(n__gt=1).count()
+
+        codigos = {}
+        for codigo, _ in muestras:
+            codigos[codigo] = codigos.get(codigo, 0) + 1
+        latencias = sorted(segundos * 1000 for _, segundos in muestras)
+
+        return {
+            'motor': connection.vendor,
+            'hilos': hilos,
+            'intentos': len(muestras),
+            'slots': len(slots),
+            'duracion_s': round(duracion, 3),
+            'reservas_por_s': round(len(muestras) / duracion, 1) if duracion else None,
+            'codigos': codigos,
+            'latencia_ms': {
+                'p50': round(statistics.median(latencias), 2),
+                'p95': round(percentil(latencias, 95), 2),
+                'p99': round(percentil(latencias, 99), 2),
+                'max': round(latencias[-1], 2),
+            },
+            'citas_activas': activas.count(),
+            'slots_duplicados': duplicados,
+        }
+
+    def _reportar(self, resultado, salida_json):
+        if salida_json:
+            with open(salida_json, 'w') as archivo:
+                json.dump(resultado, archivo, indent=2)
+
+        self.stdout.write(json.dumps(resultado, indent=2))
+        creadas = resultado['codigos'].get(201, 0)
+        if resultado['slots_duplicados'] or creadas != resultado['citas_activas']:
+            self.stderr.write(self.style.ERROR('❌ Se detectaron reservas duplicadas'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {creadas} reservas, ningún horario duplicado'))
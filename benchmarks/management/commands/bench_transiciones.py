@@ -0,0 +1,150 @@
+# benchmarks/management/commands/bench_transiciones.py
+import json
+import time as reloj
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from threading import Barrier
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks.entorno import base_de_datos_temporal, sin_logs
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía la misma transición (confirmar y luego cancelar) sobre las mismas '
+        'citas desde varios hilos a la vez y verifica que cada transición se '
+        'aplique exactamente una vez (sin actualizaciones perdidas).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--citas', type=int, default=50)
+        parser.add_argument('--json', dest='salida_json', help='Escribe el resultado en este archivo')
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal(concurrente=True), sin_logs():
+            admin, citas = self._preparar_datos(options['citas'])
+            resultado = {
+                'motor': connection.vendor,
+                'hilos': options['hilos'],
+                'citas': len(citas),
+                'rondas': [self._ronda(admin, citas, accion, options['hilos']) for accion in ('confirmar', 'cancelar')],
+                'estadisticas_correctas': self._estadisticas_correctas(),
+            }
+
+        self._reportar(resultado, options.get('salida_json'))
+
+    def _preparar_datos(self, cantidad):
+        from citas.estadisticas import recalcular
+        from citas.models import Cita
+        from medicos.disponibilidad import slots_del_medico
+        from medicos.models import Especialidad, Medico
+        from pacientes.models import Paciente
+
+        admin = User.objects.create_user('bench.admin', password='x', is_staff=True)
+        admin.perfil.tipo_usuario = 'admin'
+        admin.perfil.save()
+
+        user = User.objects.create_user('bench.medico', password='x')
+        user.perfil.tipo_usuario = 'medico'
+        user.perfil.save()
+        medico = Medico.objects.create(
+            user=user, especialidad=Especialidad.objects.create(nombre='Benchmark'), telefono='0',
+            horario_inicio=time(7), horario_fin=time(19),
+        )
+        user = User.objects.create_user('bench.paciente', password='x')
+        paciente = Paciente.objects.create(user=user, dni='999-000000-0000B', telefono='0', direccion='-')
+
+        horas = slots_del_medico(medico)
+        inicio = timezone.localdate() + timedelta(days=2)
+        citas = Cita.objects.bulk_create([
+            Cita(
+                paciente=paciente, medico=medico, motivo='benchmark',
+                fecha=inicio + timedelta(days=i // len(horas)), hora=horas[i % len(horas)],
+            )
+            for i in range(cantidad)
+        ])
+        # bulk_create no registra los deltas de EstadisticaCita
+        recalcular()
+        return admin, [cita.id for cita in citas]
+
+    def _estadisticas_correctas(self):
+        """Los deltas registrados por las transiciones concurrentes suman lo mismo que Cita."""
+        from django.db.models import Count, Sum
+
+        from citas.models import Cita, EstadisticaCita
+
+        reales = {
+            (f['fecha'], f['medico_id'], f['estado']): f['n']
+            for f in Cita.objects.values('fecha', 'medico_id', 'estado').annotate(n=Count('id')).order_by()
+        }
+        registradas = {
+            (f['fecha'], f['medico_id'], f['estado']): f['n']
+            for f in EstadisticaCita.objects.values('fecha', 'medico_id', 'estado').annotate(n=Sum('cantidad')).order_by()
+            if f['n']
+        }
+        return reales == registradas
+
+    def _ronda(self, admin, citas, accion, hilos):
+        """Todos los hilos envían ``accion`` para cada cita, sincronizados por una barrera."""
+        from citas.models import Cita
+
+        barrera = Barrier(hilos)
+
+        def trabajador(_):
+            cliente = APIClient()
+            cliente.force_authenticate(admin)
+            codigos = []
+            try:
+                for cita_id in citas:
+                    barrera.wait()
+                    respuesta = cliente.put(f'/api/citas/{cita_id}/{accion}/')
+                    codigos.append((cita_id, respuesta.status_code))
+            finally:
+                connection.close()
+            return codigos
+
+        inicio = reloj.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            respuestas = [r for lote in pool.map(trabajador, range(hilos)) for r in lote]
+        duracion = reloj.perf_counter() - inicio
+
+        exitos = {}
+        codigos = {}
+        for cita_id, codigo in respuestas:
+            codigos[codigo] = codigos.get(codigo, 0) + 1
+            if codigo == 200:
+                exitos[cita_id] = exitos.get(cita_id, 0) + 1
+
+        esperado = {'confirmar': 'confirmada', 'cancelar': 'cancelada'}[accion]
+        return {
+            'accion': accion,
+            'peticiones': len(respuestas),
+            'duracion_s': round(duracion, 3),
+            'codigos': codigos,
+            'citas_sin_exito': sum(1 for cita_id in citas if cita_id not in exitos),
+            'citas_con_exito_duplicado': sum(1 for n in exitos.values() if n > 1),
+            'estado_final_incorrecto': Cita.objects.filter(id__in=citas).exclude(estado=esperado).count(),
+        }
+
+    def _reportar(self, resultado, salida_json):
+        if salida_json:
+            with open(salida_json, 'w') as archivo:
+                json.dump(resultado, archivo, indent=2)
+
+        self.stdout.write(json.dumps(resultado, indent=2))
+        fallos = [
+            ronda for ronda in resultado['rondas']
+            if ronda['citas_sin_exito'] or ronda['citas_con_exito_duplicado'] or ronda['estado_final_incorrecto']
+        ]
+        if fallos:
+            self.stderr.write(self.style.ERROR('❌ Transiciones perdidas o aplicadas más de una vez'))
+        elif not resultado['estadisticas_correctas']:
+            self.stderr.write(self.style.ERROR('❌ EstadisticaCita no coincide con las citas'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Cada transición se aplicó exactamente una vez'))
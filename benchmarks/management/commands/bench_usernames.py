@@ -0,0 +1,120 @@
+# benchmarks/management/commands/bench_usernames.py
+import json
+import statistics
+import time as reloj
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from autenticacion.usernames import con_sufijo, crear_usuario, siguiente_sufijo
+from benchmarks.entorno import base_de_datos_temporal, sin_logs
+from citas_medicas.consultas import medir_consultas
+
+
+def username_antiguo(base):
+    """El bucle que usaban PacienteSerializer y MedicoSerializer."""
+    username = base
+    counter = 1
+    while User.objects.filter(username=username).exists():
+        username = f"{base}{counter}"
+        counter += 1
+    return username
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la búsqueda de username libre del bucle antiguo (un exists() '
+        'por candidato) con autenticacion/usernames.py sobre una base con '
+        '--colisiones usernames ocupados, y verifica que altas simultáneas '
+        'con la misma base obtengan usernames distintos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colisiones', type=int, default=10000)
+        parser.add_argument('--base', default='maria.lopez')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--json', dest='salida_json', help='Escribe el resultado en este archivo')
+
+    def handle(self, *args, **options):
+        base = options['base']
+        with base_de_datos_temporal(concurrente=True), sin_logs():
+            self._preparar_datos(base, options['colisiones'])
+            resultado = {
+                'motor': connection.vendor,
+                'colisiones': options['colisiones'],
+                'antiguo': self._medir(lambda: username_antiguo(base), options['repeticiones']),
+                'nuevo': self._medir(lambda: con_sufijo(base, siguiente_sufijo(base)), options['repeticiones']),
+                'concurrencia': self._concurrencia(base, options['hilos']),
+            }
+
+        self._reportar(resultado, options.get('salida_json'))
+
+    def _preparar_datos(self, base, colisiones):
+        hash_password = make_password(None)
+        ahora = timezone.now()
+        User.objects.bulk_create([
+            User(username=con_sufijo(base, i), password=hash_password, date_joined=ahora)
+            for i in range(colisiones)
+        ], batch_size=5000)
+        # Otros usuarios que comparten el prefijo pero no son sufijos numéricos
+        User.objects.bulk_create([
+            User(username=f'{base}.{i}', password=hash_password, date_joined=ahora) for i in range(100)
+        ])
+
+    def _medir(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            with medir_consultas() as medicion:
+                inicio = reloj.perf_counter()
+                username = funcion()
+                tiempos.append((reloj.perf_counter() - inicio) * 1000)
+        return {
+            'username': username,
+            'consultas': medicion.total,
+            'p50_ms': round(statistics.median(tiempos), 2),
+        }
+
+    def _concurrencia(self, base, hilos):
+        """Todos los hilos crean un usuario con la misma base a la vez."""
+        barrera = Barrier(hilos)
+
+        def trabajador(_):
+            try:
+                barrera.wait()
+                return crear_usuario(base, password=None).username
+            except Exception as e:
+                return f'error: {e}'
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            usernames = list(pool.map(trabajador, range(hilos)))
+        return {
+            'hilos': hilos,
+            'errores': sum(1 for u in usernames if u.startswith('error: ')),
+            'distintos': len(set(usernames)),
+            'usernames': sorted(usernames),
+        }
+
+    def _reportar(self, resultado, salida_json):
+        if salida_json:
+            with open(salida_json, 'w') as archivo:
+                json.dump(resultado, archivo, indent=2)
+
+        self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False))
+        concurrencia = resultado['concurrencia']
+        if concurrencia['errores'] or concurrencia['distintos'] != concurrencia['hilos']:
+            self.stderr.write(self.style.ERROR('❌ Altas simultáneas con username repetido o fallidas'))
+        elif resultado['antiguo']['username'] != resultado['nuevo']['username']:
+            self.stderr.write(self.style.ERROR('❌ El username asignado no coincide con el del bucle antiguo'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {resultado['antiguo']['consultas']} → {resultado['nuevo']['consultas']} consultas, "
+                f"{resultado['antiguo']['p50_ms']} → {resultado['nuevo']['p50_ms']} ms"
+            ))
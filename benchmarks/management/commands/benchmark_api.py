@@ -0,0 +1,223 @@
+# benchmarks/management/commands/benchmark_api.py
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time as reloj
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from autenticacion.models import PerfilUsuario
+from autenticacion.tokens import emitir_tokens
+from benchmarks.entorno import base_de_datos_temporal, percentil, sin_logs
+from benchmarks.escenarios import ESCENARIOS, ROLES
+
+
+class Contexto:
+    """Usuarios, ids y slots libres que comparten los escenarios."""
+
+    def __init__(self):
+        from citas.models import Cita
+        from medicos.models import Medico
+        from pacientes.models import Paciente
+
+        admin = User.objects.create(
+            username='bench.admin', password=make_password('admin123'),
+            is_staff=True, is_superuser=True,
+        )
+        PerfilUsuario.objects.update_or_create(user=admin, defaults={'tipo_usuario': 'admin'})
+
+        # El médico y el paciente con más citas, para que sus listados pesen
+        medico = Medico.objects.select_related('user').order_by('id').first()
+        paciente = (
+            Paciente.objects.filter(citas__medico=medico).select_related('user').order_by('id').first()
+            or Paciente.objects.select_related('user').order_by('id').first()
+        )
+        self.medico = medico
+        self.medico_id = medico.id
+        self.paciente_id = paciente.id
+        self.usuarios = {'admin': admin, 'medico': medico.user, 'paciente': paciente.user}
+
+        cita = Cita.objects.filter(medico=medico, paciente=paciente).order_by('id').first()
+        self.cita_visible = {rol: cita.id for rol in ROLES}
+
+        self._slots = iter(())
+        self._desde = timezone.localdate() + timedelta(days=1)
+
+    def siguiente_slot(self):
+        from medicos.disponibilidad import calcular_disponibilidad
+
+        for slot in self._slots:
+            return slot
+
+        while True:
+            hasta = self._desde + timedelta(days=30)
+            libres = calcular_disponibilidad([self.medico], self._desde, hasta)[self.medico_id]
+            self._desde = hasta + timedelta(days=1)
+            slots = [(fecha, hora) for fecha, horas in libres for hora in horas]
+            if slots:
+                self._slots = iter(slots)
+                return next(self._slots)
+
+    def cliente(self, rol):
+        cliente = APIClient()
+        _, token = emitir_tokens(self.usuarios[rol])
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return cliente
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark reproducible de la API: siembra una BD temporal con '
+        'seed_load y mide cada endpoint por rol dentro del proceso (sin red). '
+        'Reporta percentiles de latencia, consultas SQL y memoria asignada '
+        'por petición, y escribe un JSON comparable entre commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=2000)
+        parser.add_argument('--medicos', type=int, default=20)
+        parser.add_argument('--citas', type=int, default=5000)
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--repeticiones', type=int, default=30, help='Peticiones medidas por escenario y rol')
+        parser.add_argument('--calentamiento', type=int, default=3)
+        parser.add_argument('--escenarios', help=f"Lista separada por comas (por defecto todos: {','.join(ESCENARIOS)})")
+        parser.add_argument('--salida', help='Archivo JSON de resultados')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior para mostrar la diferencia')
+
+    def handle(self, *args, **options):
+        nombres = options['escenarios'].split(',') if options['escenarios'] else list(ESCENARIOS)
+        desconocidos = set(nombres) - set(ESCENARIOS)
+        if desconocidos:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+        with base_de_datos_temporal(), sin_logs():
+            inicio = reloj.perf_counter()
+            call_command(
+                'seed_load', pacientes=options['pacientes'], medicos=options['medicos'],
+                citas=options['citas'], semilla=options['semilla'], stdout=io.StringIO(),
+            )
+            self.stdout.write(f'Datos sembrados en {reloj.perf_counter() - inicio:.1f}s')
+
+            ctx = Contexto()
+            resultados = {}
+            for nombre in nombres:
+                resultados[nombre] = {}
+                for rol in ROLES:
+                    medida = self._medir(ESCENARIOS[nombre], ctx, rol, options)
+                    resultados[nombre][rol] = medida
+                    self._imprimir(nombre, rol, medida)
+
+        informe = {'meta': self._meta(options), 'resultados': resultados}
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump(informe, archivo, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultados en {options['salida']}"))
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados)
+
+    # ==================== MEDICIÓN ====================
+
+    def _medir(self, escenario, ctx, rol, options):
+        cliente = ctx.cliente(rol)
+        peticiones = escenario(ctx, rol)
+
+        for _ in range(options['calentamiento']):
+            self._enviar(cliente, *next(peticiones))
+
+        latencias, consultas, codigos = [], [], {}
+        for _ in range(options['repeticiones']):
+            metodo, url, datos = next(peticiones)
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = reloj.perf_counter()
+                respuesta = self._enviar(cliente, metodo, url, datos)
+                latencias.append((reloj.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+            codigos[str(respuesta.status_code)] = codigos.get(str(respuesta.status_code), 0) + 1
+
+        # Memoria en una pasada aparte: tracemalloc distorsiona la latencia
+        asignado = []
+        for _ in range(min(5, options['repeticiones'])):
+            metodo, url, datos = next(peticiones)
+            tracemalloc.start()
+            self._enviar(cliente, metodo, url, datos)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            asignado.append(pico / 1024)
+
+        latencias.sort()
+        return {
+            'n': len(latencias),
+            'codigos': codigos,
+            'latencia_ms': {
+                'p50': round(percentil(latencias, 50), 3),
+                'p90': round(percentil(latencias, 90), 3),
+                'p99': round(percentil(latencias, 99), 3),
+                'media': round(statistics.fmean(latencias), 3),
+            },
+            'consultas': {'media': round(statistics.fmean(consultas), 2), 'max': max(consultas)},
+            'memoria_pico_kb': round(statistics.median(asignado), 1),
+        }
+
+    def _enviar(self, cliente, metodo, url, datos):
+        if datos is None:
+            return getattr(cliente, metodo)(url)
+        return getattr(cliente, metodo)(url, datos, format='json')
+
+    # ==================== REPORTE ====================
+
+    def _imprimir(self, nombre, rol, medida):
+        latencia = medida['latencia_ms']
+        self.stdout.write(
+            f"{nombre:<20} {rol:<9} p50={latencia['p50']:>8.2f}ms p90={latencia['p90']:>8.2f}ms "
+            f"consultas={medida['consultas']['media']:>5} mem={medida['memoria_pico_kb']:>9}KB "
+            f"{medida['codigos']}"
+        )
+
+    def _meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                cwd=settings.BASE_DIR, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'datos': {k: options[k] for k in ('pacientes', 'medicos', 'citas', 'semilla')},
+            'repeticiones': options['repeticiones'],
+        }
+
+    def _comparar(self, ruta, resultados):
+        with open(ruta) as archivo:
+            anterior = json.load(archivo)['resultados']
+
+        self.stdout.write('\nDiferencia de p50 y consultas respecto a la ejecución anterior:')
+        for nombre, por_rol in resultados.items():
+            for rol, medida in por_rol.items():
+                previa = anterior.get(nombre, {}).get(rol)
+                if not previa:
+                    continue
+                antes, ahora = previa['latencia_ms']['p50'], medida['latencia_ms']['p50']
+                cambio = (ahora - antes) / antes * 100 if antes else 0
+                self.stdout.write(
+                    f"{nombre:<20} {rol:<9} p50 {antes:>8.2f} -> {ahora:>8.2f}ms ({cambio:+.1f}%)  "
+                    f"consultas {previa['consultas']['media']} -> {medida['consultas']['media']}"
+                )
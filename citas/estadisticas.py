@@ -0,0 +1,222 @@
+# citas/estadisticas.py
+"""
+Estadísticas de citas para el tablero del administrador
+(``GET /api/citas/estadisticas/``).
+
+En lugar de agregar sobre toda la tabla ``Cita`` en cada petición, los
+totales por (fecha, médico, estado) se mantienen en ``EstadisticaCita``,
+una fila por clave:
+
+- cada alta, transición, cambio de fecha o médico y baja suma su delta
+  (+1/-1) al contador con un ``INSERT ... ON CONFLICT DO UPDATE``, en la
+  misma transacción que el cambio. Las señales de ``Cita`` cubren
+  ``save()``/``delete()``; las transiciones y los lotes, que usan
+  ``update()``/``bulk_create``, llaman a ``registrar``;
+- el comando ``recalcular_estadisticas`` recalcula los totales desde
+  ``Cita`` (p. ej. tras cargas con SQL directo como ``seed_load``).
+
+El tablero lee un rango de fechas con una sola consulta agregada sobre esa
+tabla, cuyo tamaño depende de días × médicos × estados y no de la
+cantidad de citas ni de cambios.
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Cita, EstadisticaCita
+
+ESTADOS = [estado for estado, _ in Cita.ESTADOS]
+
+
+def registrar(cambios):
+    """
+    Suma los deltas ``(fecha, medico_id, estado, delta)`` a sus contadores
+    (una consulta). Los que se anulan entre sí no se escriben.
+    """
+    totales = Counter()
+    for fecha, medico_id, estado, delta in cambios:
+        totales[(fecha, medico_id, estado)] += delta
+
+    # Siempre en el mismo orden: dos transacciones que tocan las mismas
+    # claves las bloquean en el mismo orden y no se interbloquean
+    filas = sorted(
+        ((fecha, medico_id, estado, cantidad) for (fecha, medico_id, estado), cantidad in totales.items() if cantidad),
+        key=lambda fila: (fila[0], fila[1], ESTADOS.index(fila[2])),
+    )
+    if not filas:
+        return
+
+    nombre = connection.ops.quote_name
+    tabla = nombre(EstadisticaCita._meta.db_table)
+    clave = ', '.join(nombre(columna) for columna in ('fecha', 'medico_id', 'estado'))
+    sql = (
+        f"INSERT INTO {tabla} ({clave}, {nombre('cantidad')}) "
+        f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(filas))} "
+        f"ON CONFLICT ({clave}) DO UPDATE "
+        f"SET {nombre('cantidad')} = {tabla}.{nombre('cantidad')} + EXCLUDED.{nombre('cantidad')}"
+    )
+    params = [
+        valor
+        for fecha, medico_id, estado, cantidad in filas
+        for valor in (connection.ops.adapt_datefield_value(fecha), medico_id, estado, cantidad)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def transicion(fecha, medico_id, origen, destino):
+    """Deltas de una cita que pasa de ``origen`` a ``destino``."""
+    return [(fecha, medico_id, origen, -1), (fecha, medico_id, destino, 1)]
+
+
+# ==================== MANTENIMIENTO ====================
+
+def _bloquear():
+    """
+    Impide que se sumen deltas mientras se reescribe la tabla. En SQLite
+    la transacción ya tiene la base bloqueada para escritura.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {connection.ops.quote_name(EstadisticaCita._meta.db_table)} IN EXCLUSIVE MODE')
+
+
+def _reemplazar(filas, estadisticas):
+    """Borra ``estadisticas`` e inserta ``filas`` (dicts con fecha, medico_id, estado, cantidad)."""
+    nuevas = [EstadisticaCita(**fila) for fila in filas if fila['cantidad']]
+    estadisticas.delete()
+    EstadisticaCita.objects.bulk_create(nuevas, batch_size=5000)
+    return len(nuevas)
+
+
+def recalcular(desde=None, hasta=None):
+    """Recalcula desde ``Cita`` las fechas entre ``desde`` y ``hasta`` (None = sin límite)."""
+    citas = Cita.objects.all()
+    estadisticas = EstadisticaCita.objects.all()
+    if desde:
+        citas = citas.filter(fecha__gte=desde)
+        estadisticas = estadisticas.filter(fecha__gte=desde)
+    if hasta:
+        citas = citas.filter(fecha__lte=hasta)
+        estadisticas = estadisticas.filter(fecha__lte=hasta)
+
+    with transaction.atomic():
+        _bloquear()
+        filas = list(citas.values('fecha', 'medico_id', 'estado').annotate(cantidad=Count('id')).order_by())
+        return _reemplazar(filas, estadisticas)
+
+
+# ==================== TABLERO ====================
+
+def rango_desde_parametros(params, ahora=None):
+    """
+    Lee ``desde``/``hasta`` (YYYY-MM-DD) de la query string.
+
+    Por defecto, el mes en curso. Lanza ``ValueError`` con un mensaje para el
+    cliente si el rango no es válido.
+    """
+    hoy = (ahora or timezone.localtime()).date()
+    primero = hoy.replace(day=1)
+    ultimo = (primero + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+    try:
+        desde = date.fromisoformat(params['desde']) if params.get('desde') else primero
+        hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else max(ultimo, desde)
+    except ValueError:
+        raise ValueError('Formato de fecha inválido. Use: AAAA-MM-DD')
+
+    if hasta < desde:
+        raise ValueError('La fecha "hasta" debe ser posterior a "desde"')
+
+    max_dias = settings.CITAS_ESTADISTICAS_MAX_DIAS
+    if (hasta - desde).days + 1 > max_dias:
+        raise ValueError(f'El rango no puede superar {max_dias} días')
+
+    return desde, hasta
+
+
+def _por_estado():
+    return dict.fromkeys(ESTADOS, 0)
+
+
+def _tasa(parte, total):
+    return round(parte / total, 4) if total else None
+
+
+def resumen(desde, hasta, ahora=None):
+    """
+    Totales por estado, especialidad y día, y tasas de cancelación e
+    inasistencia entre ``desde`` y ``hasta``. Una consulta.
+
+    Una cita cuenta como inasistencia si su fecha ya pasó y sigue pendiente
+    o confirmada (nunca se finalizó); la tasa es sobre las citas pasadas no
+    canceladas.
+    """
+    hoy = (ahora or timezone.localtime()).date()
+    filas = (
+        EstadisticaCita.objects.filter(fecha__range=(desde, hasta))
+        .values('fecha', 'estado', 'medico__especialidad_id', 'medico__especialidad__nombre')
+        .annotate(cantidad=Sum('cantidad')).order_by()
+    )
+
+    por_estado = _por_estado()
+    por_dia = {}
+    por_especialidad = {}
+    pasadas = 0
+    no_asistidas = 0
+
+    for fila in filas:
+        cantidad = fila['cantidad']
+        if not cantidad:
+            continue
+        estado = fila['estado']
+        por_estado[estado] += cantidad
+
+        dia = por_dia.setdefault(fila['fecha'], _por_estado())
+        dia[estado] += cantidad
+
+        especialidad = por_especialidad.setdefault(fila['medico__especialidad_id'], {
+            'especialidad': fila['medico__especialidad_id'],
+            'especialidad_nombre': fila['medico__especialidad__nombre'] or 'Sin especialidad',
+            'por_estado': _por_estado(),
+        })
+        especialidad['por_estado'][estado] += cantidad
+
+        if fila['fecha'] < hoy and estado != 'cancelada':
+            pasadas += cantidad
+            if estado in Cita.ESTADOS_ACTIVOS:
+                no_asistidas += cantidad
+
+    total = sum(por_estado.values())
+    especialidades = [
+        {**especialidad, 'total': sum(especialidad['por_estado'].values())}
+        for especialidad in por_especialidad.values()
+    ]
+    especialidades.sort(key=lambda especialidad: (-especialidad['total'], especialidad['especialidad_nombre']))
+
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'total': total,
+        'por_estado': por_estado,
+        'tasa_cancelacion': _tasa(por_estado['cancelada'], total),
+        'no_asistidas': no_asistidas,
+        'tasa_inasistencia': _tasa(no_asistidas, pasadas),
+        'por_especialidad': especialidades,
+        'por_dia': [
+            {'fecha': fecha.isoformat(), 'total': sum(estados.values()), 'por_estado': estados}
+            for fecha, estados in sorted(por_dia.items())
+        ],
+    }
+
+
+def total_citas(medico_id=None):
+    """Citas registradas (todas o de un médico), sin contar sobre ``Cita``."""
+    estadisticas = EstadisticaCita.objects.all()
+    if medico_id is not None:
+        estadisticas = estadisticas.filter(medico_id=medico_id)
+    return estadisticas.aggregate(total=Sum('cantidad'))['total'] or 0
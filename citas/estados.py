@@ -0,0 +1,125 @@
+# citas/estados.py
+"""
+Reglas de transición de estado de una cita.
+
+Las usan tanto los endpoints individuales (confirmar/cancelar/finalizar)
+como ``bulk-estado``, para que los mensajes y las reglas sean los mismos.
+"""
+from collections import namedtuple
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.utils import timezone
+
+from medicos.agenda import invalidar_agenda
+from . import estadisticas
+from .models import Cita
+
+Transicion = namedtuple('Transicion', ['destino', 'origenes', 'roles', 'error_estado', 'error_rol'])
+
+TRANSICIONES = {
+    'confirmar': Transicion(
+        destino='confirmada',
+        origenes=('pendiente',),
+        roles=('medico', 'admin'),
+        error_estado='La cita ya está {estado}',
+        error_rol='Solo médicos y administradores pueden confirmar citas',
+    ),
+    'cancelar': Transicion(
+        destino='cancelada',
+        origenes=('pendiente', 'confirmada'),
+        roles=('paciente', 'medico', 'admin'),
+        error_estado='No se puede cancelar una cita {estado}',
+        error_rol='No tiene permiso para cancelar citas',
+    ),
+    'finalizar': Transicion(
+        destino='finalizada',
+        origenes=('confirmada',),
+        roles=('medico', 'admin'),
+        error_estado='Solo se pueden finalizar citas confirmadas (actual: {estado})',
+        error_rol='Solo médicos y administradores pueden finalizar citas',
+    ),
+}
+
+
+def error_de_rol(accion, identidad):
+    """Mensaje de error si el rol no puede aplicar la acción, o None."""
+    transicion = TRANSICIONES[accion]
+    if identidad.tipo_usuario not in transicion.roles:
+        return transicion.error_rol
+    return None
+
+
+def error_de_propiedad(accion, identidad, medico_id, paciente_id):
+    """Médicos y pacientes solo pueden tocar sus propias citas."""
+    if identidad.es_medico and medico_id != identidad.medico_id:
+        return f'Solo puede {accion} sus propias citas'
+    if identidad.es_paciente and paciente_id != identidad.paciente_id:
+        return f'Solo puede {accion} sus propias citas'
+    return None
+
+
+def error_de_estado(accion, estado):
+    """Mensaje de error si la cita no está en un estado de origen válido, o None."""
+    transicion = TRANSICIONES[accion]
+    if estado not in transicion.origenes:
+        return transicion.error_estado.format(estado=estado)
+    return None
+
+
+def _actualizar_desde(visibles, cita_id, origen, destino):
+    """
+    ``UPDATE ... SET estado=destino WHERE id IN (<visibles>) AND estado=origen
+    RETURNING medico_id, fecha``: devuelve ``(medico_id, fecha)`` de la cita
+    cambiada o None. Django no expone ``RETURNING`` en ``update()`` y sin él
+    haría falta leer la fila antes.
+    """
+    try:
+        sql_visibles, params_visibles = visibles.filter(id=cita_id).values('id').order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+    nombre = connection.ops.quote_name
+    sql = (
+        f"UPDATE {nombre(Cita._meta.db_table)} SET {nombre('estado')} = %s, {nombre('actualizado_en')} = %s "
+        f"WHERE {nombre('id')} IN ({sql_visibles}) AND {nombre('estado')} = %s "
+        f"RETURNING {nombre('medico_id')}, {nombre('fecha')}"
+    )
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [destino, ahora, *params_visibles, origen])
+        fila = cursor.fetchone()
+
+    if fila is None:
+        return None
+    medico_id, fecha = fila
+    # SQLite devuelve la fecha como texto
+    return medico_id, Cita._meta.get_field('fecha').to_python(fecha)
+
+
+def aplicar_transicion(visibles, cita_id, accion):
+    """
+    Aplica la transición sobre ``visibles`` (las citas que el usuario puede
+    ver) sin leer la fila antes: un ``UPDATE`` condicionado por cada estado
+    de origen (uno para confirmar y finalizar, dos para cancelar), que
+    devuelve médico y fecha para la agenda y las estadísticas.
+
+    Devuelve ``(True, estado_nuevo)`` si se aplicó. Si no, ``(False, estado_actual)``
+    leyendo la fila, o ``(False, None)`` si la cita no existe para el usuario.
+    Dos peticiones simultáneas nunca pueden aplicar ambas la misma
+    transición: la segunda ya no encuentra la fila en un estado de origen.
+    """
+    transicion = TRANSICIONES[accion]
+
+    with transaction.atomic():
+        for origen in transicion.origenes:
+            fila = _actualizar_desde(visibles, cita_id, origen, transicion.destino)
+            if fila is not None:
+                # El UPDATE no dispara señales: agenda y estadísticas a mano
+                medico_id, fecha = fila
+                invalidar_agenda([(medico_id, fecha)])
+                estadisticas.registrar(estadisticas.transicion(fecha, medico_id, origen, transicion.destino))
+                return True, transicion.destino
+
+    estado = visibles.filter(id=cita_id).values_list('estado', flat=True).first()
+    return False, estado
@@ -0,0 +1,86 @@
+# citas/exportacion.py
+"""
+Exportación de citas a CSV o XLSX (``GET /api/citas/export/``).
+
+Parte de ``get_queryset()`` (cada rol exporta solo las citas que puede ver)
+con los mismos filtros del listado (ver citas/filtros.py) y un rango de
+fechas ``desde``/``hasta`` de hasta ``CITAS_EXPORTACION_MAX_DIAS`` días.
+Las filas se leen con una proyección ``values_list`` (sin instanciar
+modelos ni serializers) y un cursor del lado del servidor, y se escriben en
+streaming (ver citas_medicas/exportacion.py).
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from citas_medicas.streaming import TAMANO_LOTE
+from .models import Cita
+
+ENCABEZADOS = (
+    'ID', 'Fecha', 'Hora', 'Estado', 'Paciente', 'DNI', 'Médico', 'Especialidad', 'Motivo', 'Creada en',
+)
+CAMPOS = (
+    'id', 'fecha', 'hora', 'estado',
+    'paciente__user__first_name', 'paciente__user__last_name', 'paciente__dni',
+    'medico__user__first_name', 'medico__user__last_name', 'medico__especialidad__nombre',
+    'motivo', 'creada_en',
+)
+NOMBRES_ESTADO = dict(Cita.ESTADOS)
+
+
+def rango_desde_parametros(params, ahora=None):
+    """
+    Lee ``desde``/``hasta`` (YYYY-MM-DD) de la query string; por defecto, el
+    mes en curso. Lanza ``ValueError`` con un mensaje para el cliente si el
+    rango no es válido o supera ``CITAS_EXPORTACION_MAX_DIAS``.
+    """
+    hoy = (ahora or timezone.localtime()).date()
+    primero = hoy.replace(day=1)
+    ultimo = (primero + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+    try:
+        desde = date.fromisoformat(params['desde']) if params.get('desde') else primero
+        hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else max(ultimo, desde)
+    except ValueError:
+        raise ValueError('Formato de fecha inválido. Use: AAAA-MM-DD')
+
+    if hasta < desde:
+        raise ValueError('La fecha "hasta" debe ser posterior a "desde"')
+
+    max_dias = settings.CITAS_EXPORTACION_MAX_DIAS
+    if (hasta - desde).days + 1 > max_dias:
+        raise ValueError(f'El rango no puede superar {max_dias} días')
+
+    return desde, hasta
+
+
+def _nombre(nombre, apellido):
+    return f'{nombre or ""} {apellido or ""}'.strip()
+
+
+def _hora_local(momento, zona):
+    """Sin zona ni microsegundos: ``2026-10-12 08:30:00`` en CSV, fecha y hora en Excel."""
+    if timezone.is_aware(momento):
+        momento = timezone.localtime(momento, zona)
+    return momento.replace(tzinfo=None, microsecond=0)
+
+
+def filas(citas):
+    """Tuplas en el orden de ``ENCABEZADOS``, leídas por lotes."""
+    zona = timezone.get_current_timezone()
+    consulta = citas.order_by('fecha', 'hora', 'id').values_list(*CAMPOS)
+    for (id_, fecha, hora, estado, paciente_nombre, paciente_apellido, dni,
+         medico_nombre, medico_apellido, especialidad, motivo, creada_en) in consulta.iterator(chunk_size=TAMANO_LOTE):
+        yield (
+            id_,
+            fecha,
+            hora,
+            NOMBRES_ESTADO.get(estado, estado),
+            _nombre(paciente_nombre, paciente_apellido),
+            dni,
+            _nombre(medico_nombre, medico_apellido),
+            especialidad or '',
+            motivo,
+            _hora_local(creada_en, zona),
+        )
@@ -0,0 +1,112 @@
+# citas/filtros.py
+"""
+Filtros, búsqueda y orden del listado de citas (``GET /api/citas/``).
+
+Se aplican sobre ``get_queryset()``, así que siempre quedan dentro de las
+citas que el rol puede ver. Cada filtro tiene un índice que lo respalda:
+
+- ``estado``: ``cita_estado_fecha_idx``
+- ``medico``: ``cita_medico_fecha_estado_idx``
+- ``paciente``: ``cita_paciente_fecha_idx``
+- ``especialidad``: índice de la FK ``medico.especialidad`` + el de médico
+- ``fecha__gte`` / ``fecha__lte``: ``cita_fecha_hora_id_idx``
+- ``search`` (texto en ``motivo``): ``cita_motivo_trgm_idx`` (trigramas,
+  solo PostgreSQL; ver migración 0006)
+
+``ordering`` solo admite los órdenes de ``ORDENES``, que terminan en ``id``
+para que la paginación por cursor sea estable.
+"""
+import re
+from datetime import date
+
+from .models import Cita
+
+ORDENES = {
+    'fecha': ('fecha', 'hora', 'id'),
+    '-fecha': ('-fecha', '-hora', '-id'),
+    'creada_en': ('creada_en', 'id'),
+    '-creada_en': ('-creada_en', '-id'),
+}
+
+LARGO_MAXIMO_BUSQUEDA = 100
+# Solo dígitos ASCII (``str.isdigit`` acepta también ``²``, ``٣``...) y que
+# quepan en un entero de 64 bits
+ID = re.compile(r'[0-9]{1,18}')
+
+
+def _lista(valor):
+    """``"a,b"`` → ``['a', 'b']`` (se admite una lista separada por comas)."""
+    return [parte.strip() for parte in valor.split(',') if parte.strip()]
+
+
+def _enteros(params, nombre):
+    valores = _lista(params[nombre])
+    if not valores or not all(ID.fullmatch(valor) for valor in valores):
+        raise ValueError(f'El parámetro "{nombre}" debe ser un id o una lista de ids separados por comas')
+    return [int(valor) for valor in valores]
+
+
+def _fecha(params, nombre):
+    try:
+        return date.fromisoformat(params[nombre])
+    except ValueError:
+        raise ValueError(f'Formato de fecha inválido en "{nombre}". Use: AAAA-MM-DD')
+
+
+def orden_desde_parametros(params):
+    """Campos de ``order_by`` pedidos con ``ordering``, o None si no se pidió."""
+    valor = params.get('ordering')
+    if not valor:
+        return None
+    if valor not in ORDENES:
+        raise ValueError(f"Orden inválido. Use: {', '.join(ORDENES)}")
+    return ORDENES[valor]
+
+
+def filtrar_citas(queryset, params):
+    """
+    Aplica los filtros de ``params`` (query string) a ``queryset``.
+
+    Lanza ``ValueError`` con un mensaje para el cliente si algún parámetro
+    no es válido.
+    """
+    filtros = {}
+
+    if params.get('estado'):
+        estados = _lista(params['estado'])
+        validos = dict(Cita.ESTADOS)
+        invalidos = [estado for estado in estados if estado not in validos]
+        if invalidos or not estados:
+            raise ValueError(f"Estado inválido. Use: {', '.join(validos)}")
+        filtros['estado__in'] = estados
+
+    if params.get('medico'):
+        filtros['medico_id__in'] = _enteros(params, 'medico')
+
+    if params.get('paciente'):
+        filtros['paciente_id__in'] = _enteros(params, 'paciente')
+
+    if params.get('especialidad'):
+        filtros['medico__especialidad_id__in'] = _enteros(params, 'especialidad')
+
+    if params.get('fecha__gte'):
+        filtros['fecha__gte'] = _fecha(params, 'fecha__gte')
+
+    if params.get('fecha__lte'):
+        filtros['fecha__lte'] = _fecha(params, 'fecha__lte')
+
+    if 'fecha__gte' in filtros and 'fecha__lte' in filtros and filtros['fecha__lte'] < filtros['fecha__gte']:
+        raise ValueError('La fecha "fecha__lte" debe ser posterior a "fecha__gte"')
+
+    busqueda = params.get('search', '').strip()
+    if len(busqueda) > LARGO_MAXIMO_BUSQUEDA:
+        raise ValueError(f'La búsqueda no puede superar {LARGO_MAXIMO_BUSQUEDA} caracteres')
+    if busqueda:
+        # En PostgreSQL: UPPER(motivo::text) LIKE UPPER('%...%'), la misma
+        # expresión que indexa cita_motivo_trgm_idx
+        filtros['motivo__icontains'] = busqueda
+
+    if filtros:
+        queryset = queryset.filter(**filtros)
+
+    return queryset
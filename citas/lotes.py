@@ -0,0 +1,193 @@
+# citas/lotes.py
+"""
+Operaciones en lote sobre citas (``/api/citas/bulk/`` y ``/bulk-estado/``).
+
+Cada lote se valida con unas pocas consultas (relaciones precargadas,
+choques de horario en una sola consulta) y se aplica en una transacción.
+El resultado se informa por elemento: un elemento inválido no impide que
+se apliquen los demás.
+"""
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from medicos.agenda import invalidar_agenda
+from medicos.models import Medico
+from pacientes.models import Paciente
+
+from . import estadisticas
+from .estados import TRANSICIONES, error_de_estado, error_de_propiedad
+from .models import Cita
+from .serializers import CitaBulkSerializer, CitaSerializer, es_conflicto_horario
+
+logger = logging.getLogger(__name__)
+
+MENSAJE_CONFLICTO = 'El médico ya tiene una cita programada en este horario'
+
+
+def maximo_por_lote():
+    return getattr(settings, 'CITAS_LOTE_MAX', 500)
+
+
+def _ids_enteros(valores):
+    ids = set()
+    for valor in valores:
+        try:
+            ids.add(int(valor))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def crear_en_lote(items, identidad, contexto):
+    """
+    Crea las citas válidas de ``items`` y devuelve ``(resultados, creadas)``.
+
+    Igual que en ``create``, a un paciente se le asigna su propio perfil de
+    paciente y a un médico su perfil de médico.
+    """
+    resultados = {}
+    datos = []
+    for indice, item in enumerate(items):
+        if not isinstance(item, dict):
+            resultados[indice] = {'indice': indice, 'status': 400, 'errores': {'non_field_errors': ['Se esperaba un objeto']}}
+            continue
+        item = dict(item)
+        if identidad.es_paciente:
+            item['paciente'] = identidad.paciente_id
+        if identidad.es_medico:
+            item['medico'] = identidad.medico_id
+        datos.append((indice, item))
+
+    # Dos consultas para todos los pacientes y médicos del lote
+    precargados = {
+        Paciente: Paciente.objects.select_related('user').in_bulk(
+            _ids_enteros(item.get('paciente') for _, item in datos)
+        ),
+        Medico: Medico.objects.select_related('user', 'especialidad').in_bulk(
+            _ids_enteros(item.get('medico') for _, item in datos)
+        ),
+    }
+    contexto = {**contexto, 'precargados': precargados}
+
+    validas = []
+    for indice, item in datos:
+        serializer = CitaBulkSerializer(data=item, context=contexto)
+        if serializer.is_valid():
+            validas.append((indice, serializer.validated_data))
+        else:
+            resultados[indice] = {'indice': indice, 'status': 400, 'errores': serializer.errors}
+
+    # Choques con citas activas existentes y dentro del mismo lote
+    ocupados = set()
+    if validas:
+        ocupados = set(
+            Cita.objects.filter(
+                estado__in=Cita.ESTADOS_ACTIVOS,
+                medico_id__in={datos_cita['medico'].id for _, datos_cita in validas},
+                fecha__in={datos_cita['fecha'] for _, datos_cita in validas},
+            ).values_list('medico_id', 'fecha', 'hora')
+        )
+
+    nuevas = []
+    for indice, datos_cita in validas:
+        clave = (datos_cita['medico'].id, datos_cita['fecha'], datos_cita['hora'])
+        if clave in ocupados:
+            resultados[indice] = {'indice': indice, 'status': 409, 'error': MENSAJE_CONFLICTO}
+            continue
+        ocupados.add(clave)
+        nuevas.append((indice, Cita(estado='pendiente', **datos_cita)))
+
+    try:
+        with transaction.atomic():
+            Cita.objects.bulk_create([cita for _, cita in nuevas])
+            # bulk_create no dispara las señales de Cita
+            estadisticas.registrar((cita.fecha, cita.medico_id, cita.estado, 1) for _, cita in nuevas)
+        creadas = nuevas
+        invalidar_agenda((cita.medico_id, cita.fecha) for _, cita in creadas)
+    except IntegrityError:
+        # Otra reserva ganó algún horario entre la validación y el INSERT:
+        # se insertan de a una para saber cuáles chocaron.
+        creadas = []
+        for indice, cita in nuevas:
+            cita.pk = None
+            try:
+                with transaction.atomic():
+                    cita.save(force_insert=True)
+                creadas.append((indice, cita))
+            except IntegrityError as e:
+                if es_conflicto_horario(e, cita.medico_id, cita.fecha, cita.hora):
+                    resultados[indice] = {'indice': indice, 'status': 409, 'error': MENSAJE_CONFLICTO}
+                else:
+                    # Otra restricción (p. ej. el paciente se borró a la vez)
+                    resultados[indice] = {'indice': indice, 'status': 400, 'error': f'No se pudo crear la cita: {e}'}
+
+    for indice, cita in creadas:
+        resultados[indice] = {
+            'indice': indice,
+            'status': 201,
+            'cita': CitaSerializer(cita, context=contexto).data,
+        }
+
+    logger.info(f"✅ Lote de citas: {len(creadas)} creadas de {len(items)}")
+    return [resultados[indice] for indice in sorted(resultados)], len(creadas)
+
+
+def cambiar_estado_en_lote(visibles, accion, ids, identidad):
+    """
+    Aplica ``accion`` a las citas ``ids`` dentro de ``visibles`` y devuelve
+    ``(resultados, actualizadas)``.
+
+    Las filas se bloquean (``SELECT ... FOR UPDATE``) mientras se validan y
+    el cambio es un único ``UPDATE ... WHERE estado IN (...)``.
+    """
+    transicion = TRANSICIONES[accion]
+    ids = list(dict.fromkeys(ids))
+
+    resultados = []
+    validos = []
+    with transaction.atomic():
+        filas = {
+            fila['id']: fila
+            for fila in visibles.select_related(None).select_for_update().filter(id__in=ids)
+            .values('id', 'estado', 'medico_id', 'paciente_id', 'fecha')
+        }
+
+        for cita_id in ids:
+            fila = filas.get(cita_id)
+            if fila is None:
+                resultados.append({'id': cita_id, 'status': 404, 'error': 'Cita no encontrada'})
+                continue
+
+            error = error_de_propiedad(accion, identidad, fila['medico_id'], fila['paciente_id'])
+            if error:
+                resultados.append({'id': cita_id, 'status': 403, 'error': error})
+                continue
+
+            error = error_de_estado(accion, fila['estado'])
+            if error:
+                resultados.append({'id': cita_id, 'status': 409, 'error': error, 'estado': fila['estado']})
+                continue
+
+            validos.append(cita_id)
+            resultados.append({'id': cita_id, 'status': 200, 'estado': transicion.destino})
+
+        actualizadas = 0
+        if validos:
+            actualizadas = Cita.objects.filter(
+                id__in=validos, estado__in=transicion.origenes,
+            ).update(estado=transicion.destino, actualizado_en=timezone.now())
+            invalidar_agenda((filas[cita_id]['medico_id'], filas[cita_id]['fecha']) for cita_id in validos)
+            # Filas bloqueadas: el estado leído es el que cambió el UPDATE
+            estadisticas.registrar(
+                cambio
+                for cita_id in validos
+                for cambio in estadisticas.transicion(
+                    filas[cita_id]['fecha'], filas[cita_id]['medico_id'], filas[cita_id]['estado'], transicion.destino,
+                )
+            )
+
+    logger.info(f"✅ Lote {accion}: {actualizadas} de {len(ids)} citas")
+    return resultados, actualizadas
@@ -0,0 +1,191 @@
+# citas/management/commands/explicar_consultas.py
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from autenticacion.identidad import cargar_identidad
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta EXPLAIN sobre las consultas de los viewsets para cada rol y '
+        'falla si aparece un recorrido secuencial sobre una tabla con más de '
+        '--umbral filas. Conviene ejecutarlo sobre una BD sembrada '
+        '(SQLite con DB_ENGINE=sqlite o PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--umbral', type=int, default=1000, help='Filas a partir de las cuales un scan secuencial es un error')
+        parser.add_argument('--verbose-plan', action='store_true', help='Muestra el plan completo de cada consulta')
+
+    def handle(self, *args, **options):
+        umbral = options['umbral']
+        errores = []
+
+        for nombre, queryset, acotada in self._consultas():
+            if queryset.query.is_empty():
+                # .none(): no llega a la base de datos
+                self.stdout.write(f"{self.style.SUCCESS('OK'):<12} {nombre}  [sin consulta]")
+                continue
+
+            plan = queryset.explain(format='json') if connection.vendor == 'postgresql' else queryset.explain()
+            scans = self._scans_secuenciales(plan)
+            grandes = [(tabla, filas) for tabla, filas in scans if filas > umbral]
+
+            if grandes and acotada:
+                errores.append((nombre, grandes))
+                estado = self.style.ERROR('SEQ SCAN')
+            elif grandes:
+                estado = self.style.WARNING('SEQ SCAN (listado completo)')
+            else:
+                estado = self.style.SUCCESS('OK')
+
+            detalle = ', '.join(f'{tabla}~{filas}' for tabla, filas in scans)
+            self.stdout.write(f'{estado:<12} {nombre}' + (f'  [{detalle}]' if detalle else ''))
+            if options['verbose_plan']:
+                self.stdout.write(f'    {plan}')
+
+        if errores:
+            resumen = '; '.join(
+                f"{nombre}: {', '.join(f'{t} ({f} filas)' for t, f in grandes)}"
+                for nombre, grandes in errores
+            )
+            raise CommandError(f'Recorridos secuenciales por encima de {umbral} filas: {resumen}')
+
+        self.stdout.write(self.style.SUCCESS('✅ Ninguna consulta acotada recorre tablas completas'))
+
+    # ==================== CATÁLOGO DE CONSULTAS ====================
+
+    def _consultas(self):
+        """Genera (nombre, queryset, acotada) para cada consulta caliente."""
+        from django.db.models import Sum
+
+        from citas.models import Cita, EstadisticaCita
+        from citas.views import CitaViewSet, CitaCursorPagination
+        from medicos.views import MedicoViewSet
+        from pacientes.views import PacienteViewSet
+
+        hoy = timezone.localdate()
+        for rol in ('admin', 'medico', 'paciente'):
+            user = User.objects.filter(perfil__tipo_usuario=rol).order_by('id').first()
+            if user is None:
+                self.stdout.write(self.style.WARNING(f'Sin usuarios con rol {rol}; se omite'))
+                continue
+            identidad = cargar_identidad(user.pk)
+
+            citas = self._vista(CitaViewSet, user).get_queryset()
+            yield (
+                f'CitaViewSet.list página [{rol}]',
+                citas.order_by(*CitaCursorPagination.ordering)[:CitaCursorPagination.page_size + 1],
+                True,
+            )
+            yield f'CitaViewSet.list completo [{rol}]', citas, False
+
+            cita = citas.order_by('id').first()
+            if cita is not None:
+                yield f'CitaViewSet.retrieve [{rol}]', citas.filter(pk=cita.pk), True
+
+            if identidad.es_admin and cita is not None:
+                yield from self._consultas_filtradas(citas, cita)
+
+            pacientes = self._vista(PacienteViewSet, user).get_queryset()
+            yield f'PacienteViewSet.list [{rol}]', pacientes, rol != 'admin'
+
+            if identidad.es_admin:
+                yield 'MedicoViewSet.list [admin]', self._vista(MedicoViewSet, user).get_queryset(), False
+
+            yield (
+                f'identidad [{rol}]',
+                User.objects.filter(pk=user.pk).values_list('perfil__tipo_usuario', 'perfil__id', 'paciente__id', 'medico__id'),
+                True,
+            )
+
+        cita = Cita.objects.order_by('id').first()
+        if cita is not None:
+            yield (
+                'Conflicto de horario',
+                Cita.objects.filter(medico_id=cita.medico_id, fecha=cita.fecha, hora=cita.hora, estado__in=Cita.ESTADOS_ACTIVOS),
+                True,
+            )
+            yield (
+                'Disponibilidad (rango por médico)',
+                Cita.objects.filter(
+                    medico_id__in=[cita.medico_id],
+                    fecha__range=(hoy, hoy + timedelta(days=6)),
+                    estado__in=Cita.ESTADOS_ACTIVOS,
+                ).values_list('medico_id', 'fecha', 'hora'),
+                True,
+            )
+        yield (
+            'CitaViewSet.estadisticas',
+            EstadisticaCita.objects.filter(fecha__range=(hoy, hoy + timedelta(days=30)))
+            .values('fecha', 'estado', 'medico__especialidad__nombre').annotate(cantidad=Sum('cantidad')).order_by(),
+            True,
+        )
+
+    def _consultas_filtradas(self, citas, cita):
+        """Una página del listado del admin con cada filtro de citas/filtros.py."""
+        from citas.filtros import ORDENES, filtrar_citas
+        from citas.views import CitaCursorPagination
+
+        pagina = CitaCursorPagination.page_size + 1
+        casos = [
+            ('estado', {'estado': 'pendiente'}, None),
+            ('medico', {'medico': str(cita.medico_id)}, None),
+            ('paciente', {'paciente': str(cita.paciente_id)}, None),
+            ('fecha', {'fecha__gte': cita.fecha.isoformat(), 'fecha__lte': cita.fecha.isoformat()}, None),
+            ('ordering=-creada_en', {}, '-creada_en'),
+        ]
+        if cita.medico.especialidad_id:
+            casos.append(('especialidad', {'especialidad': str(cita.medico.especialidad_id)}, None))
+
+        for nombre, params, orden in casos:
+            queryset = filtrar_citas(citas, params).order_by(*ORDENES[orden or 'fecha'])
+            yield f'CitaViewSet.list ?{nombre} [admin]', queryset[:pagina], True
+
+        # El índice de trigramas solo existe en PostgreSQL: en SQLite se avisa
+        yield (
+            'CitaViewSet.list ?search [admin]',
+            filtrar_citas(citas, {'search': 'control'}).order_by(*ORDENES['fecha'])[:pagina],
+            connection.vendor == 'postgresql',
+        )
+
+    def _vista(self, clase, user, accion='list', **params):
+        request = Request(RequestFactory().get('/', params))
+        request.user = user
+        return clase(request=request, action=accion, format_kwarg=None, kwargs={})
+
+    # ==================== LECTURA DE PLANES ====================
+
+    def _scans_secuenciales(self, plan):
+        """Lista de (tabla, filas estimadas) recorridas sin índice."""
+        if connection.vendor == 'postgresql':
+            return list(self._seq_scans_postgres(json.loads(plan)[0]['Plan']))
+
+        scans = []
+        for linea in plan.splitlines():
+            detalle = linea.split('SCAN ', 1)
+            # "SCAN tabla" sin "USING ... INDEX" es un recorrido completo
+            if len(detalle) == 2 and 'USING' not in detalle[1]:
+                tabla = detalle[1].split()[0]
+                scans.append((tabla, self._filas(tabla)))
+        return scans
+
+    def _seq_scans_postgres(self, nodo):
+        if nodo.get('Node Type') == 'Seq Scan':
+            yield nodo['Relation Name'], int(nodo.get('Plan Rows', 0))
+        for hijo in nodo.get('Plans', []):
+            yield from self._seq_scans_postgres(hijo)
+
+    def _filas(self, tabla):
+        if tabla not in connection.introspection.table_names():
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(tabla)}')
+            return cursor.fetchone()[0]
@@ -0,0 +1,32 @@
+# citas/management/commands/recalcular_estadisticas.py
+import time as reloj
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from citas.estadisticas import recalcular
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los totales de EstadisticaCita (ver citas/estadisticas.py) '
+        'desde Cita, opcionalmente solo entre --desde y --hasta. Necesario tras '
+        'cargar o modificar citas con SQL directo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='AAAA-MM-DD')
+        parser.add_argument('--hasta', help='AAAA-MM-DD')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError:
+            raise CommandError('Formato de fecha inválido. Use: AAAA-MM-DD')
+
+        inicio = reloj.perf_counter()
+        filas = recalcular(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Estadísticas recalculadas: {filas} filas en {reloj.perf_counter() - inicio:.1f}s"
+        ))
@@ -0,0 +1,231 @@
+# citas/management/commands/seed_load.py
+import random
+import time as reloj
+from datetime import time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from autenticacion.models import PerfilUsuario
+from citas.estadisticas import recalcular as recalcular_estadisticas
+from citas.models import Cita
+from medicos.models import Especialidad, Medico
+from pacientes.models import ClaveBusqueda, Paciente
+
+ESPECIALIDADES = [
+    ('Cardiología', 'Especialidad del corazón'),
+    ('Pediatría', 'Especialidad para niños'),
+    ('Dermatología', 'Especialidad de la piel'),
+    ('Ginecología', 'Especialidad femenina'),
+    ('Traumatología', 'Especialidad de huesos'),
+]
+HORARIOS = [(time(8), time(16)), (time(9), time(17)), (time(10), time(18))]
+NOMBRES = ['Ana', 'José', 'María', 'Juan', 'Carlos', 'Lucía', 'Pedro', 'Sofía', 'Luis', 'Elena']
+APELLIDOS = ['Martínez', 'López', 'González', 'Pérez', 'García', 'Rodríguez', 'Hernández', 'Ruiz']
+MOTIVOS = ["Consulta general", "Seguimiento", "Chequeo anual", "Dolor en el pecho", "Fiebre", "Erupción", "Control", "Dolor articular"]
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos de carga (médicos, pacientes y citas) con '
+        'bulk_create por lotes. Es determinista para una misma --semilla. '
+        'No dispara las señales post_save: crea directamente PerfilUsuario, '
+        'grupos y Paciente/Medico, y reutiliza un único hash de contraseña.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=1000)
+        parser.add_argument('--medicos', type=int, default=50)
+        parser.add_argument('--citas', type=int, default=10000)
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--password-paciente', default='paciente123')
+        parser.add_argument('--password-medico', default='doctor123')
+
+    def handle(self, *args, **options):
+        if options['medicos'] < 1 or options['pacientes'] < 1:
+            raise CommandError('Se necesita al menos un médico y un paciente')
+
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.prefijo = f"carga{options['semilla']}"
+
+        if User.objects.filter(username__startswith=f'{self.prefijo}.').exists():
+            raise CommandError(
+                f'Ya existen usuarios "{self.prefijo}.*"; use otra --semilla o elimínelos antes'
+            )
+
+        inicio = reloj.perf_counter()
+        especialidades = self._especialidades()
+        grupos = {nombre: Group.objects.get_or_create(name=nombre)[0] for nombre in ('medico', 'paciente')}
+
+        medico_ids = self._medicos(options['medicos'], especialidades, grupos['medico'], options['password_medico'])
+        paciente_ids = self._pacientes(options['pacientes'], grupos['paciente'], options['password_paciente'])
+        self._citas(options['citas'], medico_ids, paciente_ids)
+        # Las citas se insertan con SQL directo, sin los deltas de EstadisticaCita
+        recalcular_estadisticas()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(medico_ids)} médicos, {len(paciente_ids)} pacientes y {options['citas']} citas "
+            f"en {reloj.perf_counter() - inicio:.1f}s"
+        ))
+
+    # ==================== USUARIOS ====================
+
+    def _especialidades(self):
+        for nombre, descripcion in ESPECIALIDADES:
+            Especialidad.objects.get_or_create(nombre=nombre, defaults={'descripcion': descripcion})
+        return list(Especialidad.objects.order_by('id').values_list('id', flat=True))
+
+    def _crear_usuarios(self, cantidad, tipo, grupo, password):
+        """Crea User + PerfilUsuario + grupo en lotes; devuelve los User creados."""
+        hash_password = make_password(password)
+        ahora = timezone.now()
+        creados = []
+
+        for desde in range(0, cantidad, self.lote):
+            hasta = min(desde + self.lote, cantidad)
+            usuarios = [
+                User(
+                    username=f'{self.prefijo}.{tipo}{i}',
+                    email=f'{self.prefijo}.{tipo}{i}@clinica.com',
+                    first_name=self.azar.choice(NOMBRES),
+                    last_name=self.azar.choice(APELLIDOS),
+                    password=hash_password,
+                    date_joined=ahora,
+                )
+                for i in range(desde, hasta)
+            ]
+            with transaction.atomic():
+                usuarios = User.objects.bulk_create(usuarios)
+                PerfilUsuario.objects.bulk_create(
+                    [PerfilUsuario(user_id=u.id, tipo_usuario=tipo) for u in usuarios]
+                )
+                User.groups.through.objects.bulk_create(
+                    [User.groups.through(user_id=u.id, group_id=grupo.id) for u in usuarios]
+                )
+            creados.extend(usuarios)
+            self._progreso(f'Usuarios {tipo}', hasta, cantidad)
+
+        return creados
+
+    def _medicos(self, cantidad, especialidades, grupo, password):
+        usuarios = self._crear_usuarios(cantidad, 'medico', grupo, password)
+        medicos = []
+        for usuario in usuarios:
+            inicio, fin = self.azar.choice(HORARIOS)
+            medicos.append(Medico(
+                user_id=usuario.id,
+                especialidad_id=self.azar.choice(especialidades),
+                telefono=f'{self.azar.randint(20000000, 89999999)}',
+                horario_inicio=inicio,
+                horario_fin=fin,
+            ))
+        medicos = Medico.objects.bulk_create(medicos, batch_size=self.lote)
+        return [(m.id, m.horario_inicio, m.horario_fin) for m in medicos]
+
+    def _pacientes(self, cantidad, grupo, password):
+        usuarios = self._crear_usuarios(cantidad, 'paciente', grupo, password)
+        semilla = self.prefijo[len('carga'):]
+        ids = []
+
+        for desde in range(0, len(usuarios), self.lote):
+            lote = usuarios[desde:desde + self.lote]
+            with transaction.atomic():
+                pacientes = Paciente.objects.bulk_create([
+                    Paciente(
+                        user_id=user.id,
+                        dni=f'{int(semilla) % 1000:03d}-{(desde + i) // 10000:06d}-{(desde + i) % 10000:04d}C',
+                        telefono=f'{self.azar.randint(20000000, 89999999)}',
+                        direccion='Managua, Nicaragua',
+                    )
+                    for i, user in enumerate(lote)
+                ])
+                # bulk_create no pasa por Paciente.save(): claves de búsqueda a mano
+                ClaveBusqueda.objects.bulk_create([
+                    clave
+                    for paciente, user in zip(pacientes, lote)
+                    for clave in ClaveBusqueda.para_paciente(
+                        paciente.id, paciente.dni, paciente.telefono, user.first_name, user.last_name,
+                    )
+                ])
+            ids.extend(p.id for p in pacientes)
+            self._progreso('Pacientes', desde + len(lote), cantidad)
+
+        return ids
+
+    # ==================== CITAS ====================
+
+    def _citas(self, cantidad, medicos, paciente_ids):
+        """
+        Reparte las citas recorriendo los slots de cada médico en orden, de
+        modo que (medico, fecha, hora) nunca se repite. Los días se centran
+        en hoy: las citas pasadas quedan finalizadas o canceladas y las
+        futuras pendientes o confirmadas.
+        """
+        duracion = 30
+        slots = {
+            medico_id: [
+                time(m // 60, m % 60)
+                for m in range(inicio.hour * 60 + inicio.minute, fin.hour * 60 + fin.minute - duracion + 1, duracion)
+            ]
+            for medico_id, inicio, fin in medicos
+        }
+        por_dia = min(len(s) for s in slots.values())
+        dias = -(-cantidad // (len(medicos) * por_dia))
+        primer_dia = timezone.localdate() - timedelta(days=dias // 2)
+        hoy = timezone.localdate()
+
+        # Las fechas/horas se adaptan una sola vez por valor distinto
+        ops = connection.ops
+        fechas = {}
+        horas = {t: ops.adapt_timefield_value(t) for s in slots.values() for t in s}
+        creada_en = ops.adapt_datetimefield_value(timezone.now())
+
+        creadas = 0
+        while creadas < cantidad:
+            hasta = min(creadas + self.lote, cantidad)
+            filas = []
+            for i in range(creadas, hasta):
+                medico_id = medicos[i % len(medicos)][0]
+                posicion = i // len(medicos)
+                fecha = primer_dia + timedelta(days=posicion // por_dia)
+                if fecha not in fechas:
+                    fechas[fecha] = ops.adapt_datefield_value(fecha)
+                if fecha < hoy:
+                    estado = self.azar.choices(('finalizada', 'cancelada'), weights=(8, 2))[0]
+                else:
+                    estado = self.azar.choices(('pendiente', 'confirmada', 'cancelada'), weights=(5, 4, 1))[0]
+                filas.append((
+                    self.azar.choice(paciente_ids),
+                    medico_id,
+                    fechas[fecha],
+                    horas[slots[medico_id][posicion % por_dia]],
+                    self.azar.choice(MOTIVOS),
+                    estado,
+                    creada_en,
+                    creada_en,
+                ))
+            self._insertar_citas(filas)
+            creadas = hasta
+            self._progreso('Citas', creadas, cantidad)
+
+    def _insertar_citas(self, filas):
+        """
+        INSERT por lotes con executemany. Con millones de filas el costo de
+        bulk_create está en compilar el SQL campo por campo en el ORM; aquí
+        los valores ya vienen adaptados al motor.
+        """
+        campos = ['paciente', 'medico', 'fecha', 'hora', 'motivo', 'estado', 'creada_en', 'actualizado_en']
+        columnas = ', '.join(connection.ops.quote_name(Cita._meta.get_field(c).column) for c in campos)
+        marcadores = ', '.join(['%s'] * len(campos))
+        sql = f'INSERT INTO {connection.ops.quote_name(Cita._meta.db_table)} ({columnas}) VALUES ({marcadores})'
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, filas)
+
+    def _progreso(self, etiqueta, hechos, total):
+        self.stdout.write(f'  {etiqueta}: {hechos}/{total}')
+        self.stdout.flush()
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0002_indice_fecha_hora_id'),
+        ('medicos', '0001_initial'),
+        ('pacientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cita',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ('pendiente', 'confirmada'))), fields=('medico', 'fecha', 'hora'), name='cita_unica_horario_activo'),
+        ),
+    ]
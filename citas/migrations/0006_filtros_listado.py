@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+# ?search= filtra con motivo__icontains, que en PostgreSQL se traduce a
+# UPPER("motivo"::text) LIKE UPPER('%...%'): el índice GIN de trigramas
+# sobre esa misma expresión evita recorrer la tabla. En SQLite no hay
+# equivalente y la búsqueda queda sin índice.
+def crear_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS cita_motivo_trgm_idx ON citas_cita '
+        'USING gin ((UPPER("motivo"::text)) gin_trgm_ops)'
+    )
+
+
+def borrar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS cita_motivo_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0005_actualizado_en'),
+        ('medicos', '0002_actualizado_en'),
+        ('pacientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'fecha', 'hora', 'id'], name='cita_estado_fecha_idx'),
+        ),
+        migrations.RunPython(crear_indice_trigramas, borrar_indice_trigramas),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_estadisticas(apps, schema_editor):
+    Cita = apps.get_model('citas', 'Cita')
+    EstadisticaCita = apps.get_model('citas', 'EstadisticaCita')
+    EstadisticaCita.objects.bulk_create(
+        (
+            EstadisticaCita(fecha=fila['fecha'], medico_id=fila['medico_id'], estado=fila['estado'], cantidad=fila['cantidad'])
+            for fila in Cita.objects.values('fecha', 'medico_id', 'estado').annotate(cantidad=Count('id')).order_by()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_filtros_listado'),
+        ('medicos', '0002_actualizado_en'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaCita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('finalizada', 'Finalizada')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('medico', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='medicos.medico')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'medico', 'estado'], name='estadistica_fecha_medico_idx')],
+            },
+        ),
+        migrations.RunPython(calcular_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:10
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def compactar_deltas(apps, schema_editor):
+    # Una fila por (fecha, médico, estado) con la suma de sus deltas
+    EstadisticaCita = apps.get_model('citas', 'EstadisticaCita')
+    filas = list(
+        EstadisticaCita.objects.values('fecha', 'medico_id', 'estado')
+        .annotate(total=Sum('cantidad')).order_by()
+    )
+    EstadisticaCita.objects.all().delete()
+    EstadisticaCita.objects.bulk_create(
+        (
+            EstadisticaCita(fecha=fila['fecha'], medico_id=fila['medico_id'], estado=fila['estado'], cantidad=fila['total'])
+            for fila in filas if fila['total']
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0007_estadisticas'),
+    ]
+
+    operations = [
+        migrations.RunPython(compactar_deltas, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='estadisticacita',
+            name='estadistica_fecha_medico_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticacita',
+            constraint=models.UniqueConstraint(fields=('fecha', 'medico', 'estado'), name='estadistica_clave_unica'),
+        ),
+    ]
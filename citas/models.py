@@ -1,6 +1,12 @@
+from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from autenticacion.models import cambio_nombre
 from pacientes.models import Paciente
-from medicos.models import Medico
+from medicos.agenda import invalidar_agenda
+from medicos.models import Especialidad, Medico
 
 class Cita(models.Model):
     ESTADOS = [
@@ -9,6 +15,8 @@ class Cita(models.Model):
         ('cancelada', 'Cancelada'),
         ('finalizada', 'Finalizada'),
     ]
+    # Estados que ocupan el horario del médico
+    ESTADOS_ACTIVOS = ('pendiente', 'confirmada')
 
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='citas')
     medico = models.ForeignKey(Medico, on_delete=models.CASCADE, related_name='citas')
@@ -17,9 +25,152 @@ class Cita(models.Model):
     motivo = models.TextField(blank=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     creada_en = models.DateTimeField(auto_now_add=True)
+    # También se actualiza en los UPDATE directos (transiciones, lotes) y
+    # cuando cambian datos del paciente o médico que muestra la cita
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('medico', 'fecha', 'hora')
+        constraints = [
+            # Un médico no puede tener dos citas activas en el mismo horario;
+            # una cita cancelada o finalizada libera el slot.
+            models.UniqueConstraint(
+                fields=['medico', 'fecha', 'hora'],
+                condition=models.Q(estado__in=('pendiente', 'confirmada')),
+                name='cita_unica_horario_activo',
+            ),
+        ]
+        indexes = [
+            # Orden estable de la paginación por cursor
+            models.Index(fields=['fecha', 'hora', 'id'], name='cita_fecha_hora_id_idx'),
+            # Citas de un paciente por fecha
+            models.Index(fields=['paciente', 'fecha'], name='cita_paciente_fecha_idx'),
+            # Agenda y disponibilidad de un médico por rango de fechas
+            models.Index(fields=['medico', 'fecha', 'estado'], name='cita_medico_fecha_estado_idx'),
+            # Solo citas activas (pendientes/confirmadas) por fecha
+            models.Index(
+                fields=['fecha', 'hora'],
+                condition=models.Q(estado__in=('pendiente', 'confirmada')),
+                name='cita_activas_fecha_idx',
+            ),
+            # Filtro ?estado= del listado, en el orden de la paginación
+            models.Index(fields=['estado', 'fecha', 'hora', 'id'], name='cita_estado_fecha_idx'),
+            # Listado del admin por fecha de creación
+            models.Index(fields=['-creada_en'], name='cita_creada_en_idx'),
+            # Validadores ETag/Last-Modified (COUNT + MAX) por rol
+            models.Index(fields=['actualizado_en'], name='cita_actualizado_idx'),
+            models.Index(fields=['medico', 'actualizado_en'], name='cita_medico_actualizado_idx'),
+            models.Index(fields=['paciente', 'actualizado_en'], name='cita_paciente_actualizado_idx'),
+            # La búsqueda por motivo (?search=) usa un índice de trigramas que
+            # solo existe en PostgreSQL; se crea en la migración 0006.
+        ]
 
     def __str__(self):
-        return f"Cita {self.id} - {self.paciente} con {self.medico}"
\ No newline at end of file
+        return f"Cita {self.id} - {self.paciente} con {self.medico}"
+
+
+class EstadisticaCita(models.Model):
+    """
+    Cantidad de citas por (fecha, médico, estado) para el tablero de
+    estadísticas (ver citas/estadisticas.py).
+
+    Una fila por clave: cada cambio de una cita suma su delta (+1/-1) a
+    ``cantidad`` en la misma transacción que el cambio, así que la tabla
+    no crece con los cambios sino con los días y médicos.
+    """
+    fecha = models.DateField()
+    # Sin restricción de FK: al borrar un médico sus citas dejan deltas
+    # negativos que deben poder insertarse en la misma transacción
+    medico = models.ForeignKey(Medico, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    estado = models.CharField(max_length=20, choices=Cita.ESTADOS)
+    cantidad = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # Clave del ON CONFLICT de estadisticas.registrar
+            models.UniqueConstraint(fields=['fecha', 'medico', 'estado'], name='estadistica_clave_unica'),
+        ]
+
+
+# Cada cita muestra nombre y DNI del paciente, nombre del médico y su
+# especialidad. Cuando cambian, se actualiza actualizado_en de las citas
+# afectadas para que cambie su ETag (ver citas_medicas/condicionales.py).
+
+def _cambio_relevante(created, update_fields):
+    return not created and not (update_fields is not None and set(update_fields) <= {'last_login'})
+
+@receiver(post_save, sender=Paciente)
+def tocar_citas_paciente(sender, instance, created, update_fields=None, **kwargs):
+    if _cambio_relevante(created, update_fields):
+        Cita.objects.filter(paciente_id=instance.pk).update(actualizado_en=timezone.now())
+
+@receiver(post_save, sender=Medico)
+def tocar_citas_medico(sender, instance, created, update_fields=None, **kwargs):
+    if _cambio_relevante(created, update_fields):
+        Cita.objects.filter(medico_id=instance.pk).update(actualizado_en=timezone.now())
+
+@receiver(post_save, sender=User)
+def tocar_citas_usuario(sender, instance, created, **kwargs):
+    if cambio_nombre(instance, created):
+        # La agenda del médico muestra el nombre del paciente
+        invalidar_agenda(
+            Cita.objects.filter(paciente__user_id=instance.pk).values_list('medico_id', 'fecha').distinct()
+        )
+        Cita.objects.filter(
+            models.Q(paciente__user_id=instance.pk) | models.Q(medico__user_id=instance.pk)
+        ).update(actualizado_en=timezone.now())
+
+@receiver(post_save, sender=Especialidad)
+def tocar_citas_especialidad(sender, instance, created, **kwargs):
+    if not created:
+        Cita.objects.filter(medico__especialidad_id=instance.pk).update(actualizado_en=timezone.now())
+
+
+# La agenda de cada médico se cachea por día (ver medicos/agenda.py). Los
+# UPDATE directos y bulk_create no disparan estas señales: quien los usa
+# llama a invalidar_agenda.
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+def invalidar_agenda_cita(sender, instance, **kwargs):
+    invalidar_agenda([(instance.medico_id, instance.fecha)])
+
+
+# Estadísticas (ver citas/estadisticas.py): cada alta, baja o cambio de
+# fecha, médico o estado deja su delta. Igual que con la agenda, quien usa
+# UPDATE directos o bulk_create llama a estadisticas.registrar.
+
+def _clave_estadistica(cita):
+    # Desde __dict__ para no cargar campos diferidos (only/defer)
+    clave = tuple(cita.__dict__.get(campo) for campo in ('fecha', 'medico_id', 'estado'))
+    return None if None in clave else clave
+
+@receiver(post_init, sender=Cita)
+def recordar_clave_estadistica(sender, instance, **kwargs):
+    instance._clave_estadistica = _clave_estadistica(instance)
+
+@receiver(post_save, sender=Cita)
+def registrar_estadistica_guardado(sender, instance, created, **kwargs):
+    from .estadisticas import registrar
+
+    anterior = None if created else instance._clave_estadistica
+    actual = _clave_estadistica(instance)
+    instance._clave_estadistica = actual
+    if not created and anterior is None:
+        # Se cargó sin esos campos: no se sabe qué restar
+        return
+    if anterior == actual:
+        return
+    cambios = []
+    if anterior is not None:
+        cambios.append((*anterior, -1))
+    if actual is not None:
+        cambios.append((*actual, 1))
+    registrar(cambios)
+
+@receiver(post_delete, sender=Cita)
+def registrar_estadistica_borrado(sender, instance, **kwargs):
+    from .estadisticas import registrar
+
+    clave = instance._clave_estadistica or _clave_estadistica(instance)
+    if clave is not None:
+        registrar([(*clave, -1)])
@@ -1,11 +1,61 @@
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from rest_framework import ISO_8601
 from .models import Cita
 from pacientes.models import Paciente
 from medicos.models import Medico
+from medicos.agenda import invalidar_agenda
+from medicos.disponibilidad import siguientes_disponibles
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Concat
 from django.utils import timezone
 from datetime import datetime, timedelta
 
+class ConflictoHorario(APIException):
+    """El médico ya tiene una cita activa en ese horario (HTTP 409)."""
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'conflicto_horario'
+    
+    def __init__(self, medico, fecha, hora):
+        sugerencias = siguientes_disponibles(medico, fecha, hora)
+        # Se asigna directamente para conservar los tipos (APIException
+        # convertiría todos los valores a texto).
+        self.detail = {
+            'error': 'El médico ya tiene una cita programada en este horario',
+            'medico': medico.id,
+            'fecha': fecha.isoformat(),
+            'hora': hora.isoformat(),
+            'siguientes_disponibles': [
+                {'fecha': dia.isoformat(), 'hora': slot.isoformat()}
+                for dia, slot in sugerencias
+            ],
+        }
+
+def es_conflicto_horario(error, medico_id, fecha, hora, excluir=None):
+    """
+    Si el ``IntegrityError`` al guardar una cita se debe a
+    ``cita_unica_horario_activo`` y no a otra restricción (p. ej. una FK
+    porque el paciente se borró a la vez). PostgreSQL informa el nombre de
+    la restricción; en otros motores se comprueba que el horario esté tomado.
+    """
+    diagnostico = getattr(error.__cause__, 'diag', None)
+    restriccion = getattr(diagnostico, 'constraint_name', None)
+    if restriccion is not None:
+        return restriccion == 'cita_unica_horario_activo'
+    
+    ocupadas = Cita.objects.filter(
+        medico_id=medico_id, fecha=fecha, hora=hora, estado__in=Cita.ESTADOS_ACTIVOS,
+    )
+    if excluir is not None:
+        ocupadas = ocupadas.exclude(pk=excluir)
+    return ocupadas.exists()
+
 class CitaSerializer(serializers.ModelSerializer):
+    # Con los joins la respuesta de create/update no dispara consultas extra
+    paciente = serializers.PrimaryKeyRelatedField(queryset=Paciente.objects.select_related('user'))
+    medico = serializers.PrimaryKeyRelatedField(queryset=Medico.objects.select_related('user', 'especialidad'))
     paciente_nombre = serializers.SerializerMethodField()
     paciente_dni = serializers.CharField(source='paciente.dni', read_only=True)
     medico_nombre = serializers.SerializerMethodField()
@@ -21,6 +71,9 @@ class CitaSerializer(serializers.ModelSerializer):
             'fecha_str', 'hora_str', 'creada_en'
         ]
         read_only_fields = ['id', 'estado', 'creada_en']
+        # Sin UniqueTogetherValidator: evita una consulta previa que no
+        # protege contra reservas concurrentes. Ver ConflictoHorario.
+        validators = []
     
     def get_paciente_nombre(self, obj):
         if obj.paciente and obj.paciente.user:
@@ -57,42 +110,161 @@ class CitaSerializer(serializers.ModelSerializer):
                     'fecha': 'No se pueden crear citas en el pasado'
                 })
             
-            medico = data.get('medico')
+            # DRF ya resolvió el médico; el choque de horario lo detecta la
+            # restricción cita_unica_horario_activo al guardar.
+            medico = data.get('medico') or (self.instance.medico if self.instance else None)
             if medico:
-                try:
-                    medico_obj = Medico.objects.get(id=medico.id if hasattr(medico, 'id') else medico)
-                    
-                    cita_existente = Cita.objects.filter(
-                        medico=medico_obj,
-                        fecha=fecha_cita,
-                        hora=hora_cita,
-                        estado__in=['pendiente', 'confirmada']
-                    )
-                    
-                    if self.instance:
-                        cita_existente = cita_existente.exclude(id=self.instance.id)
-                    
-                    if cita_existente.exists():
-                        raise serializers.ValidationError({
-                            'hora': 'El médico ya tiene una cita programada en este horario'
-                        })
-                    
-                    if hora_cita < medico_obj.horario_inicio or hora_cita > medico_obj.horario_fin:
-                        raise serializers.ValidationError({
-                            'hora': f'El médico solo atiende de {medico_obj.horario_inicio.strftime("%I:%M %p")} a {medico_obj.horario_fin.strftime("%I:%M %p")}'
-                        })
-                        
-                except Medico.DoesNotExist:
+                if hora_cita < medico.horario_inicio or hora_cita > medico.horario_fin:
                     raise serializers.ValidationError({
-                        'medico': 'El médico especificado no existe'
+                        'hora': f'El médico solo atiende de {medico.horario_inicio.strftime("%I:%M %p")} a {medico.horario_fin.strftime("%I:%M %p")}'
                     })
         
         return data
     
     def create(self, validated_data):
         validated_data['estado'] = 'pendiente'
-        return super().create(validated_data)
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError as e:
+            medico, fecha, hora = validated_data['medico'], validated_data['fecha'], validated_data['hora']
+            if not es_conflicto_horario(e, medico.id, fecha, hora):
+                raise
+            raise ConflictoHorario(medico, fecha, hora)
+    
+    def update(self, instance, validated_data):
+        # Si cambia el médico o la fecha, el día anterior también sale de la agenda
+        anterior = (instance.medico_id, instance.fecha)
+        try:
+            with transaction.atomic():
+                cita = super().update(instance, validated_data)
+            invalidar_agenda([anterior])
+            return cita
+        except IntegrityError as e:
+            medico = validated_data.get('medico', instance.medico)
+            fecha = validated_data.get('fecha', instance.fecha)
+            hora = validated_data.get('hora', instance.hora)
+            if not es_conflicto_horario(e, medico.id, fecha, hora, excluir=instance.pk):
+                raise
+            raise ConflictoHorario(medico, fecha, hora)
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        return representation
\ No newline at end of file
+        return representation
+
+
+
+class RelacionPrecargada(serializers.PrimaryKeyRelatedField):
+    """
+    ``PrimaryKeyRelatedField`` que busca el objeto en
+    ``context['precargados'][modelo]`` en lugar de hacer una consulta por
+    elemento (ver citas/lotes.py).
+    """
+    
+    def to_internal_value(self, data):
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        
+        obj = self.context['precargados'][self.queryset.model].get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+class CitaBulkSerializer(CitaSerializer):
+    paciente = RelacionPrecargada(queryset=Paciente.objects.all())
+    medico = RelacionPrecargada(queryset=Medico.objects.all())
+
+# ==================== REPRESENTACIÓN RÁPIDA DE LISTAS ====================
+#
+# Para listados grandes CitaSerializer gasta la mayor parte del tiempo en la
+# maquinaria de campos de DRF. Este camino lee solo las columnas necesarias
+# con values() y arma los diccionarios a mano, produciendo exactamente el
+# mismo JSON que CitaSerializer(many=True) (mismas claves, orden y formatos).
+
+_fecha = serializers.DateField()
+_hora = serializers.TimeField()
+_creada_en = serializers.DateTimeField()
+
+
+def _formateador_creada_en():
+    """
+    ``DateTimeField.to_representation`` resuelve la zona horaria en cada
+    llamada; aquí se resuelve una vez por listado y se reproduce el mismo
+    formato ISO 8601 (con ``Z`` para UTC).
+    """
+    zona = _creada_en.default_timezone()
+    if zona is None or api_settings.DATETIME_FORMAT != ISO_8601:
+        return _creada_en.to_representation
+    
+    def formatear(valor):
+        if valor is None or valor.tzinfo is None:
+            return _creada_en.to_representation(valor)
+        texto = valor.astimezone(zona).isoformat()
+        return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+    
+    return formatear
+
+
+def valores_para_lista(queryset):
+    """Columnas (y nombres concatenados en la BD) que usa ``representar_citas``."""
+    return queryset.annotate(
+        nombre_paciente_db=Concat(
+            'paciente__user__first_name', Value(' '), 'paciente__user__last_name',
+            output_field=CharField(),
+        ),
+        nombre_medico_db=Concat(
+            Value('Dr. '), 'medico__user__first_name', Value(' '), 'medico__user__last_name',
+            output_field=CharField(),
+        ),
+    ).values(
+        'id', 'paciente_id', 'medico_id', 'fecha', 'hora', 'motivo', 'estado', 'creada_en',
+        'paciente__user_id', 'paciente__dni', 'medico__user_id',
+        'medico__especialidad_id', 'medico__especialidad__nombre',
+        'nombre_paciente_db', 'nombre_medico_db',
+    )
+
+
+def representar_citas(filas):
+    """Genera la representación de cada fila de ``valores_para_lista``."""
+    # Fechas y horas se repiten mucho en un listado: se formatean una vez
+    fechas = {}
+    horas = {}
+    formatear_creada_en = _formateador_creada_en()
+    for fila in filas:
+        fecha = fila['fecha']
+        formato_fecha = fechas.get(fecha)
+        if formato_fecha is None:
+            formato_fecha = fechas[fecha] = (_fecha.to_representation(fecha), fecha.strftime('%d/%m/%Y'))
+        
+        hora = fila['hora']
+        formato_hora = horas.get(hora)
+        if formato_hora is None:
+            formato_hora = horas[hora] = (_hora.to_representation(hora), hora.strftime('%I:%M %p'))
+        
+        cita = {
+            'id': fila['id'],
+            'paciente': fila['paciente_id'],
+            'medico': fila['medico_id'],
+            'fecha': formato_fecha[0],
+            'hora': formato_hora[0],
+            'motivo': fila['motivo'],
+            'estado': fila['estado'],
+            'paciente_nombre': (
+                fila['nombre_paciente_db'].strip() if fila['paciente__user_id'] is not None else "Sin nombre"
+            ),
+            'paciente_dni': fila['paciente__dni'],
+            'medico_nombre': (
+                fila['nombre_medico_db'].strip() if fila['medico__user_id'] is not None else "Sin médico"
+            ),
+        }
+        # Igual que DRF: sin especialidad la clave se omite (no es null)
+        if fila['medico__especialidad_id'] is not None:
+            cita['especialidad_nombre'] = fila['medico__especialidad__nombre']
+        cita['fecha_str'] = formato_fecha[1]
+        cita['hora_str'] = formato_hora[1]
+        cita['creada_en'] = formatear_creada_en(fila['creada_en'])
+        yield cita
@@ -1,3 +1,772 @@
-from django.test import TestCase
+# citas/tests.py
+import base64
+import csv
+import io
+import json
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from threading import Barrier, Thread
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from citas_medicas.exportacion import bloques_xlsx
+from medicos.models import Especialidad, Medico
+from pacientes.models import Paciente
+
+from . import estadisticas
+from .exportacion import ENCABEZADOS
+from .filtros import ORDENES
+from .models import Cita, EstadisticaCita
+from .serializers import CitaSerializer, es_conflicto_horario, representar_citas, valores_para_lista
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+HILOS = 6
+
+
+def crear_usuario(username, tipo, **campos):
+    user = User.objects.create_user(username, password='x', first_name=username, last_name='Prueba', **campos)
+    user.perfil.tipo_usuario = tipo
+    user.perfil.save()
+    return user
+
+
+def en_paralelo(peticiones):
+    """
+    Ejecuta a la vez cada ``(user, peticion)`` de ``peticiones`` en su hilo
+    (con su cliente y su conexión) y devuelve los códigos de respuesta en
+    el mismo orden.
+    """
+    barrera = Barrier(len(peticiones))
+
+    def trabajador(par):
+        user, peticion = par
+        cliente = APIClient()
+        cliente.force_authenticate(user)
+        try:
+            barrera.wait()
+            return peticion(cliente).status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=len(peticiones)) as pool:
+        return list(pool.map(trabajador, peticiones))
+
+
+class CitasTestCase(TransactionTestCase):
+    """Datos comunes: un médico, varios pacientes y un administrador."""
+
+    def setUp(self):
+        cache.clear()
+        especialidad = Especialidad.objects.create(nombre='Medicina general')
+        self.medico = Medico.objects.create(
+            user=crear_usuario('medico', 'medico'), especialidad=especialidad, telefono='0',
+            horario_inicio=time(8), horario_fin=time(17),
+        )
+        self.pacientes = []
+        for i in range(HILOS):
+            user = crear_usuario(f'paciente{i}', 'paciente')
+            Paciente.objects.create(user=user, dni=f'001-000000-{i:04d}A')
+            self.pacientes.append(user)
+        self.admin = crear_usuario('admin', 'admin', is_staff=True, is_superuser=True)
+        self.fecha = timezone.localdate() + timedelta(days=3)
+
+    def tearDown(self):
+        cache.clear()
+
+    def cliente(self, user):
+        cliente = APIClient()
+        cliente.force_authenticate(user)
+        return cliente
+
+    def reservar(self, cliente, hora=time(9)):
+        return cliente.post('/api/citas/', {
+            'medico': self.medico.id,
+            'fecha': self.fecha.isoformat(),
+            'hora': hora.isoformat(),
+            'motivo': 'control',
+        }, format='json')
+
+
+class DobleReservaTests(CitasTestCase):
+    """Restricción ``cita_unica_horario_activo`` y su respuesta 409."""
+
+    def test_reservas_simultaneas_del_mismo_horario(self):
+        codigos = en_paralelo([(user, self.reservar) for user in self.pacientes])
+
+        self.assertEqual(codigos.count(201), 1, codigos)
+        self.assertEqual(codigos.count(409), HILOS - 1, codigos)
+        self.assertEqual(
+            Cita.objects.filter(medico=self.medico, fecha=self.fecha, estado__in=Cita.ESTADOS_ACTIVOS).count(), 1,
+        )
+
+    def test_conflicto_informa_horarios_libres(self):
+        self.assertEqual(self.reservar(self.cliente(self.pacientes[0])).status_code, 201)
+
+        respuesta = self.reservar(self.cliente(self.pacientes[1]))
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertTrue(respuesta.data['siguientes_disponibles'])
+        self.assertNotIn('09:00', [slot['hora'][:5] for slot in respuesta.data['siguientes_disponibles']])
+
+    def test_cancelar_libera_el_horario(self):
+        cita_id = self.reservar(self.cliente(self.pacientes[0])).data['id']
+        self.assertEqual(self.cliente(self.admin).put(f'/api/citas/{cita_id}/cancelar/').status_code, 200)
+
+        self.assertEqual(self.reservar(self.cliente(self.pacientes[1])).status_code, 201)
+
+    def test_mover_una_cita_a_un_horario_tomado(self):
+        self.reservar(self.cliente(self.pacientes[0]), hora=time(9))
+        cita_id = self.reservar(self.cliente(self.pacientes[1]), hora=time(10)).data['id']
+
+        respuesta = self.cliente(self.admin).patch(f'/api/citas/{cita_id}/', {'hora': '09:00'}, format='json')
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(Cita.objects.get(pk=cita_id).hora, time(10))
+
+    def test_solo_el_horario_tomado_es_conflicto(self):
+        error = IntegrityError('FOREIGN KEY constraint failed')
+
+        self.assertFalse(es_conflicto_horario(error, self.medico.id, self.fecha, time(9)))
+        cita_id = self.reservar(self.cliente(self.pacientes[0])).data['id']
+        self.assertTrue(es_conflicto_horario(error, self.medico.id, self.fecha, time(9)))
+        self.assertFalse(es_conflicto_horario(error, self.medico.id, self.fecha, time(9), excluir=cita_id))
+
+
+class TransicionesTests(CitasTestCase):
+    """Confirmar/cancelar/finalizar: un único UPDATE condicionado al estado."""
+
+    def setUp(self):
+        super().setUp()
+        self.cita = Cita.objects.create(
+            paciente=self.pacientes[0].paciente, medico=self.medico,
+            fecha=self.fecha, hora=time(9), motivo='control',
+        )
+
+    def transicion(self, accion, cita=None):
+        return lambda cliente: cliente.put(f'/api/citas/{(cita or self.cita).id}/{accion}/')
+
+    def test_confirmaciones_simultaneas(self):
+        codigos = en_paralelo([(self.admin, self.transicion('confirmar'))] * HILOS)
+
+        self.assertEqual(sorted(codigos), [200] + [409] * (HILOS - 1))
+        self.cita.refresh_from_db()
+        self.assertEqual(self.cita.estado, 'confirmada')
+
+    def test_cancelaciones_simultaneas(self):
+        codigos = en_paralelo([(self.admin, self.transicion('cancelar'))] * HILOS)
+
+        self.assertEqual(sorted(codigos), [200] + [409] * (HILOS - 1))
+        self.cita.refresh_from_db()
+        self.assertEqual(self.cita.estado, 'cancelada')
+
+    def test_confirmar_y_cancelar_simultaneos(self):
+        mitad = HILOS // 2
+        codigos = en_paralelo(
+            [(self.admin, self.transicion('confirmar'))] * mitad + [(self.admin, self.transicion('cancelar'))] * mitad
+        )
+
+        confirmadas, canceladas = codigos[:mitad].count(200), codigos[mitad:].count(200)
+        # Cancelar vale desde pendiente y desde confirmada: gana una sola
+        # cancelación y, si llegó antes, una sola confirmación
+        self.assertEqual(canceladas, 1, codigos)
+        self.assertLessEqual(confirmadas, 1, codigos)
+        self.assertEqual(codigos.count(409), HILOS - confirmadas - canceladas, codigos)
+        self.cita.refresh_from_db()
+        self.assertEqual(self.cita.estado, 'cancelada')
+        resumen = estadisticas.resumen(self.fecha, self.fecha)
+        self.assertEqual((resumen['total'], resumen['por_estado']['cancelada']), (1, 1))
+
+    def test_estado_que_no_permite_la_transicion(self):
+        cliente = self.cliente(self.admin)
+
+        respuesta = cliente.put(f'/api/citas/{self.cita.id}/finalizar/')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.data['estado'], 'pendiente')
+
+        self.assertEqual(cliente.put(f'/api/citas/{self.cita.id}/confirmar/').status_code, 200)
+        respuesta = cliente.put(f'/api/citas/{self.cita.id}/confirmar/')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.data['error'], 'La cita ya está confirmada')
+
+    def test_cita_no_visible(self):
+        otro = crear_usuario('otro.medico', 'medico')
+        Medico.objects.create(user=otro, telefono='0', horario_inicio=time(8), horario_fin=time(17))
+
+        respuesta = self.cliente(otro).put(f'/api/citas/{self.cita.id}/confirmar/')
+
+        self.assertEqual(respuesta.status_code, 404)
+        self.cita.refresh_from_db()
+        self.assertEqual(self.cita.estado, 'pendiente')
+
+
+class EstadisticasTests(CitasTestCase):
+    """``EstadisticaCita`` lleva un contador por (fecha, médico, estado)."""
+
+    def test_un_contador_por_clave(self):
+        paciente, admin = self.cliente(self.pacientes[0]), self.cliente(self.admin)
+        ids = [self.reservar(paciente, hora=time(9 + i)).data['id'] for i in range(3)]
+        for cita_id in ids:
+            admin.put(f'/api/citas/{cita_id}/confirmar/')
+        admin.put(f'/api/citas/{ids[0]}/cancelar/')
+        admin.post('/api/citas/bulk-estado/', {'accion': 'cancelar', 'ids': [ids[1]]}, format='json')
+
+        filas = EstadisticaCita.objects.filter(fecha=self.fecha, medico=self.medico)
+        self.assertEqual(
+            dict(filas.values_list('estado', 'cantidad')),
+            {'pendiente': 0, 'confirmada': 1, 'cancelada': 2},
+        )
+        resumen = estadisticas.resumen(self.fecha, self.fecha)
+        self.assertEqual(resumen['por_estado'], {'pendiente': 0, 'confirmada': 1, 'cancelada': 2, 'finalizada': 0})
+
+    def test_recalcular_conserva_los_totales(self):
+        cita_id = self.reservar(self.cliente(self.pacientes[0])).data['id']
+        self.cliente(self.admin).put(f'/api/citas/{cita_id}/confirmar/')
+        antes = estadisticas.resumen(self.fecha, self.fecha)
+
+        estadisticas.recalcular()
+
+        self.assertEqual(estadisticas.resumen(self.fecha, self.fecha), antes)
+        self.assertEqual(EstadisticaCita.objects.count(), 1)
+
+
+class RepresentacionListaTests(CitasTestCase):
+    """``representar_citas`` produce el mismo JSON que ``CitaSerializer``."""
+
+    def test_igual_que_el_serializer(self):
+        sin_nombre = User.objects.create_user('sin.nombre', password='x')
+        paciente = Paciente.objects.create(user=sin_nombre, dni='001-000000-9999A')
+        sin_especialidad = Medico.objects.create(
+            user=User.objects.create_user('sin.especialidad', password='x', first_name='Luis'),
+            telefono='0', horario_inicio=time(8), horario_fin=time(17),
+        )
+        Cita.objects.create(paciente=paciente, medico=self.medico, fecha=self.fecha, hora=time(9), motivo='control')
+        Cita.objects.create(
+            paciente=self.pacientes[0].paciente, medico=sin_especialidad,
+            fecha=self.fecha, hora=time(14, 17, 30), motivo='',
+        )
+        Cita.objects.create(
+            paciente=self.pacientes[1].paciente, medico=self.medico,
+            fecha=self.fecha + timedelta(days=40), hora=time(0, 5), motivo='ñandú',
+        )
+        citas = Cita.objects.select_related(
+            'paciente__user', 'medico__user', 'medico__especialidad',
+        ).order_by('fecha', 'hora', 'id')
+
+        esperado = JSONRenderer().render(CitaSerializer(citas, many=True).data)
+        obtenido = JSONRenderer().render(list(representar_citas(valores_para_lista(citas))))
+
+        self.assertEqual(obtenido, esperado)
+        self.assertEqual(self.cliente(self.admin).get('/api/citas/').content, esperado)
+
+
+class LotesTests(CitasTestCase):
+    """``/api/citas/bulk/`` y ``/bulk-estado/`` informan el resultado de cada elemento."""
+
+    def setUp(self):
+        super().setUp()
+        self.paciente = self.pacientes[0].paciente
+        self.admin_cliente = self.cliente(self.admin)
+
+    def item(self, hora, **campos):
+        return {
+            'paciente': self.paciente.id, 'medico': self.medico.id,
+            'fecha': self.fecha.isoformat(), 'hora': f'{hora:02d}:00:00', 'motivo': 'control', **campos,
+        }
+
+    def crear_lote(self, items):
+        respuesta = self.admin_cliente.post('/api/citas/bulk/', items, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return respuesta.data
+
+    def assertEstadisticasConsistentes(self):
+        contadores = dict(
+            EstadisticaCita.objects.values_list('estado').annotate(total=Sum('cantidad')).values_list('estado', 'total')
+        )
+        reales = Counter(Cita.objects.values_list('estado', flat=True))
+        self.assertEqual({estado: total for estado, total in contadores.items() if total}, dict(reales))
+
+    def test_estado_por_elemento(self):
+        Cita.objects.create(paciente=self.paciente, medico=self.medico, fecha=self.fecha, hora=time(11), motivo='x')
+
+        datos = self.crear_lote([
+            self.item(9),
+            self.item(9, paciente=self.pacientes[1].paciente.id),
+            self.item(10, paciente=999999),
+            'no es una cita',
+            self.item(11),
+            self.item(12),
+        ])
+
+        self.assertEqual([r['status'] for r in datos['resultados']], [201, 409, 400, 400, 409, 201])
+        self.assertEqual([r['indice'] for r in datos['resultados']], list(range(6)))
+        self.assertEqual((datos['creadas'], datos['errores']), (2, 4))
+        self.assertIn('paciente', datos['resultados'][2]['errores'])
+        self.assertEqual(datos['resultados'][0]['cita']['hora'], '09:00:00')
+        self.assertEqual(
+            sorted(Cita.objects.filter(medico=self.medico).values_list('hora', flat=True)),
+            [time(9), time(11), time(12)],
+        )
+        self.assertEstadisticasConsistentes()
+
+    def test_inserta_de_a_una_si_otra_reserva_gana_un_horario(self):
+        bulk_create = Cita.objects.bulk_create
+
+        def reserva_ajena():
+            try:
+                Cita.objects.create(
+                    paciente=self.pacientes[1].paciente, medico=self.medico,
+                    fecha=self.fecha, hora=time(10), motivo='otra petición',
+                )
+            finally:
+                connection.close()
+
+        def con_reserva_ajena(citas, *args, **kwargs):
+            # Entre la validación y el INSERT otra conexión toma las 10:00
+            hilo = Thread(target=reserva_ajena)
+            hilo.start()
+            hilo.join()
+            return bulk_create(citas, *args, **kwargs)
+
+        with mock.patch.object(Cita.objects, 'bulk_create', side_effect=con_reserva_ajena):
+            datos = self.crear_lote([self.item(9), self.item(10), self.item(11)])
+
+        self.assertEqual([r['status'] for r in datos['resultados']], [201, 409, 201])
+        self.assertEqual(Cita.objects.get(hora=time(10)).motivo, 'otra petición')
+        self.assertEqual(Cita.objects.filter(medico=self.medico).count(), 3)
+        self.assertEstadisticasConsistentes()
+
+    def test_cambio_de_estado_por_elemento(self):
+        pendiente, confirmada = (
+            Cita.objects.create(paciente=self.paciente, medico=self.medico, fecha=self.fecha, hora=time(h), motivo='x')
+            for h in (9, 10)
+        )
+        self.admin_cliente.put(f'/api/citas/{confirmada.id}/confirmar/')
+
+        respuesta = self.admin_cliente.post('/api/citas/bulk-estado/', {
+            'accion': 'confirmar', 'ids': [pendiente.id, 999999, confirmada.id, pendiente.id],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.data['actualizadas'], respuesta.data['errores']), (1, 2))
+        self.assertEqual(
+            [(r['id'], r['status']) for r in respuesta.data['resultados']],
+            [(pendiente.id, 200), (999999, 404), (confirmada.id, 409)],
+        )
+        self.assertEqual(respuesta.data['resultados'][2]['estado'], 'confirmada')
+        self.assertEqual(Cita.objects.get(pk=pendiente.id).estado, 'confirmada')
+
+        self.admin_cliente.post('/api/citas/bulk-estado/', {
+            'accion': 'cancelar', 'ids': [pendiente.id, confirmada.id],
+        }, format='json')
+        self.assertEstadisticasConsistentes()
+
+    def test_lote_solo_con_citas_propias(self):
+        ajena = Cita.objects.create(
+            paciente=self.pacientes[1].paciente, medico=self.medico, fecha=self.fecha, hora=time(9), motivo='x',
+        )
+
+        respuesta = self.cliente(self.pacientes[0]).post('/api/citas/bulk-estado/', {
+            'accion': 'cancelar', 'ids': [ajena.id],
+        }, format='json')
+
+        self.assertEqual([r['status'] for r in respuesta.data['resultados']], [404])
+        self.assertEqual(Cita.objects.get(pk=ajena.id).estado, 'pendiente')
+
+    def test_peticiones_invalidas(self):
+        self.assertEqual(self.admin_cliente.post('/api/citas/bulk/', [], format='json').status_code, 400)
+        self.assertEqual(self.admin_cliente.post('/api/citas/bulk-estado/', {
+            'accion': 'borrar', 'ids': [1],
+        }, format='json').status_code, 400)
+        self.assertEqual(self.admin_cliente.post('/api/citas/bulk-estado/', {
+            'accion': 'confirmar', 'ids': ['1'],
+        }, format='json').status_code, 400)
+
+
+class ListadoTestCase(CitasTestCase):
+    """
+    Citas de dos médicos y especialidades, con fechas, horas y ``creada_en``
+    repetidas para probar órdenes y cursores con empates.
+    """
+
+    def setUp(self):
+        super().setUp()
+        pediatria = Especialidad.objects.create(nombre='Pediatría')
+        self.pediatra = Medico.objects.create(
+            user=crear_usuario('pediatra', 'medico'), especialidad=pediatria, telefono='0',
+            horario_inicio=time(8), horario_fin=time(17),
+        )
+        p0, p1, p2 = (user.paciente for user in self.pacientes[:3])
+        manana = self.fecha + timedelta(days=1)
+        self.citas = [
+            Cita.objects.create(paciente=p, medico=m, fecha=f, hora=h, motivo=motivo, estado=estado)
+            for p, m, f, h, motivo, estado in [
+                (p0, self.medico, self.fecha, time(9), 'Dolor de cabeza', 'pendiente'),
+                (p1, self.medico, self.fecha, time(10), 'Control anual', 'confirmada'),
+                (p0, self.pediatra, manana, time(9), 'control', 'cancelada'),
+                (p2, self.medico, manana, time(9), 'fiebre', 'pendiente'),
+                (p1, self.pediatra, self.fecha + timedelta(days=2), time(8), 'vacuna', 'finalizada'),
+                (p2, self.pediatra, self.fecha - timedelta(days=1), time(16), '', 'pendiente'),
+            ]
+        ]
+        # Empates en creada_en: la paginación y el orden desempatan por id
+        creada_en = timezone.now()
+        Cita.objects.filter(pk__in=[c.pk for c in self.citas[:4]]).update(creada_en=creada_en)
+        self.admin_cliente = self.cliente(self.admin)
+
+    def ids(self, consulta='', cliente=None):
+        respuesta = (cliente or self.admin_cliente).get(f'/api/citas/?{consulta}')
+        self.assertEqual(respuesta.status_code, 200, getattr(respuesta, 'data', None))
+        return [cita['id'] for cita in respuesta.data]
+
+    def esperados(self, condicion=lambda cita: True, orden=('id',)):
+        return list(Cita.objects.filter(pk__in=[c.pk for c in self.citas if condicion(c)])
+                    .order_by(*orden).values_list('id', flat=True))
+
+
+class FiltrosTests(ListadoTestCase):
+    """Filtros y orden de ``GET /api/citas/`` (ver citas/filtros.py)."""
+
+    def ids(self, consulta='', cliente=None):
+        # Sin ``ordering`` el listado no tiene un orden definido
+        return sorted(super().ids(consulta, cliente))
+
+    def error(self, consulta):
+        respuesta = self.admin_cliente.get(f'/api/citas/?{consulta}')
+        self.assertEqual(respuesta.status_code, 400, consulta)
+        return respuesta.data['error']
+
+    def test_estado(self):
+        self.assertEqual(self.ids('estado=pendiente'), self.esperados(lambda c: c.estado == 'pendiente'))
+        self.assertEqual(
+            self.ids('estado=confirmada, cancelada'),
+            self.esperados(lambda c: c.estado in ('confirmada', 'cancelada')),
+        )
+        self.assertIn('Estado inválido', self.error('estado=borrada'))
+
+    def test_medico_paciente_y_especialidad(self):
+        self.assertEqual(self.ids(f'medico={self.pediatra.id}'), self.esperados(lambda c: c.medico == self.pediatra))
+        self.assertEqual(
+            self.ids(f'medico={self.medico.id},{self.pediatra.id}&paciente={self.pacientes[1].paciente.id}'),
+            self.esperados(lambda c: c.paciente == self.pacientes[1].paciente),
+        )
+        self.assertEqual(
+            self.ids(f'especialidad={self.medico.especialidad_id}'), self.esperados(lambda c: c.medico == self.medico),
+        )
+
+    def test_ids_invalidos(self):
+        for valor in ('abc', '1,x', ',', '²', '١', '-1', '1.0', '9' * 30):
+            with self.subTest(valor=valor):
+                error = self.error(f'medico={valor}')
+                self.assertEqual(error, 'El parámetro "medico" debe ser un id o una lista de ids separados por comas')
+
+    def test_fechas(self):
+        desde, hasta = self.fecha, self.fecha + timedelta(days=1)
+
+        self.assertEqual(
+            self.ids(f'fecha__gte={desde}&fecha__lte={hasta}'), self.esperados(lambda c: desde <= c.fecha <= hasta),
+        )
+        self.assertEqual(self.ids(f'fecha__lte={desde}'), self.esperados(lambda c: c.fecha <= desde))
+        self.assertIn('posterior', self.error(f'fecha__gte={hasta}&fecha__lte={desde}'))
+        self.assertIn('AAAA-MM-DD', self.error('fecha__gte=ayer'))
+
+    def test_busqueda_en_motivo(self):
+        self.assertEqual(self.ids('search=CONTROL'), self.esperados(lambda c: 'control' in c.motivo.lower()))
+        self.assertEqual(self.ids('search=%20'), self.esperados())
+        self.assertIn('100', self.error('search=' + 'x' * 101))
+
+    def test_ordenes(self):
+        for ordering, orden in ORDENES.items():
+            with self.subTest(ordering=ordering):
+                self.assertEqual(super().ids(f'ordering={ordering}'), self.esperados(orden=orden))
+        self.assertIn('Orden inválido', self.error('ordering=hora'))
+
+    def test_filtros_dentro_de_las_citas_visibles(self):
+        paciente = self.cliente(self.pacientes[0])
+
+        self.assertEqual(self.ids(f'paciente={self.pacientes[1].paciente.id}', cliente=paciente), [])
+        self.assertEqual(
+            self.ids('estado=pendiente', cliente=paciente),
+            self.esperados(lambda c: c.paciente == self.pacientes[0].paciente and c.estado == 'pendiente'),
+        )
+
+
+class ExportacionTests(ListadoTestCase):
+    """``GET /api/citas/export/`` en CSV y XLSX (ver citas/exportacion.py)."""
+
+    def exportar(self, cliente=None, **params):
+        rango = {'desde': (self.fecha - timedelta(days=7)).isoformat(), 'hasta': (self.fecha + timedelta(days=7)).isoformat()}
+        respuesta = (cliente or self.admin_cliente).get('/api/citas/export/', {**rango, **params})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, b''.join(respuesta.streaming_content)
+
+    def filas_csv(self, contenido):
+        return list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'), newline='')))
+
+    def test_csv(self):
+        respuesta, contenido = self.exportar(formato='csv')
+
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="citas_', respuesta['Content-Disposition'])
+        self.assertTrue(contenido.startswith('\ufeff'.encode('utf-8')))
+        filas = self.filas_csv(contenido)
+        self.assertEqual(filas[0], list(ENCABEZADOS))
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], self.esperados(orden=ORDENES['fecha']))
+        primera = dict(zip(filas[0], filas[1]))
+        self.assertEqual(primera['Estado'], 'Pendiente')
+        self.assertEqual(primera['Hora'], '16:00:00')
+
+    def test_csv_sin_formulas(self):
+        motivos = ['=HYPERLINK("http://x")', '+1', '-1', '@SUMA(A1)', 'normal', ' =con espacio']
+        Cita.objects.filter(pk__in=[c.pk for c in self.citas]).update(motivo='')
+        for cita, motivo in zip(self.citas, motivos):
+            Cita.objects.filter(pk=cita.pk).update(motivo=motivo)
+
+        filas = self.filas_csv(self.exportar(formato='csv')[1])
+
+        indice = filas[0].index('Motivo')
+        self.assertEqual(
+            sorted(fila[indice] for fila in filas[1:]),
+            sorted(["'" + m if m[0] in '=+-@' else m for m in motivos]),
+        )
+
+    def test_xlsx(self):
+        respuesta, contenido = self.exportar(formato='xlsx')
+
+        self.assertEqual(
+            respuesta['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo:
+            self.assertIsNone(archivo.testzip())
+            hoja = ElementTree.fromstring(archivo.read('xl/worksheets/sheet1.xml'))
+            ElementTree.fromstring(archivo.read('xl/workbook.xml'))
+        espacio = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        # Encabezado y una fila por cita
+        self.assertEqual(len(list(hoja.iter(f'{espacio}row'))), 1 + len(self.citas))
+
+    @skipUnless(openpyxl, 'openpyxl no está instalado')
+    def test_xlsx_legible_con_openpyxl(self):
+        Cita.objects.filter(pk=self.citas[0].pk).update(motivo='=1+1 <b>&</b> \x07')
+
+        libro = openpyxl.load_workbook(io.BytesIO(self.exportar(formato='xlsx')[1]))
+
+        self.assertEqual(libro.sheetnames, ['Citas'])
+        filas = list(libro['Citas'].iter_rows(values_only=True))
+        self.assertEqual(filas[0], ENCABEZADOS)
+        self.assertEqual([fila[0] for fila in filas[1:]], self.esperados(orden=ORDENES['fecha']))
+        por_id = {fila[0]: dict(zip(ENCABEZADOS, fila)) for fila in filas[1:]}
+        primera = por_id[self.citas[0].id]
+        self.assertEqual(primera['Fecha'].date(), self.fecha)
+        self.assertEqual(primera['Hora'], time(9))
+        self.assertEqual(primera['Motivo'], '=1+1 <b>&</b> ')
+        self.assertEqual(primera['Especialidad'], 'Medicina general')
+
+    def test_xlsx_en_varias_hojas(self):
+        filas = [(i, f'fila {i}') for i in range(5)]
+
+        contenido = b''.join(bloques_xlsx(('n', 'texto'), filas, nombre_hoja='Citas', filas_por_hoja=2))
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo:
+            hojas = sorted(nombre for nombre in archivo.namelist() if nombre.startswith('xl/worksheets/'))
+            self.assertEqual(hojas, [f'xl/worksheets/sheet{n}.xml' for n in (1, 2, 3)])
+            # Cada hoja repite el encabezado
+            self.assertEqual([archivo.read(hoja).count(b'<row>') for hoja in hojas], [3, 3, 2])
+        if openpyxl:
+            libro = openpyxl.load_workbook(io.BytesIO(contenido))
+            self.assertEqual(libro.sheetnames, ['Citas 1', 'Citas 2', 'Citas 3'])
+            self.assertEqual([fila[0] for fila in libro['Citas 3'].iter_rows(values_only=True)], ['n', 4])
+
+    def test_paciente_exporta_solo_sus_citas(self):
+        paciente = self.pacientes[0]
+
+        filas = self.filas_csv(self.exportar(cliente=self.cliente(paciente), formato='csv')[1])
+
+        self.assertEqual(
+            sorted(int(fila[0]) for fila in filas[1:]),
+            self.esperados(lambda c: c.paciente == paciente.paciente),
+        )
+
+    def test_rango(self):
+        hasta = self.fecha + timedelta(days=365)
+        self.assertEqual(self.admin_cliente.get('/api/citas/export/', {
+            'desde': self.fecha.isoformat(), 'hasta': hasta.isoformat(),
+        }).status_code, 200)
+
+        for params in ({'desde': self.fecha.isoformat(), 'hasta': (hasta + timedelta(days=1)).isoformat()},
+                       {'desde': self.fecha.isoformat(), 'hasta': (self.fecha - timedelta(days=1)).isoformat()},
+                       {'desde': 'ayer'}, {'formato': 'pdf'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.admin_cliente.get('/api/citas/export/', params).status_code, 400)
+
+
+class PaginacionTests(ListadoTestCase):
+    """Paginación por cursor de ``GET /api/citas/`` (ver citas_medicas/paginacion.py)."""
+
+    def setUp(self):
+        super().setUp()
+        # Más empates: misma fecha y hora con otro médico, y misma creada_en
+        extra = Cita.objects.create(
+            paciente=self.pacientes[3].paciente, medico=self.pediatra, fecha=self.fecha, hora=time(9),
+        )
+        Cita.objects.filter(pk=extra.pk).update(creada_en=Cita.objects.get(pk=self.citas[0].pk).creada_en)
+        self.citas.append(extra)
+
+    def recorrer(self, consulta):
+        ids, paginas = [], 0
+        url = f'/api/citas/?{consulta}'
+        while url:
+            respuesta = self.admin_cliente.get(url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.data)
+            ids += [cita['id'] for cita in respuesta.data['results']]
+            url, paginas = respuesta.data['next'], paginas + 1
+        return ids, paginas
+
+    def test_recorre_todas_las_paginas(self):
+        for ordering, orden in ORDENES.items():
+            for page_size in (1, 2, 3, len(self.citas)):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    ids, paginas = self.recorrer(f'ordering={ordering}&page_size={page_size}')
+
+                    self.assertEqual(ids, self.esperados(orden=orden))
+                    self.assertEqual(paginas, max(1, -(-len(self.citas) // page_size)))
+
+    def test_orden_por_defecto(self):
+        self.assertEqual(self.recorrer('page_size=2')[0], self.esperados(orden=('fecha', 'hora', 'id')))
+
+    def test_con_filtros(self):
+        ids, _ = self.recorrer('ordering=-creada_en&estado=pendiente&page_size=2')
+        self.assertEqual(ids, self.esperados(lambda c: c.estado == 'pendiente', ORDENES['-creada_en']))
+
+    def test_sin_paginacion(self):
+        respuesta = self.admin_cliente.get('/api/citas/')
+        self.assertIsInstance(respuesta.data, list)
+        self.assertEqual(len(respuesta.data), len(self.citas))
+
+    def test_cursor_invalido(self):
+        def cursor(valor):
+            return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+        for valor in ('no-es-base64!', cursor('{roto'), cursor('{"fecha": 1}'), cursor('["2024-01-01", "09:00"]'),
+                      cursor('["ayer", "09:00", 1]'), cursor('["2024-01-01", "09:00", "x"]')):
+            with self.subTest(cursor=valor):
+                respuesta = self.admin_cliente.get('/api/citas/', {'cursor': valor})
+                self.assertEqual(respuesta.status_code, 404)
+                self.assertEqual(respuesta.data['detail'], 'Cursor inválido')
+
+
+class StreamingTests(ListadoTestCase):
+    """``GET /api/citas/?stream=`` (ver citas_medicas/streaming.py)."""
+
+    def pedir(self, consulta, cliente=None, **cabeceras):
+        respuesta = (cliente or self.admin_cliente).get(f'/api/citas/?{consulta}', **cabeceras)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_arreglo_json_igual_al_listado(self):
+        for consulta in ('ordering=fecha', 'ordering=-creada_en&estado=pendiente', 'ordering=fecha&q=control'):
+            with self.subTest(consulta=consulta):
+                normal = self.pedir(consulta)
+                streaming = self.pedir(f'{consulta}&stream=1')
+
+                self.assertTrue(streaming.streaming)
+                self.assertEqual(streaming['Content-Type'], 'application/json')
+                self.assertEqual(b''.join(streaming.streaming_content), normal.content)
+
+    def test_en_varios_bloques(self):
+        normal = self.pedir('ordering=fecha').content
+        with mock.patch('citas_medicas.streaming.TAMANO_BLOQUE', 200):
+            bloques = list(self.pedir('ordering=fecha&stream=json').streaming_content)
+
+        self.assertGreater(len(bloques), 2)
+        self.assertEqual(b''.join(bloques), normal)
+
+    def test_ndjson(self):
+        esperado = json.loads(self.pedir('ordering=fecha').content)
+
+        for consulta, cabeceras in (('stream=ndjson', {}), ('', {'HTTP_ACCEPT': 'application/x-ndjson'})):
+            with self.subTest(consulta=consulta, cabeceras=cabeceras):
+                respuesta = self.pedir(f'ordering=fecha&{consulta}', **cabeceras)
+
+                self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+                cuerpo = b''.join(respuesta.streaming_content).decode('utf-8')
+                self.assertTrue(cuerpo.endswith('\n'))
+                self.assertEqual([json.loads(linea) for linea in cuerpo.splitlines()], esperado)
+
+    def test_vacio(self):
+        self.assertEqual(b''.join(self.pedir('paciente=999999&stream=1').streaming_content), b'[]')
+        self.assertEqual(b''.join(self.pedir('paciente=999999&stream=ndjson').streaming_content), b'')
+
+    def test_paciente_solo_sus_citas(self):
+        paciente = self.pacientes[0]
+        cliente = self.cliente(paciente)
+
+        cuerpo = b''.join(self.pedir('ordering=fecha&stream=1', cliente=cliente).streaming_content)
+
+        self.assertEqual(cuerpo, self.pedir('ordering=fecha', cliente=cliente).content)
+        self.assertEqual(
+            [cita['id'] for cita in json.loads(cuerpo)],
+            self.esperados(lambda c: c.paciente == paciente.paciente, ORDENES['fecha']),
+        )
+
+    def test_errores_en_ndjson(self):
+        respuesta = self.admin_cliente.get('/api/citas/?ordering=hora', HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        self.assertIn('Orden inválido', json.loads(respuesta.content)['error'])
+
+
+class CondicionalesTests(ListadoTestCase):
+    """``ETag`` / ``Last-Modified`` de ``/api/citas/`` (ver citas_medicas/condicionales.py)."""
+
+    def pedir(self, url='/api/citas/', **cabeceras):
+        return self.admin_cliente.get(url, **cabeceras)
+
+    def test_etag(self):
+        respuesta = self.pedir()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+        etag = respuesta['ETag']
+
+        self.assertEqual(self.pedir(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.pedir('/api/citas/?estado=pendiente', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        Cita.objects.filter(pk=self.citas[0].pk).update(motivo='otro', actualizado_en=timezone.now())
+        self.assertEqual(self.pedir(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_borrar_una_cita(self):
+        respuesta = self.pedir()
+        etag, ultima = respuesta['ETag'], respuesta['Last-Modified']
+        # La borrada no es la última modificada: MAX(actualizado_en) no cambia
+        borrada = min(self.citas, key=lambda c: Cita.objects.get(pk=c.pk).actualizado_en)
+        self.assertEqual(self.admin_cliente.delete(f'/api/citas/{borrada.id}/').status_code, 204)
+
+        despues = self.pedir(HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=ultima)
+        self.assertEqual(despues.status_code, 200)
+        self.assertEqual(despues['Last-Modified'], ultima)
+        self.assertEqual(len(despues.data), len(self.citas) - 1)
+        self.assertEqual(self.pedir(HTTP_IF_MODIFIED_SINCE=ultima).status_code, 200)
+
+    def test_if_modified_since_en_el_detalle(self):
+        url = f'/api/citas/{self.citas[0].id}/'
+        ultima = self.pedir(url)['Last-Modified']
+
+        self.assertEqual(self.pedir(url, HTTP_IF_MODIFIED_SINCE=ultima).status_code, 304)
+
+        Cita.objects.filter(pk=self.citas[0].pk).update(actualizado_en=timezone.now() + timedelta(seconds=2))
+        self.assertEqual(self.pedir(url, HTTP_IF_MODIFIED_SINCE=ultima).status_code, 200)
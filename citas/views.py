@@ -1,38 +1,58 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework.settings import api_settings
 from django.db import transaction
 import logging
+from autenticacion.autenticacion import AutenticacionPorVista
+from autenticacion.identidad import obtener_identidad
+from citas_medicas.condicionales import agregar_validadores, condicional_detalle, condicional_lista
+from citas_medicas.exportacion import FORMATOS as FORMATOS_EXPORTACION, respuesta_exportacion
+from citas_medicas.paginacion import PaginacionCursorCompuesto
+from citas_medicas.streaming import NDJSONRenderer, TAMANO_LOTE, modo_streaming, respuesta_streaming
 from .models import Cita
-from .serializers import CitaSerializer
+from . import estadisticas, exportacion
+from .estados import TRANSICIONES, aplicar_transicion, error_de_estado, error_de_rol
+from .filtros import filtrar_citas, orden_desde_parametros
+from .lotes import cambiar_estado_en_lote, crear_en_lote, maximo_por_lote
+from .serializers import CitaSerializer, ConflictoHorario, representar_citas, valores_para_lista
 
 logger = logging.getLogger(__name__)
 
+class CitaCursorPagination(PaginacionCursorCompuesto):
+    # Debe coincidir con el índice cita_fecha_hora_id_idx
+    ordering = ('fecha', 'hora', 'id')
+
 class PermisoCitas(BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        return hasattr(request.user, 'perfil')
+        return obtener_identidad(request).tiene_perfil
     
     def has_object_permission(self, request, view, obj):
         if not request.user.is_authenticated:
             return False
         
-        if request.user.perfil.tipo_usuario == 'admin':
+        identidad = obtener_identidad(request)
+        
+        if identidad.es_admin:
             return True
         
-        if request.user.perfil.tipo_usuario == 'medico':
-            return obj.medico.user == request.user
+        if identidad.es_medico:
+            return obj.medico_id == identidad.medico_id
         
-        if request.user.perfil.tipo_usuario == 'paciente':
-            return obj.paciente.user == request.user
+        if identidad.es_paciente:
+            return obj.paciente_id == identidad.paciente_id
         
         return False
 
-class CitaViewSet(viewsets.ModelViewSet):
+class CitaViewSet(AutenticacionPorVista, viewsets.ModelViewSet):
     serializer_class = CitaSerializer
     permission_classes = [IsAuthenticated, PermisoCitas]
+    pagination_class = CitaCursorPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
     
     def get_queryset(self):
         user = self.request.user
@@ -46,24 +66,20 @@ class CitaViewSet(viewsets.ModelViewSet):
             'medico__especialidad'
         )
         
-        if user.perfil.tipo_usuario == 'admin':
+        identidad = obtener_identidad(self.request)
+        
+        if identidad.es_admin:
             return queryset
         
-        if user.perfil.tipo_usuario == 'medico':
-            try:
-                from medicos.models import Medico
-                medico = Medico.objects.get(user=user)
-                return queryset.filter(medico=medico)
-            except Medico.DoesNotExist:
+        if identidad.es_medico:
+            if identidad.medico_id is None:
                 return Cita.objects.none()
+            return queryset.filter(medico_id=identidad.medico_id)
         
-        if user.perfil.tipo_usuario == 'paciente':
-            try:
-                from pacientes.models import Paciente
-                paciente = Paciente.objects.get(user=user)
-                return queryset.filter(paciente=paciente)
-            except Paciente.DoesNotExist:
+        if identidad.es_paciente:
+            if identidad.paciente_id is None:
                 return Cita.objects.none()
+            return queryset.filter(paciente_id=identidad.paciente_id)
         
         return Cita.objects.none()
     
@@ -71,131 +87,242 @@ class CitaViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['put'])
     def confirmar(self, request, pk=None):
+        return self._transicion(request, pk, 'confirmar', 'Cita confirmada correctamente')
+    
+    @action(detail=True, methods=['put'])
+    def cancelar(self, request, pk=None):
+        return self._transicion(request, pk, 'cancelar', 'Cita cancelada correctamente')
+    
+    @action(detail=True, methods=['put'])
+    def finalizar(self, request, pk=None):
+        return self._transicion(request, pk, 'finalizar', 'Cita finalizada correctamente')
+    
+    def _transicion(self, request, pk, accion, mensaje):
+        """
+        UPDATE condicionado al estado de origen y a las citas visibles
+        para el usuario (ver citas/estados.py). Si no se aplicó, la cita no
+        existe para el usuario (404) o su estado ya no lo permite (409),
+        p. ej. porque otra petición la cambió antes.
+        """
         try:
-            cita = self.get_object()
+            identidad = obtener_identidad(request)
+            error = error_de_rol(accion, identidad)
+            if error:
+                return Response({'error': error}, status=status.HTTP_403_FORBIDDEN)
+            
+            try:
+                cita_id = int(pk)
+            except (TypeError, ValueError):
+                return Response({'error': 'Cita no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+            
+            aplicada, estado = aplicar_transicion(self.get_queryset(), cita_id, accion)
+            
+            if aplicada:
+                logger.info(f"✅ Cita {cita_id} {estado} por {request.user.username}")
+                return Response({'message': mensaje, 'estado': estado})
+            
+            if estado is None:
+                return Response({'error': 'Cita no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+            
+            return Response(
+                {
+                    'error': error_de_estado(accion, estado) or 'La cita fue modificada por otra petición',
+                    'estado': estado,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
             
-            if cita.estado != 'pendiente':
+        except Exception as e:
+            logger.error(f"❌ Error en {accion} de cita: {str(e)}")
+            return Response(
+                {'error': f'Error al {accion} cita: {str(e)}'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    # ==================== OPERACIONES EN LOTE ====================
+    
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_crear(self, request):
+        try:
+            items = request.data.get('citas') if isinstance(request.data, dict) else request.data
+            if not isinstance(items, list) or not items:
                 return Response(
-                    {'error': f'La cita ya está {cita.estado}'},
+                    {'error': 'Envíe una lista de citas (o {"citas": [...]})'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            if not (request.user.perfil.tipo_usuario in ['medico', 'admin']):
+            if len(items) > maximo_por_lote():
                 return Response(
-                    {'error': 'Solo médicos y administradores pueden confirmar citas'},
-                    status=status.HTTP_403_FORBIDDEN
+                    {'error': f'Máximo {maximo_por_lote()} citas por lote'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
             
-            if request.user.perfil.tipo_usuario == 'medico':
-                if cita.medico.user != request.user:
-                    return Response(
-                        {'error': 'Solo puede confirmar sus propias citas'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            
-            cita.estado = 'confirmada'
-            cita.save()
-            
-            logger.info(f"✅ Cita {cita.id} confirmada por {request.user.username}")
+            identidad = obtener_identidad(request)
+            logger.info(f"➕ BULK de {len(items)} citas solicitado por {request.user.username}")
             
-            return Response({'message': 'Cita confirmada correctamente', 'estado': cita.estado})
+            resultados, creadas = crear_en_lote(items, identidad, self.get_serializer_context())
+            return Response({
+                'creadas': creadas,
+                'errores': len(resultados) - creadas,
+                'resultados': resultados,
+            })
             
         except Exception as e:
-            logger.error(f"❌ Error confirmando cita: {str(e)}")
+            logger.error(f"❌ Error creando lote de citas: {str(e)}")
             return Response(
-                {'error': f'Error al confirmar cita: {str(e)}'}, 
+                {'error': f'Error al crear citas: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
-    @action(detail=True, methods=['put'])
-    def cancelar(self, request, pk=None):
+    @action(detail=False, methods=['post'], url_path='bulk-estado')
+    def bulk_estado(self, request):
         try:
-            cita = self.get_object()
+            accion = request.data.get('accion')
+            ids = request.data.get('ids')
             
-            if cita.estado not in ['pendiente', 'confirmada']:
+            if accion not in TRANSICIONES:
                 return Response(
-                    {'error': f'No se puede cancelar una cita {cita.estado}'},
+                    {'error': f"Acción inválida. Use: {', '.join(TRANSICIONES)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if (not isinstance(ids, list) or not ids
+                    or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+                return Response(
+                    {'error': 'ids debe ser una lista de enteros'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if len(ids) > maximo_por_lote():
+                return Response(
+                    {'error': f'Máximo {maximo_por_lote()} citas por lote'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            user = request.user
-            if user.perfil.tipo_usuario == 'paciente':
-                if cita.paciente.user != user:
-                    return Response(
-                        {'error': 'Solo puede cancelar sus propias citas'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            elif user.perfil.tipo_usuario == 'medico':
-                if cita.medico.user != user:
-                    return Response(
-                        {'error': 'Solo puede cancelar sus propias citas'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            
-            cita.estado = 'cancelada'
-            cita.save()
+            identidad = obtener_identidad(request)
+            error = error_de_rol(accion, identidad)
+            if error:
+                return Response({'error': error}, status=status.HTTP_403_FORBIDDEN)
             
-            logger.info(f"✅ Cita {cita.id} cancelada por {request.user.username}")
+            logger.info(f"🔁 BULK {accion} de {len(ids)} citas solicitado por {request.user.username}")
             
-            return Response({'message': 'Cita cancelada correctamente', 'estado': cita.estado})
+            resultados, actualizadas = cambiar_estado_en_lote(self.get_queryset(), accion, ids, identidad)
+            return Response({
+                'actualizadas': actualizadas,
+                'errores': len(resultados) - actualizadas,
+                'resultados': resultados,
+            })
             
         except Exception as e:
-            logger.error(f"❌ Error cancelando cita: {str(e)}")
+            logger.error(f"❌ Error cambiando estado en lote: {str(e)}")
             return Response(
-                {'error': f'Error al cancelar cita: {str(e)}'}, 
+                {'error': f'Error al cambiar estado: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
-    @action(detail=True, methods=['put'])
-    def finalizar(self, request, pk=None):
+    # ==================== EXPORTACIÓN ====================
+    
+    @action(detail=False, methods=['get'], url_path='export')
+    def exportar(self, request):
+        """CSV o XLSX en streaming de las citas visibles (ver citas/exportacion.py)."""
         try:
-            cita = self.get_object()
-            
-            if cita.estado != 'confirmada':
+            formato = request.query_params.get('formato', 'csv')
+            if formato not in FORMATOS_EXPORTACION:
                 return Response(
-                    {'error': f'Solo se pueden finalizar citas confirmadas (actual: {cita.estado})'},
+                    {'error': f"Formato inválido. Use: {', '.join(FORMATOS_EXPORTACION)}"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            if not (request.user.perfil.tipo_usuario in ['medico', 'admin']):
+            try:
+                desde, hasta = exportacion.rango_desde_parametros(request.query_params)
+                citas = filtrar_citas(self.get_queryset(), request.query_params)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            logger.info(f"📤 Exportando citas ({formato}, {desde} a {hasta}) para {request.user.username}")
+            return respuesta_exportacion(
+                formato,
+                f'citas_{desde}_{hasta}',
+                exportacion.ENCABEZADOS,
+                exportacion.filas(citas.filter(fecha__range=(desde, hasta))),
+                nombre_hoja='Citas',
+            )
+            
+        except Exception as e:
+            logger.error(f"❌ Error exportando citas: {str(e)}")
+            return Response(
+                {'error': f'Error al exportar citas: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    # ==================== ESTADÍSTICAS ====================
+    
+    @action(detail=False, methods=['get'])
+    def estadisticas(self, request):
+        """Tablero del administrador: una consulta sobre EstadisticaCita (ver citas/estadisticas.py)."""
+        try:
+            if not obtener_identidad(request).es_admin:
                 return Response(
-                    {'error': 'Solo médicos y administradores pueden finalizar citas'},
+                    {'error': 'Solo los administradores pueden ver las estadísticas'},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            if request.user.perfil.tipo_usuario == 'medico':
-                if cita.medico.user != request.user:
-                    return Response(
-                        {'error': 'Solo puede finalizar sus propias citas'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            
-            cita.estado = 'finalizada'
-            cita.save()
-            
-            logger.info(f"✅ Cita {cita.id} finalizada por {request.user.username}")
+            try:
+                desde, hasta = estadisticas.rango_desde_parametros(request.query_params)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
-            return Response({'message': 'Cita finalizada correctamente', 'estado': cita.estado})
+            logger.info(f"📊 Estadísticas de citas ({desde} a {hasta}) para {request.user.username}")
+            return Response(estadisticas.resumen(desde, hasta))
             
         except Exception as e:
-            logger.error(f"❌ Error finalizando cita: {str(e)}")
+            logger.error(f"❌ Error obteniendo estadísticas: {str(e)}")
             return Response(
-                {'error': f'Error al finalizar cita: {str(e)}'}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': f'Error al obtener estadísticas: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
     # ==================== CRUD STANDARD ====================
     
     def list(self, request, *args, **kwargs):
         try:
-            logger.info(f"📋 LIST citas solicitado por {request.user.username} ({request.user.perfil.tipo_usuario})")
-            
-            citas = self.get_queryset()
-            serializer = self.get_serializer(citas, many=True)
-            
-            logger.info(f"✅ Retornando {len(serializer.data)} citas para {request.user.perfil.tipo_usuario}")
-            return Response(serializer.data)
+            identidad = obtener_identidad(request)
+            logger.info(f"📋 LIST citas solicitado por {request.user.username} ({identidad.tipo_usuario})")
             
+            try:
+                visibles = filtrar_citas(self.get_queryset(), request.query_params)
+                orden = orden_desde_parametros(request.query_params)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            no_modificado, etag, ultima = condicional_lista(request, visibles)
+            if no_modificado:
+                logger.info(f"✅ Citas sin cambios (304) para {identidad.tipo_usuario}")
+                return no_modificado
+            
+            # Solo lectura: se evita CitaSerializer (mismo JSON, ver representar_citas)
+            citas = valores_para_lista(visibles)
+            if orden:
+                # La paginación por cursor sigue el mismo orden
+                self.orden_cursor = orden
+                citas = citas.order_by(*orden)
+            
+            modo = modo_streaming(request)
+            if modo:
+                logger.info(f"📡 Enviando citas en streaming ({modo}) para {identidad.tipo_usuario}")
+                respuesta = respuesta_streaming(representar_citas(citas.iterator(chunk_size=TAMANO_LOTE)), modo)
+                return agregar_validadores(respuesta, etag, ultima)
+            
+            pagina = self.paginate_queryset(citas)
+            if pagina is not None:
+                data = list(representar_citas(pagina))
+                logger.info(f"✅ Retornando página de {len(data)} citas para {identidad.tipo_usuario}")
+                return agregar_validadores(self.get_paginated_response(data), etag, ultima)
+            
+            data = list(representar_citas(citas))
+            
+            logger.info(f"✅ Retornando {len(data)} citas para {identidad.tipo_usuario}")
+            return agregar_validadores(Response(data), etag, ultima)
+            
+        except APIException:
+            raise
         except Exception as e:
             logger.error(f"❌ Error obteniendo citas: {str(e)}")
             return Response(
@@ -203,39 +330,40 @@ class CitaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def retrieve(self, request, *args, **kwargs):
+        no_modificado, etag, ultima = condicional_detalle(request, self.get_queryset(), kwargs.get('pk'))
+        if no_modificado:
+            return no_modificado
+        
+        respuesta = super().retrieve(request, *args, **kwargs)
+        if etag:
+            agregar_validadores(respuesta, etag, ultima)
+        return respuesta
+    
     def create(self, request, *args, **kwargs):
         try:
             logger.info(f"➕ CREATE cita solicitado por {request.user.username}")
             
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            
-            user = request.user
+            identidad = obtener_identidad(request)
             data = request.data.copy()
             
-            if user.perfil.tipo_usuario == 'paciente':
-                try:
-                    from pacientes.models import Paciente
-                    paciente = Paciente.objects.get(user=user)
-                    data['paciente'] = paciente.id
-                    logger.info(f"👤 Paciente auto-asignado: {paciente.id}")
-                except Paciente.DoesNotExist:
+            if identidad.es_paciente:
+                if identidad.paciente_id is None:
                     return Response(
                         {'error': 'No se encontró perfil de paciente'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
+                data['paciente'] = identidad.paciente_id
+                logger.info(f"👤 Paciente auto-asignado: {identidad.paciente_id}")
             
-            if user.perfil.tipo_usuario == 'medico':
-                try:
-                    from medicos.models import Medico
-                    medico = Medico.objects.get(user=user)
-                    data['medico'] = medico.id
-                    logger.info(f"👨‍⚕️ Médico auto-asignado: {medico.id}")
-                except Medico.DoesNotExist:
+            if identidad.es_medico:
+                if identidad.medico_id is None:
                     return Response(
                         {'error': 'No se encontró perfil de médico'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
+                data['medico'] = identidad.medico_id
+                logger.info(f"👨‍⚕️ Médico auto-asignado: {identidad.medico_id}")
             
             serializer = self.get_serializer(data=data)
             serializer.is_valid(raise_exception=True)
@@ -246,6 +374,8 @@ class CitaViewSet(viewsets.ModelViewSet):
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
+        except ConflictoHorario:
+            raise
         except Exception as e:
             logger.error(f"❌ Error creando cita: {str(e)}")
             return Response(
@@ -272,6 +402,8 @@ class CitaViewSet(viewsets.ModelViewSet):
             
             return Response(serializer.data)
             
+        except ConflictoHorario:
+            raise
         except Exception as e:
             logger.error(f"❌ Error actualizando cita: {str(e)}")
             return Response(
@@ -284,7 +416,7 @@ class CitaViewSet(viewsets.ModelViewSet):
             instance = self.get_object()
             logger.info(f"🗑️ DELETE cita {instance.id} solicitado por {request.user.username}")
             
-            if request.user.perfil.tipo_usuario != 'admin':
+            if not obtener_identidad(request).es_admin:
                 return Response(
                     {'error': 'Solo los administradores pueden eliminar citas'},
                     status=status.HTTP_403_FORBIDDEN
@@ -0,0 +1,294 @@
+# citas_medicas/cache.py
+"""
+Capa de caché del proyecto.
+
+``CACHES['default']`` es Redis cuando está definido ``REDIS_URL`` (backend
+``RedisCache`` de Django: cualquier servidor que hable el protocolo de
+Redis). Así todos los workers comparten entradas e invalidaciones. Sin
+``REDIS_URL`` (desarrollo), en los benchmarks y en las pruebas se usa
+``CacheLocal``: en el proceso, LRU, con vencimiento y límites de entradas y
+de bytes.
+
+Sobre ese backend:
+
+- ``obtener_o_calcular`` evita la estampida al vencer una entrada cara: en
+  cada proceso calcula un solo hilo por clave y, entre procesos, el que toma
+  el candado ``<clave>:calculando``; los demás esperan su resultado.
+- ``contar``/``estadisticas`` llevan aciertos y fallos por región
+  (identidad, agenda, disponibilidad, médicos...) en este proceso, más las
+  métricas del backend si las expone.
+"""
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Límite de memoria por defecto de CacheLocal (valores serializados + claves)
+MAX_BYTES = 64 * 1024 * 1024
+# Intervalo de consulta mientras otro proceso calcula la misma clave
+INTERVALO_ESPERA = 0.05
+
+
+# ==================== BACKEND EN PROCESO ====================
+
+class _Almacen:
+    def __init__(self):
+        self.datos = OrderedDict()  # clave -> (valor serializado, vencimiento o None)
+        self.bytes = 0
+        self.bloqueo = threading.Lock()
+        self.contadores = Counter()
+
+
+# Django crea una instancia del backend por hilo: los datos se comparten por LOCATION
+_almacenes = {}
+_bloqueo_almacenes = threading.Lock()
+
+
+class CacheLocal(BaseCache):
+    """
+    Backend en proceso con desalojo LRU. Además de ``MAX_ENTRIES`` acepta
+    ``OPTIONS['MAX_BYTES']``: al superarse cualquiera de los dos límites se
+    desalojan las entradas usadas hace más tiempo. Los valores se guardan
+    serializados, como en Redis, así que un valor leído nunca comparte
+    objetos con la caché.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', MAX_BYTES))
+        with _bloqueo_almacenes:
+            self._almacen = _almacenes.setdefault(location, _Almacen())
+
+    # --- Con el bloqueo del almacén tomado ---
+
+    def _vigente(self, clave):
+        entrada = self._almacen.datos.get(clave)
+        if entrada is None:
+            return None
+        if entrada[1] is not None and entrada[1] <= time.time():
+            self._quitar(clave)
+            self._almacen.contadores['vencidas'] += 1
+            return None
+        self._almacen.datos.move_to_end(clave)
+        return entrada
+
+    def _quitar(self, clave):
+        crudo, _vence = self._almacen.datos.pop(clave)
+        self._almacen.bytes -= len(crudo) + len(clave)
+
+    def _guardar(self, clave, crudo, vence):
+        almacen = self._almacen
+        if clave in almacen.datos:
+            self._quitar(clave)
+        tamano = len(crudo) + len(clave)
+        if tamano > self._max_bytes:
+            return
+        almacen.datos[clave] = (crudo, vence)
+        almacen.bytes += tamano
+        while len(almacen.datos) > self._max_entries or almacen.bytes > self._max_bytes:
+            self._quitar(next(iter(almacen.datos)))
+            almacen.contadores['desalojos'] += 1
+
+    # --- API de BaseCache ---
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        crudo = pickle.dumps(value, self.pickle_protocol)
+        with self._almacen.bloqueo:
+            if self._vigente(clave) is not None:
+                return False
+            self._guardar(clave, crudo, self.get_backend_timeout(timeout))
+            return True
+
+    def get(self, key, default=None, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        with self._almacen.bloqueo:
+            entrada = self._vigente(clave)
+            if entrada is None:
+                self._almacen.contadores['fallos'] += 1
+                return default
+            self._almacen.contadores['aciertos'] += 1
+        return pickle.loads(entrada[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        crudo = pickle.dumps(value, self.pickle_protocol)
+        with self._almacen.bloqueo:
+            self._guardar(clave, crudo, self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        with self._almacen.bloqueo:
+            entrada = self._vigente(clave)
+            if entrada is None:
+                return False
+            self._almacen.datos[clave] = (entrada[0], self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        with self._almacen.bloqueo:
+            entrada = self._vigente(clave)
+            if entrada is None:
+                raise ValueError("Key '%s' not found" % key)
+            nuevo = pickle.loads(entrada[0]) + delta
+            self._guardar(clave, pickle.dumps(nuevo, self.pickle_protocol), entrada[1])
+        return nuevo
+
+    def has_key(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        with self._almacen.bloqueo:
+            return self._vigente(clave) is not None
+
+    def delete(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        with self._almacen.bloqueo:
+            if clave not in self._almacen.datos:
+                return False
+            self._quitar(clave)
+            return True
+
+    def clear(self):
+        with self._almacen.bloqueo:
+            self._almacen.datos.clear()
+            self._almacen.bytes = 0
+
+    def estadisticas(self):
+        with self._almacen.bloqueo:
+            contadores = dict(self._almacen.contadores)
+            entradas, bytes_ = len(self._almacen.datos), self._almacen.bytes
+        return {
+            'backend': 'local',
+            **_con_ratio(contadores.get('aciertos', 0), contadores.get('fallos', 0)),
+            'desalojos': contadores.get('desalojos', 0),
+            'vencidas': contadores.get('vencidas', 0),
+            'entradas': entradas,
+            'max_entradas': self._max_entries,
+            'bytes': bytes_,
+            'max_bytes': self._max_bytes,
+        }
+
+
+def cache_compartida():
+    """
+    Si la caché por defecto la comparten todos los procesos. Con
+    ``CacheLocal`` cada proceso tiene la suya y no ve las invalidaciones de
+    los demás.
+    """
+    return not isinstance(caches['default'], CacheLocal)
+
+
+# ==================== MÉTRICAS ====================
+
+_regiones = {}
+_bloqueo_regiones = threading.Lock()
+
+
+def _con_ratio(aciertos, fallos):
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'ratio_aciertos': round(aciertos / total, 4) if total else None,
+    }
+
+
+def contar(region, tipo, cantidad=1):
+    """Suma ``cantidad`` al contador ``tipo`` (aciertos, fallos, esperas) de ``region``."""
+    if cantidad:
+        with _bloqueo_regiones:
+            _regiones.setdefault(region, Counter())[tipo] += cantidad
+
+
+def estadisticas_region(region):
+    """Aciertos, fallos y ratio de ``region`` en este proceso."""
+    with _bloqueo_regiones:
+        contadores = dict(_regiones.get(region, {}))
+    return {
+        **_con_ratio(contadores.pop('aciertos', 0), contadores.pop('fallos', 0)),
+        **contadores,
+    }
+
+
+def estadisticas():
+    """Métricas del backend (si las expone) y de cada región."""
+    backend = cache.estadisticas() if hasattr(cache, 'estadisticas') else {'backend': type(cache).__name__}
+    with _bloqueo_regiones:
+        regiones = list(_regiones)
+    return {
+        'backend': backend,
+        'regiones': {region: estadisticas_region(region) for region in sorted(regiones)},
+    }
+
+
+# ==================== CÁLCULO SIN ESTAMPIDA ====================
+
+_SIN_VALOR = object()
+_bloqueos_locales = {}  # clave -> [Lock, hilos que lo usan]
+_bloqueo_bloqueos = threading.Lock()
+
+
+@contextmanager
+def _bloqueo_local(clave):
+    with _bloqueo_bloqueos:
+        entrada = _bloqueos_locales.setdefault(clave, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        with entrada[0]:
+            yield
+    finally:
+        with _bloqueo_bloqueos:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del _bloqueos_locales[clave]
+
+
+def obtener_o_calcular(region, clave, calcular, timeout):
+    """
+    Valor de ``clave`` en la caché o, si falta, el resultado de
+    ``calcular()``, que se guarda ``timeout`` segundos.
+
+    Un solo hilo por proceso calcula cada clave. Entre procesos calcula el
+    que toma el candado con ``cache.add``; los demás consultan la caché
+    hasta ``CACHE_ESPERA_CALCULO_SEGUNDOS`` y, si el valor no llega,
+    calculan por su cuenta.
+    """
+    valor = cache.get(clave, _SIN_VALOR)
+    if valor is not _SIN_VALOR:
+        contar(region, 'aciertos')
+        return valor
+
+    with _bloqueo_local(clave):
+        # Otro hilo pudo calcularlo mientras se esperaba el bloqueo
+        valor = cache.get(clave, _SIN_VALOR)
+        if valor is not _SIN_VALOR:
+            contar(region, 'aciertos')
+            return valor
+
+        contar(region, 'fallos')
+        candado = f'{clave}:calculando'
+        espera = settings.CACHE_ESPERA_CALCULO_SEGUNDOS
+        propio = cache.add(candado, 1, espera)
+        if not propio:
+            limite = time.monotonic() + espera
+            while time.monotonic() < limite:
+                time.sleep(INTERVALO_ESPERA)
+                valor = cache.get(clave, _SIN_VALOR)
+                if valor is not _SIN_VALOR:
+                    contar(region, 'esperas')
+                    return valor
+
+        try:
+            valor = calcular()
+            cache.set(clave, valor, timeout)
+        finally:
+            if propio:
+                cache.delete(candado)
+        return valor
@@ -0,0 +1,94 @@
+# citas_medicas/condicionales.py
+"""
+Validadores HTTP (``ETag`` / ``Last-Modified``) para listados y detalles.
+
+El validador de un listado sale de una sola consulta agregada sobre el
+queryset ya filtrado por rol: ``COUNT(id)`` detecta altas y bajas y
+``MAX(actualizado_en)`` detecta modificaciones. Si el cliente envía
+``If-None-Match`` y coincide, se responde 304 sin leer las filas ni
+serializar. En los listados se ignora ``If-Modified-Since``: al borrar una
+fila ``MAX(actualizado_en)`` no sube y solo el ETag (que incluye la
+cantidad) lo detecta. En los detalles se aceptan ambos.
+
+Los cambios de datos relacionados que se muestran en la representación
+(nombre del usuario, especialidad...) actualizan ``actualizado_en`` de las
+filas afectadas mediante señales (ver los ``models.py`` de cada app).
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def validador_lista(queryset):
+    """``(cantidad, ultima_modificacion)`` del queryset en una consulta."""
+    datos = queryset.select_related(None).order_by().aggregate(
+        cantidad=Count('id'), ultima=Max('actualizado_en'),
+    )
+    return datos['cantidad'], datos['ultima']
+
+
+def validador_detalle(queryset, pk):
+    """``actualizado_en`` de la fila visible ``pk``, o None si no existe."""
+    try:
+        return queryset.select_related(None).filter(pk=pk).values_list('actualizado_en', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def calcular_etag(request, *partes):
+    """
+    ETag que depende del usuario, la URL completa (paginación, filtros,
+    streaming) y el ``Accept``, además de ``partes``.
+    """
+    crudo = '|'.join(str(parte) for parte in (
+        request.user.pk, request.get_full_path(), request.headers.get('Accept', ''), *partes,
+    ))
+    return '"%s"' % hashlib.md5(crudo.encode('utf-8')).hexdigest()
+
+
+def no_modificado(request, etag, ultima, solo_etag=False):
+    """
+    Respuesta 304 si las cabeceras condicionales coinciden, o None. Con
+    ``solo_etag`` no se compara ``If-Modified-Since`` (listados).
+    """
+    respuesta = get_conditional_response(
+        request, etag=etag, last_modified=int(ultima.timestamp()) if ultima and not solo_etag else None,
+    )
+    if respuesta is not None:
+        agregar_validadores(respuesta, etag, ultima)
+    return respuesta
+
+
+def agregar_validadores(respuesta, etag, ultima):
+    respuesta['ETag'] = etag
+    if ultima:
+        respuesta['Last-Modified'] = http_date(ultima.timestamp())
+    # Cada usuario ve datos distintos: solo la caché del navegador, revalidando
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def condicional_lista(request, queryset):
+    """
+    Devuelve ``(respuesta_304_o_None, etag, ultima)`` para un listado. Uso::
+
+        no_mod, etag, ultima = condicional_lista(request, queryset)
+        if no_mod:
+            return no_mod
+        ...
+        return agregar_validadores(respuesta, etag, ultima)
+    """
+    cantidad, ultima = validador_lista(queryset)
+    etag = calcular_etag(request, cantidad, ultima.isoformat() if ultima else '')
+    return no_modificado(request, etag, ultima, solo_etag=True), etag, ultima
+
+
+def condicional_detalle(request, queryset, pk):
+    """Igual que ``condicional_lista`` para una fila; ``etag`` es None si no existe."""
+    ultima = validador_detalle(queryset, pk)
+    if ultima is None:
+        return None, None, None
+    etag = calcular_etag(request, ultima.isoformat())
+    return no_modificado(request, etag, ultima), etag, ultima
@@ -0,0 +1,206 @@
+# citas_medicas/consultas.py
+"""
+Medición de consultas SQL por petición y presupuestos por vista.
+
+``MedicionConsultasMiddleware`` envuelve cada petición con
+``connection.execute_wrapper`` (funciona con ``DEBUG=False``) y registra el
+número de consultas, el tiempo total en BD y la consulta más lenta. Los
+datos se devuelven en la cabecera ``Server-Timing`` y en el log
+``citas_medicas.consultas`` como campos estructurados (``extra``). En las
+respuestas en streaming (exportación, ``?stream``) la medición incluye las
+consultas hechas al generar el cuerpo y se registra al terminar de enviarlo.
+
+Configuración en ``settings.PRESUPUESTO_CONSULTAS``:
+
+- ``HABILITADO``: activa la medición (por defecto, solo con ``DEBUG``).
+- ``SERVER_TIMING``: añade la cabecera ``Server-Timing`` (ídem).
+- ``ACCION``: ``'log'`` (aviso en el log) o ``'error'`` (lanza
+  ``PresupuestoExcedido``; pensado para desarrollo y tests).
+- ``VISTAS``: ``{'CitaViewSet.list': 3, ...}`` máximo de consultas por vista,
+  contando también las de autenticación.
+
+Para tests::
+
+    with dentro_del_presupuesto('CitaViewSet.list'):
+        client.get('/api/citas/')
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_habilitado = False
+_server_timing = False
+_accion = 'log'
+_presupuestos = {}
+
+
+class PresupuestoExcedido(Exception):
+    pass
+
+
+class Medicion:
+    """Acumula consultas ejecutadas mientras está instalada como execute_wrapper."""
+
+    __slots__ = ('total', 'tiempo', 'mas_lenta', 'mas_lenta_sql')
+
+    def __init__(self):
+        self.total = 0
+        self.tiempo = 0.0
+        self.mas_lenta = 0.0
+        self.mas_lenta_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            self.tiempo += duracion
+            if duracion >= self.mas_lenta:
+                self.mas_lenta = duracion
+                self.mas_lenta_sql = sql
+
+    def campos(self):
+        return {
+            'consultas': self.total,
+            'tiempo_db_ms': round(self.tiempo * 1000, 2),
+            'mas_lenta_ms': round(self.mas_lenta * 1000, 2),
+            'mas_lenta_sql': self.mas_lenta_sql[:300] if self.mas_lenta_sql else None,
+        }
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.tiempo * 1000:.2f};desc="{self.total} consultas", '
+            f'db-lenta;dur={self.mas_lenta * 1000:.2f}'
+        )
+
+
+@contextmanager
+def medir_consultas():
+    medicion = Medicion()
+    with connection.execute_wrapper(medicion):
+        yield medicion
+
+
+def nombre_vista(view_func, metodo):
+    """``Clase.accion`` para viewsets, ``Clase.metodo`` para APIView y ``funcion`` para vistas Django."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return view_func.__name__
+
+    acciones = getattr(view_func, 'actions', None)
+    if acciones:
+        return f"{cls.__name__}.{acciones.get(metodo.lower(), metodo.lower())}"
+    return f"{cls.__name__}.{metodo.lower()}"
+
+
+def presupuesto(vista):
+    return _presupuestos.get(vista)
+
+
+def verificar(vista, medicion, accion=None):
+    """Compara la medición con el presupuesto de la vista. Devuelve True si se respeta."""
+    maximo = _presupuestos.get(vista)
+    if maximo is None or medicion.total <= maximo:
+        return True
+
+    mensaje = f"Presupuesto de consultas excedido en {vista}: {medicion.total} > {maximo}"
+    if (accion or _accion) == 'error':
+        raise PresupuestoExcedido(mensaje)
+    logger.warning(f"⚠️ {mensaje}", extra={'vista': vista, 'presupuesto': maximo, **medicion.campos()})
+    return False
+
+
+@contextmanager
+def dentro_del_presupuesto(vista, maximo=None):
+    """Helper de tests: falla con AssertionError si el bloque supera el presupuesto."""
+    maximo = maximo if maximo is not None else _presupuestos.get(vista)
+    if maximo is None:
+        raise AssertionError(f"La vista {vista} no tiene presupuesto de consultas")
+
+    with medir_consultas() as medicion:
+        yield medicion
+
+    if medicion.total > maximo:
+        raise AssertionError(
+            f"{vista}: {medicion.total} consultas (presupuesto {maximo}); "
+            f"más lenta: {medicion.mas_lenta_sql}"
+        )
+
+
+class MedicionConsultasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _habilitado:
+            return self.get_response(request)
+
+        medicion = Medicion()
+        with connection.execute_wrapper(medicion):
+            response = self.get_response(request)
+
+        if response.streaming and not response.is_async:
+            # El cuerpo (y sus consultas) se genera después de salir de aquí:
+            # se sigue midiendo mientras el servidor lo itera. Las cabeceras
+            # ya se habrán enviado, así que no lleva Server-Timing.
+            response.streaming_content = self._medir_cuerpo(request, response.streaming_content, medicion)
+            return response
+
+        if _server_timing:
+            response['Server-Timing'] = medicion.server_timing()
+        self._registrar(request, medicion)
+        return response
+
+    def _medir_cuerpo(self, request, contenido, medicion):
+        bloques = iter(contenido)
+        while True:
+            with connection.execute_wrapper(medicion):
+                bloque = next(bloques, None)
+            if bloque is None:
+                break
+            yield bloque
+        self._registrar(request, medicion)
+
+    def _registrar(self, request, medicion):
+        vista = getattr(request, '_vista_medida', None)
+        campos = medicion.campos()
+        logger.debug(
+            f"{request.method} {request.path} -> {vista}: {medicion.total} consultas, {campos['tiempo_db_ms']}ms en BD",
+            extra={'vista': vista, 'ruta': request.path, 'metodo': request.method, **campos},
+        )
+
+        if vista:
+            verificar(vista, medicion)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if _habilitado:
+            request._vista_medida = nombre_vista(view_func, request.method)
+        return None
+
+
+def configurar():
+    global _habilitado, _server_timing, _accion, _presupuestos
+
+    config = getattr(settings, 'PRESUPUESTO_CONSULTAS', {})
+    _habilitado = bool(config.get('HABILITADO', settings.DEBUG))
+    _server_timing = bool(config.get('SERVER_TIMING', settings.DEBUG))
+    _accion = config.get('ACCION', 'log')
+    _presupuestos = dict(config.get('VISTAS', {}))
+
+
+@receiver(setting_changed)
+def _recargar(setting, **kwargs):
+    if setting == 'PRESUPUESTO_CONSULTAS':
+        configurar()
+
+
+configurar()
@@ -0,0 +1,256 @@
+# citas_medicas/exportacion.py
+"""
+Exportación en streaming a CSV o XLSX con memoria acotada.
+
+Las filas (tuplas) se reciben de un iterador, normalmente
+``values_list(...).iterator(chunk_size=...)`` (cursor del lado del servidor
+en PostgreSQL), y se escriben a medida que se envían: la memoria del
+worker no depende de la cantidad de filas.
+
+- CSV: módulo ``csv`` de la biblioteca estándar, UTF-8 con BOM (Excel lo
+  necesita para mostrar tildes). Los textos que empiezan por ``= + - @``
+  se prefijan con ``'`` para que una hoja de cálculo no los evalúe como
+  fórmulas.
+- XLSX: un ZIP escrito con ``zipfile`` sobre un destino no seekable (cada
+  entrada lleva su descriptor de datos al final). Los textos van como
+  ``inlineStr`` (sin tabla de cadenas compartidas, que habría que tener
+  entera en memoria) y, al llegar al límite de filas de Excel, se abre
+  otra hoja. El libro y sus relaciones se escriben al final, cuando ya se
+  sabe cuántas hojas hay.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, time
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+FORMATOS = ('csv', 'xlsx')
+TIPOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Bytes acumulados antes de enviar un bloque
+TAMANO_BLOQUE = 64 * 1024
+# Filas de datos por hoja (Excel admite 1.048.576 contando el encabezado)
+FILAS_POR_HOJA = 1_048_575
+
+INICIO_FORMULA = ('=', '+', '-', '@')
+
+
+# ==================== CSV ====================
+
+def _celda_csv(valor):
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def bloques_csv(encabezados, filas):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    salida.write('\ufeff')
+    escritor.writerow(encabezados)
+    for fila in filas:
+        escritor.writerow([_celda_csv(valor) for valor in fila])
+        if salida.tell() >= TAMANO_BLOQUE:
+            yield salida.getvalue().encode('utf-8')
+            salida.seek(0)
+            salida.truncate()
+    yield salida.getvalue().encode('utf-8')
+
+
+# ==================== XLSX ====================
+
+class _Destino:
+    """
+    Destino no seekable para ``zipfile``: acumula lo escrito hasta que se
+    envía. Sin ``seek``/``tell``, zipfile escribe cada entrada con su
+    descriptor de datos al final.
+    """
+
+    def __init__(self):
+        self.partes = []
+        self.tamano = 0
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.tamano += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        self.tamano = 0
+        return datos
+
+
+_EPOCA_EXCEL = date(1899, 12, 30)
+# Estilos (índices de cellXfs en styles.xml)
+_ESTILO_FECHA = 1
+_ESTILO_HORA = 2
+_ESTILO_FECHA_HORA = 3
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{hojas}</Types>'
+)
+_CONTENT_TYPE_HOJA = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{hojas}</sheets></workbook>'
+)
+_WORKBOOK_HOJA = '<sheet name="{nombre}" sheetId="{n}" r:id="rId{n}"/>'
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{hojas}<Relationship Id="rId{estilos}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+_WORKBOOK_RELS_HOJA = (
+    '<Relationship Id="rId{n}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="20" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+# XML 1.0 no admite caracteres de control (salvo tab y saltos de línea)
+_CONTROL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_INICIO_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIN_HOJA = '</sheetData></worksheet>'
+
+
+def _texto_xml(valor):
+    return escape(_CONTROL.sub('', valor))
+
+
+def _celda_xlsx(valor):
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    if isinstance(valor, datetime):
+        if valor.tzinfo is not None:
+            valor = valor.replace(tzinfo=None)
+        delta = valor - datetime.combine(_EPOCA_EXCEL, time())
+        return f'<c s="{_ESTILO_FECHA_HORA}"><v>{delta.days + delta.seconds / 86400:.6f}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="{_ESTILO_FECHA}"><v>{(valor - _EPOCA_EXCEL).days}</v></c>'
+    if isinstance(valor, time):
+        segundos = valor.hour * 3600 + valor.minute * 60 + valor.second
+        return f'<c s="{_ESTILO_HORA}"><v>{segundos / 86400:.6f}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{_texto_xml(str(valor))}</t></is></c>'
+
+
+def _fila_xlsx(valores):
+    return '<row>' + ''.join(_celda_xlsx(valor) for valor in valores) + '</row>'
+
+
+def bloques_xlsx(encabezados, filas, nombre_hoja='Hoja', filas_por_hoja=FILAS_POR_HOJA):
+    """
+    Genera el XLSX por bloques. Las fechas y horas se escriben como números
+    con formato (ordenables y filtrables en Excel); los datetimes con zona
+    horaria deben llegar ya en hora local.
+    """
+    destino = _Destino()
+    archivo = zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+    encabezado = _fila_xlsx(encabezados).encode('utf-8')
+
+    hojas = 0
+    hoja = None
+    en_hoja = 0
+    for fila in filas:
+        if hoja is None or en_hoja == filas_por_hoja:
+            if hoja is not None:
+                hoja.write(_FIN_HOJA.encode('utf-8'))
+                hoja.close()
+            hojas += 1
+            hoja = archivo.open(f'xl/worksheets/sheet{hojas}.xml', 'w')
+            hoja.write(_INICIO_HOJA.encode('utf-8') + encabezado)
+            en_hoja = 0
+        hoja.write(_fila_xlsx(fila).encode('utf-8'))
+        en_hoja += 1
+        if destino.tamano >= TAMANO_BLOQUE:
+            yield destino.vaciar()
+
+    if hoja is None:
+        # Sin filas: una hoja solo con el encabezado
+        hojas = 1
+        archivo.writestr('xl/worksheets/sheet1.xml', _INICIO_HOJA + encabezado.decode('utf-8') + _FIN_HOJA)
+    else:
+        hoja.write(_FIN_HOJA.encode('utf-8'))
+        hoja.close()
+
+    numeros = range(1, hojas + 1)
+    nombres = [nombre_hoja if hojas == 1 else f'{nombre_hoja} {n}' for n in numeros]
+    archivo.writestr('[Content_Types].xml', _CONTENT_TYPES.format(
+        hojas=''.join(_CONTENT_TYPE_HOJA.format(n=n) for n in numeros),
+    ))
+    archivo.writestr('_rels/.rels', _RELS)
+    archivo.writestr('xl/workbook.xml', _WORKBOOK.format(
+        hojas=''.join(_WORKBOOK_HOJA.format(nombre=escape(nombre, {'"': '&quot;'}), n=n) for nombre, n in zip(nombres, numeros)),
+    ))
+    archivo.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(
+        hojas=''.join(_WORKBOOK_RELS_HOJA.format(n=n) for n in numeros), estilos=hojas + 1,
+    ))
+    archivo.writestr('xl/styles.xml', _STYLES)
+    archivo.close()
+    yield destino.vaciar()
+
+
+# ==================== RESPUESTA ====================
+
+def respuesta_exportacion(formato, nombre_archivo, encabezados, filas, nombre_hoja='Hoja'):
+    """``StreamingHttpResponse`` con el archivo ``nombre_archivo.<formato>`` como adjunto."""
+    if formato == 'xlsx':
+        bloques = bloques_xlsx(encabezados, filas, nombre_hoja)
+    else:
+        bloques = bloques_csv(encabezados, filas)
+    respuesta = StreamingHttpResponse(bloques, content_type=TIPOS[formato])
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{formato}"'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
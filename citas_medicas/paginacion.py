@@ -0,0 +1,130 @@
+# citas_medicas/paginacion.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacionCursorCompuesto(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre un orden compuesto y estable.
+
+    Es opcional: solo se activa si la petición trae ``?cursor=`` o
+    ``?page_size=``. El cursor codifica los valores de ``ordering`` de la
+    última fila entregada, por lo que cada página se obtiene con un rango
+    sobre el índice compuesto y su costo no crece con el número de página.
+
+    La vista puede cambiar el orden con el atributo ``orden_cursor`` (los
+    campos con ``-`` se recorren en orden descendente); el último campo
+    debe ser único.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def solicitada(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.solicitada(request):
+            return None
+
+        self.request = request
+        self.modelo = queryset.model
+        self.page_size = self.get_page_size(request)
+        self.ordering = getattr(view, 'orden_cursor', None) or type(self).ordering
+
+        queryset = queryset.order_by(*self.ordering)
+        posicion = self.decode_cursor(request)
+        if posicion is not None:
+            queryset = queryset.filter(self.filtro_posterior(posicion))
+
+        filas = list(queryset[:self.page_size + 1])
+        self.hay_siguiente = len(filas) > self.page_size
+        self.page = filas[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        valor = request.query_params.get(self.page_size_query_param)
+        if valor is None:
+            return self.page_size
+        try:
+            page_size = int(valor)
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.hay_siguiente:
+            return None
+        ultima = self.page[-1]
+        valores = [self.valor_de(ultima, campo.lstrip('-')) for campo in self.ordering]
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(valores))
+
+    # ==================== CURSOR ====================
+
+    def filtro_posterior(self, posicion):
+        """
+        Construye ``(a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)``
+        (con ``<`` en los campos descendentes).
+
+        El ``a >= x`` redundante permite al planificador usar el índice
+        compuesto como rango en lugar de evaluar el OR fila por fila.
+        """
+        campos = [
+            (campo.lstrip('-'), 'lt' if campo.startswith('-') else 'gt', valor)
+            for campo, valor in zip(self.ordering, posicion)
+        ]
+        filtro = Q()
+        for i, (campo, operador, valor) in enumerate(campos):
+            igualdades = {anterior: v for anterior, _, v in campos[:i]}
+            filtro |= Q(**igualdades, **{f'{campo}__{operador}': valor})
+
+        primero, operador, valor = campos[0]
+        return Q(**{f'{primero}__{operador}e': valor}) & filtro
+
+    def encode_cursor(self, valores):
+        serializados = [v.isoformat() if hasattr(v, 'isoformat') else v for v in valores]
+        crudo = json.dumps(serializados, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return None
+
+        try:
+            relleno = '=' * (-len(codificado) % 4)
+            valores = json.loads(base64.urlsafe_b64decode(codificado + relleno))
+            if not isinstance(valores, list) or len(valores) != len(self.ordering):
+                raise ValueError
+            return [
+                self.modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+                for campo, valor in zip(self.ordering, valores)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def valor_de(self, fila, campo):
+        if isinstance(fila, dict):
+            return fila[campo]
+        return getattr(fila, campo)
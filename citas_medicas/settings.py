@@ -31,9 +31,11 @@ INSTALLED_APPS = [
     'medicos',
     'citas',
     'autenticacion',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'citas_medicas.consultas.MedicionConsultasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -43,7 +45,6 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'autenticacion.middleware.LoginRequiredMiddleware',
-    'autenticacion.middleware.RolMiddleware',
 ]
 
 ROOT_URLCONF = 'citas_medicas.urls'
@@ -77,6 +78,19 @@ DATABASES = {
     }
 }
 
+# SQLite local para benchmarks, EXPLAIN y pruebas sin PostgreSQL
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            # Las pruebas de concurrencia abren una conexión por hilo: la base
+            # de pruebas va en un archivo y cada escritura espera su turno
+            'OPTIONS': {'timeout': 20},
+            'TEST': {'NAME': os.getenv('SQLITE_TEST_PATH', os.path.join(BASE_DIR, 'test_db.sqlite3'))},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -114,8 +128,8 @@ CORS_ALLOW_CREDENTIALS = True
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'autenticacion.autenticacion.BasicCacheadaAuthentication',
+        'autenticacion.autenticacion.JWTConIdentidadAuthentication',
     ],
     # COMENTADO para evitar problemas de permisos globales
     # 'DEFAULT_PERMISSION_CLASSES': [
@@ -130,6 +144,133 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Duración de cada cita para el cálculo de disponibilidad de los médicos
+CITAS_DURACION_SLOT_MINUTOS = int(os.getenv('CITAS_DURACION_SLOT_MINUTOS', '30'))
+CITAS_DISPONIBILIDAD_MAX_DIAS = 31
+# Elementos por petición en /api/citas/bulk/ y /api/citas/bulk-estado/
+CITAS_LOTE_MAX = 500
+# Rango máximo de /api/citas/estadisticas/
+CITAS_ESTADISTICAS_MAX_DIAS = 366
+# Rango máximo de /api/citas/export/: la memoria no crece con las filas,
+# pero cada exportación ocupa un worker y un cursor mientras dura
+CITAS_EXPORTACION_MAX_DIAS = int(os.getenv('CITAS_EXPORTACION_MAX_DIAS', '366'))
+
+# Caché (citas_medicas.cache). Con REDIS_URL (redis://host:6379/0) todos los
+# workers comparten la caché; sin ella cada proceso usa la suya en memoria
+# (LRU, acotada en entradas y bytes). Las pruebas usan siempre la local (ver
+# citas_medicas/settings_pruebas.py).
+CACHE_LOCAL = {
+    'BACKEND': 'citas_medicas.cache.CacheLocal',
+    'LOCATION': 'citas_medicas',
+    'TIMEOUT': 300,
+    'OPTIONS': {
+        'MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRADAS', '20000')),
+        'MAX_BYTES': int(os.getenv('CACHE_LOCAL_MAX_MB', '64')) * 1024 * 1024,
+    },
+}
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'citas_medicas',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {'default': CACHE_LOCAL}
+# Máximo que una petición espera a que otro proceso termine de calcular la
+# misma entrada (citas_medicas.cache.obtener_o_calcular) antes de calcularla
+CACHE_ESPERA_CALCULO_SEGUNDOS = 5
+# Listados de especialidades y médicos
+CATALOGO_CACHE_SEGUNDOS = int(os.getenv('CATALOGO_CACHE_SEGUNDOS', '300'))
+# Slots ocupados por (médico, día) para la disponibilidad (medicos.disponibilidad)
+DISPONIBILIDAD_CACHE_SEGUNDOS = int(os.getenv('DISPONIBILIDAD_CACHE_SEGUNDOS', '300'))
+
+# Grilla de agenda por (médico, día) (medicos.agenda). Cada cambio de una cita
+# borra su día de la caché; igual que con la identidad, con la caché local
+# los demás procesos lo ven al expirar este tiempo.
+AGENDA_CACHE_SEGUNDOS = int(os.getenv('AGENDA_CACHE_SEGUNDOS', '300'))
+
+# Caché de rol/paciente/médico por usuario (autenticacion.identidad). Con la
+# caché local de cada proceso la invalidación solo alcanza al proceso que
+# hizo el cambio; los demás la ven al expirar este tiempo.
+IDENTIDAD_CACHE_SEGUNDOS = int(os.getenv('IDENTIDAD_CACHE_SEGUNDOS', '300'))
+# Tiempo que la versión de identidad no se vuelve a cachear tras invalidarla
+# (autenticacion.tokens): debe superar lo que tarda una lectura en la base
+IDENTIDAD_INVALIDACION_SEGUNDOS = int(os.getenv('IDENTIDAD_INVALIDACION_SEGUNDOS', '10'))
+
+# Credenciales HTTP Basic (autenticacion.credenciales): tiempo que una
+# contraseña verificada se acepta sin repetir PBKDF2 y límite de intentos
+# fallidos por IP y por usuario dentro de la ventana (luego, 429).
+CREDENCIALES_BASIC = {
+    'CACHE_SEGUNDOS': int(os.getenv('CREDENCIALES_BASIC_CACHE_SEGUNDOS', '300')),
+    'MAX_FALLOS_IP': int(os.getenv('CREDENCIALES_BASIC_MAX_FALLOS_IP', '30')),
+    'MAX_FALLOS_USUARIO': int(os.getenv('CREDENCIALES_BASIC_MAX_FALLOS_USUARIO', '10')),
+    'VENTANA_SEGUNDOS': 300,
+}
+
+# Autenticación (autenticacion.autenticacion). En VISTAS, la cadena de
+# clases por vista (nombre de la clase); las que no figuran usan
+# DEFAULT_AUTHENTICATION_CLASSES. JWTSinEstadoAuthentication toma rol,
+# paciente y médico de los claims del access token si su versión de
+# identidad sigue vigente (ver autenticacion/tokens.py): sin consultas con
+# Redis, una consulta liviana con la caché local.
+AUTENTICACION = {
+    'VISTAS': {
+        'CitaViewSet': [
+            'autenticacion.autenticacion.JWTSinEstadoAuthentication',
+            'rest_framework.authentication.SessionAuthentication',
+            'autenticacion.autenticacion.BasicCacheadaAuthentication',
+        ],
+        'PacienteViewSet': [
+            'autenticacion.autenticacion.JWTSinEstadoAuthentication',
+            'rest_framework.authentication.SessionAuthentication',
+            'autenticacion.autenticacion.BasicCacheadaAuthentication',
+        ],
+    },
+}
+
+# Trazas de login/redirecciones (citas_medicas.trazas). Apagadas por defecto.
+TRAZAS = {
+    'HABILITADAS': os.getenv('TRAZAS_HABILITADAS', '0') == '1',
+    'MUESTREO': float(os.getenv('TRAZAS_MUESTREO', '1.0')),
+    'MANEJADOR': 'citas_medicas.trazas.manejador_logging',
+}
+
+# Medición de consultas por petición (citas_medicas.consultas). Los
+# presupuestos cuentan todas las consultas de la petición, autenticación incluida.
+PRESUPUESTO_CONSULTAS = {
+    # En producción se activa explícitamente: Server-Timing expone tiempos de BD
+    'HABILITADO': os.getenv('PRESUPUESTO_CONSULTAS_HABILITADO', '1' if DEBUG else '0') == '1',
+    'SERVER_TIMING': os.getenv('PRESUPUESTO_CONSULTAS_SERVER_TIMING', '1' if DEBUG else '0') == '1',
+    'ACCION': os.getenv('PRESUPUESTO_CONSULTAS_ACCION', 'log'),
+    'VISTAS': {
+        'CitaViewSet.list': 3,
+        'CitaViewSet.retrieve': 3,
+        'CitaViewSet.create': 7,
+        'CitaViewSet.update': 7,
+        'CitaViewSet.partial_update': 7,
+        'CitaViewSet.destroy': 4,
+        'CitaViewSet.confirmar': 3,
+        'CitaViewSet.cancelar': 3,
+        'CitaViewSet.finalizar': 3,
+        'CitaViewSet.bulk_crear': 10,
+        'CitaViewSet.bulk_estado': 5,
+        'CitaViewSet.estadisticas': 2,
+        'CitaViewSet.exportar': 2,
+        'PacienteViewSet.list': 3,
+        'PacienteViewSet.retrieve': 3,
+        'MedicoViewSet.list': 3,
+        'MedicoViewSet.retrieve': 3,
+        'MedicoViewSet.disponibilidad': 4,
+        'MedicoViewSet.disponibilidad_especialidad': 4,
+        'MedicoViewSet.agenda': 3,
+        'EspecialidadViewSet.list': 3,
+        'debug_info.get': 8,
+    },
+}
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/app/'
 LOGOUT_REDIRECT_URL = '/login/'
@@ -0,0 +1,20 @@
+# citas_medicas/settings_pruebas.py
+"""
+Settings para las pruebas::
+
+    python manage.py test --settings=citas_medicas.settings_pruebas
+
+(o ``DJANGO_SETTINGS_MODULE=citas_medicas.settings_pruebas`` con otros
+ejecutores). Igual que ``settings`` salvo:
+
+- la caché: siempre la local en proceso, aunque esté definido
+  ``REDIS_URL``, para que las pruebas no lean ni borren entradas de la
+  caché compartida;
+- el hasher de contraseñas: PBKDF2 con cientos de miles de iteraciones
+  domina el tiempo de las pruebas (cada setUp crea varios usuarios).
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import CACHE_LOCAL
+
+CACHES = {'default': CACHE_LOCAL}
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
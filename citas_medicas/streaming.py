@@ -0,0 +1,112 @@
+# citas_medicas/streaming.py
+"""
+Respuestas JSON en streaming para listados grandes.
+
+Es opcional: se activa con ``?stream=1`` (arreglo JSON) o con
+``?stream=ndjson`` / ``Accept: application/x-ndjson`` (un objeto por
+línea). Las filas se leen con ``.iterator(chunk_size=...)`` (cursor del
+lado del servidor en PostgreSQL) y se codifican a medida que se envían, así
+que la memoria del worker no depende del tamaño del resultado.
+
+El JSON generado es el mismo que produciría ``JSONRenderer`` con la
+configuración por defecto de DRF (compacto y con UTF-8 sin escapar).
+"""
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+TIPO_NDJSON = 'application/x-ndjson'
+# Filas por viaje a la BD y bytes acumulados antes de enviar un bloque
+TAMANO_LOTE = 2000
+TAMANO_BLOQUE = 64 * 1024
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Permite negociar ``Accept: application/x-ndjson``. Las respuestas que
+    no son streaming (p. ej. errores) se envían como una sola línea.
+    """
+    media_type = TIPO_NDJSON
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (_codificar(data) + '\n').encode('utf-8')
+
+
+def _codificar(obj):
+    return json.dumps(
+        obj, cls=JSONEncoder,
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+    )
+
+
+def modo_streaming(request):
+    """``'json'``, ``'ndjson'`` o None si la petición no pidió streaming."""
+    valor = request.query_params.get('stream')
+    if valor == 'ndjson':
+        return 'ndjson'
+    if TIPO_NDJSON in request.headers.get('Accept', ''):
+        return 'ndjson'
+    if valor in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+
+def _bloques(filas, modo):
+    partes = []
+    tamano = 0
+    if modo == 'json':
+        partes.append('[')
+    separador = ',' if modo == 'json' else ''
+    fin_de_fila = '\n' if modo == 'ndjson' else ''
+
+    primera = True
+    try:
+        for fila in filas:
+            texto = _codificar(fila)
+            if not primera:
+                texto = separador + texto
+            primera = False
+            texto += fin_de_fila
+            partes.append(texto)
+            tamano += len(texto)
+            if tamano >= TAMANO_BLOQUE:
+                yield ''.join(partes).encode('utf-8')
+                partes = []
+                tamano = 0
+    except Exception as e:
+        # El código de estado ya se envió: se corta la respuesta (el JSON
+        # queda incompleto y el cliente detecta el error al parsear).
+        logger.error(f"❌ Error generando respuesta en streaming: {str(e)}")
+        raise
+
+    if modo == 'json':
+        partes.append(']')
+    if partes:
+        yield ''.join(partes).encode('utf-8')
+
+
+def respuesta_streaming(filas, modo):
+    """``StreamingHttpResponse`` que codifica ``filas`` (dicts) a medida que se itera."""
+    tipo = TIPO_NDJSON if modo == 'ndjson' else 'application/json'
+    respuesta = StreamingHttpResponse(_bloques(filas, modo), content_type=tipo)
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+def representar_en_lotes(serializer_class, queryset, context=None):
+    """Itera ``queryset`` por lotes serializando cada objeto con ``serializer_class``."""
+    serializer = serializer_class(context=context or {})
+    for obj in queryset.iterator(chunk_size=TAMANO_LOTE):
+        yield serializer.to_representation(obj)
@@ -0,0 +1,268 @@
+# citas_medicas/tests.py
+import threading
+import time as reloj
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+
+from autenticacion.tests import CACHE_COMPARTIDA
+from autenticacion.tokens import emitir_tokens
+from citas.models import Cita
+from citas.tests import CitasTestCase
+
+from .cache import CacheLocal, obtener_o_calcular
+from .consultas import PresupuestoExcedido, dentro_del_presupuesto, medir_consultas, presupuesto
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA)
+class PresupuestoConsultasTests(CitasTestCase):
+    """
+    Cada vista con presupuesto en ``PRESUPUESTO_CONSULTAS['VISTAS']`` se
+    mide con la caché vacía y autenticando con JWT, como un cliente real.
+    Los presupuestos son los de producción, con la caché compartida.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.paciente = self.pacientes[0].paciente
+        self.citas = [
+            Cita.objects.create(
+                paciente=self.paciente, medico=self.medico, fecha=self.fecha, hora=time(8 + i), motivo='control',
+            )
+            for i in range(3)
+        ]
+        cache.clear()
+
+    def cliente_jwt(self, user):
+        _refresh, access = emitir_tokens(user)
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        cache.clear()
+        return cliente
+
+    def medir(self, vista, peticion, status=200):
+        with dentro_del_presupuesto(vista) as medicion:
+            respuesta = peticion()
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+        self.assertEqual(respuesta.status_code, status, getattr(respuesta, 'data', None))
+        self.assertGreater(medicion.total, 0)
+        return respuesta
+
+    def test_citas(self):
+        admin = self.cliente_jwt(self.admin)
+        cita = self.citas[0]
+        datos = {
+            'paciente': self.paciente.id, 'medico': self.medico.id,
+            'fecha': self.fecha.isoformat(), 'hora': '14:00:00', 'motivo': 'control',
+        }
+
+        self.medir('CitaViewSet.list', lambda: admin.get('/api/citas/'))
+        self.medir('CitaViewSet.list', lambda: admin.get('/api/citas/?stream=1'))
+        self.medir('CitaViewSet.retrieve', lambda: admin.get(f'/api/citas/{cita.id}/'))
+        self.medir('CitaViewSet.create', lambda: admin.post('/api/citas/', datos, format='json'), 201)
+        self.medir('CitaViewSet.update', lambda: admin.put(
+            f'/api/citas/{cita.id}/', {**datos, 'hora': '15:00:00'}, format='json',
+        ))
+        self.medir('CitaViewSet.partial_update', lambda: admin.patch(
+            f'/api/citas/{cita.id}/', {'motivo': 'seguimiento'}, format='json',
+        ))
+        self.medir('CitaViewSet.confirmar', lambda: admin.put(f'/api/citas/{cita.id}/confirmar/'))
+        self.medir('CitaViewSet.finalizar', lambda: admin.put(f'/api/citas/{cita.id}/finalizar/'))
+        self.medir('CitaViewSet.cancelar', lambda: admin.put(f'/api/citas/{self.citas[1].id}/cancelar/'))
+        self.medir('CitaViewSet.destroy', lambda: admin.delete(f'/api/citas/{self.citas[2].id}/'), 204)
+
+    def test_citas_en_lote(self):
+        admin = self.cliente_jwt(self.admin)
+        lote = [
+            {'paciente': self.paciente.id, 'medico': self.medico.id,
+             'fecha': self.fecha.isoformat(), 'hora': f'{hora}:00:00', 'motivo': 'control'}
+            for hora in (11, 12, 13)
+        ]
+
+        self.medir('CitaViewSet.bulk_crear', lambda: admin.post('/api/citas/bulk/', lote, format='json'))
+        self.medir('CitaViewSet.bulk_estado', lambda: admin.post(
+            '/api/citas/bulk-estado/', {'accion': 'confirmar', 'ids': [cita.id for cita in self.citas]}, format='json',
+        ))
+
+    def test_reportes_de_citas(self):
+        admin = self.cliente_jwt(self.admin)
+        desde = self.fecha - timedelta(days=1)
+        hasta = self.fecha + timedelta(days=1)
+        rango = f'desde={desde.isoformat()}&hasta={hasta.isoformat()}'
+
+        self.medir('CitaViewSet.estadisticas', lambda: admin.get(f'/api/citas/estadisticas/?{rango}'))
+        respuesta = self.medir('CitaViewSet.exportar', lambda: admin.get(f'/api/citas/export/?formato=csv&{rango}'))
+        self.assertTrue(respuesta.streaming)
+
+    def test_pacientes_y_medicos(self):
+        admin = self.cliente_jwt(self.admin)
+        medico = self.medico.id
+        especialidad = self.medico.especialidad_id
+
+        self.medir('PacienteViewSet.list', lambda: admin.get('/api/pacientes/'))
+        self.medir('PacienteViewSet.retrieve', lambda: admin.get(f'/api/pacientes/{self.paciente.id}/'))
+        self.medir('MedicoViewSet.list', lambda: admin.get('/api/medicos/medicos/'))
+        self.medir('MedicoViewSet.retrieve', lambda: admin.get(f'/api/medicos/medicos/{medico}/'))
+        self.medir('MedicoViewSet.disponibilidad', lambda: admin.get(
+            f'/api/medicos/medicos/{medico}/disponibilidad/?fecha={self.fecha.isoformat()}',
+        ))
+        self.medir('MedicoViewSet.disponibilidad_especialidad', lambda: admin.get(
+            f'/api/medicos/medicos/disponibilidad/?especialidad={especialidad}&fecha={self.fecha.isoformat()}',
+        ))
+        self.medir('MedicoViewSet.agenda', lambda: admin.get(
+            f'/api/medicos/medicos/{medico}/agenda/?dia={self.fecha.isoformat()}',
+        ))
+        self.medir('EspecialidadViewSet.list', lambda: admin.get('/api/medicos/especialidades/'))
+        self.medir('debug_info.get', lambda: self.cliente_jwt(self.admin).get('/api/autenticacion/debug/'))
+
+
+class MedicionStreamingTests(CitasTestCase):
+    """El middleware cuenta las consultas hechas al generar un cuerpo en streaming."""
+
+    def setUp(self):
+        super().setUp()
+        self.cliente_admin = self.cliente(self.admin)
+
+    def exportar(self):
+        respuesta = self.cliente_admin.get('/api/citas/export/?formato=csv')
+        b''.join(respuesta.streaming_content)
+        return respuesta
+
+    def test_consultas_del_cuerpo_cuentan(self):
+        configuracion = {'HABILITADO': True, 'SERVER_TIMING': True, 'VISTAS': {}}
+        with override_settings(PRESUPUESTO_CONSULTAS=configuracion):
+            with self.assertLogs('citas_medicas.consultas', 'DEBUG') as logs, medir_consultas() as medicion:
+                self.exportar()
+
+        self.assertEqual([registro.vista for registro in logs.records], ['CitaViewSet.exportar'])
+        self.assertEqual(logs.records[0].consultas, medicion.total)
+
+    def test_presupuesto_excedido_al_terminar_el_cuerpo(self):
+        configuracion = {
+            'HABILITADO': True, 'SERVER_TIMING': True, 'ACCION': 'error',
+            'VISTAS': {'CitaViewSet.exportar': 0},
+        }
+        with override_settings(PRESUPUESTO_CONSULTAS=configuracion):
+            self.assertEqual(presupuesto('CitaViewSet.exportar'), 0)
+            with self.assertRaises(PresupuestoExcedido):
+                self.exportar()
+
+    def test_sin_server_timing_en_streaming(self):
+        configuracion = {'HABILITADO': True, 'SERVER_TIMING': True, 'VISTAS': {}}
+        with override_settings(PRESUPUESTO_CONSULTAS=configuracion):
+            self.assertNotIn('Server-Timing', self.exportar())
+            self.assertIn('Server-Timing', self.cliente_admin.get('/api/citas/'))
+
+
+def cache_local(ubicacion, **opciones):
+    cache_nueva = CacheLocal(ubicacion, {'TIMEOUT': 60, 'OPTIONS': opciones})
+    cache_nueva.clear()
+    return cache_nueva
+
+
+class CacheLocalTests(SimpleTestCase):
+
+    def test_desaloja_la_usada_hace_mas_tiempo(self):
+        lru = cache_local('pruebas-lru', MAX_ENTRIES=3)
+        for clave in 'abc':
+            lru.set(clave, clave)
+
+        lru.get('a')
+        lru.set('d', 'd')
+
+        self.assertEqual([clave for clave in 'abcd' if lru.has_key(clave)], ['a', 'c', 'd'])
+        self.assertEqual(lru.estadisticas()['desalojos'], 1)
+
+    def test_limite_de_bytes(self):
+        lru = cache_local('pruebas-bytes', MAX_BYTES=4096)
+
+        lru.set('grande', 'x' * 5000)
+        self.assertFalse(lru.has_key('grande'))
+
+        for i in range(4):
+            lru.set(f'mediana{i}', 'x' * 1500)
+        self.assertLessEqual(lru.estadisticas()['bytes'], 4096)
+        self.assertEqual([lru.has_key(f'mediana{i}') for i in range(4)], [False, False, True, True])
+
+    def test_vencimiento(self):
+        lru = cache_local('pruebas-vencimiento')
+        with mock.patch('time.time', return_value=1000.0):
+            lru.set('clave', 1, timeout=10)
+            lru.set('sin_vencimiento', 1, timeout=None)
+        with mock.patch('time.time', return_value=1009.0):
+            self.assertEqual(lru.get('clave'), 1)
+            self.assertFalse(lru.add('clave', 2))
+        with mock.patch('time.time', return_value=1011.0):
+            self.assertIsNone(lru.get('clave'))
+            self.assertTrue(lru.add('clave', 2))
+            self.assertEqual(lru.get('sin_vencimiento'), 1)
+        self.assertEqual(lru.estadisticas()['vencidas'], 1)
+
+    def test_valores_sin_objetos_compartidos(self):
+        lru = cache_local('pruebas-copias')
+        valor = {'slots': [1, 2]}
+        lru.set('clave', valor)
+
+        valor['slots'].append(3)
+        leido = lru.get('clave')
+        leido['slots'].append(4)
+
+        self.assertEqual(lru.get('clave'), {'slots': [1, 2]})
+
+    def test_incr(self):
+        lru = cache_local('pruebas-incr')
+        with self.assertRaises(ValueError):
+            lru.incr('fallos')
+        lru.add('fallos', 1)
+        self.assertEqual(lru.incr('fallos', 2), 3)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'citas_medicas.cache.CacheLocal', 'LOCATION': 'pruebas-calculo'}},
+    CACHE_ESPERA_CALCULO_SEGUNDOS=2,
+)
+class ObtenerOCalcularTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_un_solo_calculo_por_clave(self):
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            reloj.sleep(0.1)
+            return {'valor': 42}
+
+        barrera = threading.Barrier(10)
+
+        def pedir(_):
+            barrera.wait()
+            return obtener_o_calcular('pruebas', 'calculo', calcular, 60)
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            resultados = list(pool.map(pedir, range(10)))
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [{'valor': 42}] * 10)
+
+    def test_espera_al_proceso_que_calcula(self):
+        # Otro proceso tomó el candado y guarda el valor al terminar
+        cache.add('calculo:calculando', 1, 2)
+        threading.Timer(0.1, lambda: cache.set('calculo', 'de otro proceso', 60)).start()
+
+        valor = obtener_o_calcular('pruebas', 'calculo', lambda: 'propio', 60)
+
+        self.assertEqual(valor, 'de otro proceso')
+
+    @override_settings(CACHE_ESPERA_CALCULO_SEGUNDOS=0.2)
+    def test_calcula_si_el_otro_proceso_no_termina(self):
+        cache.add('calculo:calculando', 1, 2)
+
+        self.assertEqual(obtener_o_calcular('pruebas', 'calculo', lambda: 'propio', 60), 'propio')
+        self.assertEqual(cache.get('calculo'), 'propio')
@@ -0,0 +1,73 @@
+# citas_medicas/trazas.py
+"""
+Gancho de trazas estructuradas para las vistas y middleware HTML.
+
+Está desactivado por defecto. Los puntos de traza se escriben así::
+
+    if trazas.activo():
+        trazas.emitir('evento', campo=valor)
+
+de modo que con las trazas apagadas solo se evalúa un booleano y nunca se
+construyen los campos (que pueden forzar la carga de ``request.user``).
+
+Configuración en ``settings.TRAZAS``:
+
+- ``HABILITADAS``: activa el gancho.
+- ``MUESTREO``: fracción de eventos que se emiten (0.0 a 1.0).
+- ``MANEJADOR``: ruta a una función ``(evento, campos)``; por defecto se
+  envían al logger ``citas_medicas.trazas`` con nivel DEBUG.
+"""
+import json
+import logging
+import random
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_habilitadas = False
+_muestreo = 1.0
+_manejador = None
+
+
+def manejador_logging(evento, campos):
+    logger.debug(
+        json.dumps({'evento': evento, **campos}, default=str, ensure_ascii=False),
+        extra={'evento': evento, 'campos': campos},
+    )
+
+
+def configurar():
+    global _habilitadas, _muestreo, _manejador
+
+    config = getattr(settings, 'TRAZAS', {})
+    _muestreo = float(config.get('MUESTREO', 1.0))
+    _manejador = import_string(config.get('MANEJADOR', 'citas_medicas.trazas.manejador_logging'))
+    _habilitadas = bool(config.get('HABILITADAS', False)) and _muestreo > 0
+
+
+def activo():
+    """True si este evento debe trazarse (habilitado y elegido por el muestreo)."""
+    if not _habilitadas:
+        return False
+    return _muestreo >= 1.0 or random.random() < _muestreo
+
+
+def emitir(evento, **campos):
+    try:
+        _manejador(evento, campos)
+    except Exception:
+        # Una traza nunca debe romper la petición
+        logger.exception(f"Error emitiendo traza {evento}")
+
+
+@receiver(setting_changed)
+def _recargar(setting, **kwargs):
+    if setting == 'TRAZAS':
+        configurar()
+
+
+configurar()
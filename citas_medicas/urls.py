@@ -5,6 +5,7 @@ from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.shortcuts import render
+from citas_medicas import trazas
 
 @ensure_csrf_cookie
 def frontend_app(request):
@@ -15,12 +16,11 @@ def app_protegida(request):
     return frontend_app(request)
 
 def home_redirect(request):
-    if request.user.is_authenticated:
-        print(f"🏠 HomeRedirect: Usuario {request.user.username} autenticado, redirigiendo a /app/")
-        return redirect('/app/')
-    else:
-        print("🏠 HomeRedirect: Usuario no autenticado, redirigiendo a /login/")
-        return redirect('/login/')
+    autenticado = request.user.is_authenticated
+    destino = '/app/' if autenticado else '/login/'
+    if trazas.activo():
+        trazas.emitir('home_redirect', autenticado=autenticado, user_id=request.user.pk, destino=destino)
+    return redirect(destino)
 
 urlpatterns = [
     path('', home_redirect, name='home'),
@@ -0,0 +1,186 @@
+# medicos/agenda.py
+"""
+Agenda de un médico por día o semana (``/api/medicos/medicos/{id}/agenda/``).
+
+Cada día es una grilla de slots de ``CITAS_DURACION_SLOT_MINUTOS`` dentro de
+la jornada del médico (ver ``disponibilidad.slots_del_medico``), con cada
+slot libre u ocupado y el resumen de sus citas. Las citas canceladas no
+ocupan el slot y no se muestran.
+
+Cada (médico, día) se guarda ya armado en la caché de Django
+(``agenda:<medico_id>:<fecha>``) durante ``AGENDA_CACHE_SEGUNDOS``. Los días
+que faltan se arman con una sola consulta por rango sobre el índice
+(medico, fecha, estado). Invalidación:
+
+- cualquier cambio de una cita borra el día de su médico: señales de
+  ``Cita`` y, donde se usa ``update()``/``bulk_create`` (transiciones,
+  lotes), llamadas explícitas a ``invalidar_agenda``;
+- un cambio del médico (horario, nombre) cambia su ``actualizado_en``, que
+  se guarda con cada día y descarta los días armados con la versión previa.
+"""
+import re
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from citas_medicas.cache import contar
+
+from .disponibilidad import clave_ocupacion, duracion_slot, indices_ocupados, slots_del_medico
+
+# Estados que se muestran en la agenda (las canceladas liberan el slot)
+ESTADOS_AGENDA = ('pendiente', 'confirmada', 'finalizada')
+# Semana ISO 8601 (``2024-W05``). Se interpreta aquí: ``date.fromisoformat``
+# solo la acepta desde Python 3.11
+SEMANA_ISO = re.compile(r'([0-9]{4})-W([0-9]{2})')
+
+
+def _clave(medico_id, fecha):
+    return f'agenda:{medico_id}:{fecha.isoformat()}'
+
+
+def _version(medico):
+    return (medico.actualizado_en.isoformat() if medico.actualizado_en else None, duracion_slot())
+
+
+def invalidar_agenda(pares):
+    """
+    Borra de la caché la agenda y la ocupación (ver medicos/disponibilidad.py)
+    de los días ``(medico_id, fecha)`` indicados, al confirmarse la
+    transacción en curso: antes, otra petición podría volver a armarlos con
+    los datos anteriores.
+    """
+    claves = list({
+        clave
+        for medico_id, fecha in pares if medico_id is not None
+        for clave in (_clave(medico_id, fecha), clave_ocupacion(medico_id, fecha))
+    })
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def dias_desde_parametros(params, ahora=None):
+    """
+    Días pedidos: ``?dia=AAAA-MM-DD`` o ``?semana=`` (una fecha o
+    ``AAAA-Www``: la semana de lunes a domingo que la contiene). Sin
+    parámetros, la semana actual. Lanza ``ValueError`` con un mensaje para
+    el cliente si el valor no es válido.
+    """
+    hoy = (ahora or timezone.localtime()).date()
+    dia = params.get('dia')
+    semana = params.get('semana')
+
+    if dia and semana:
+        raise ValueError('Use "dia" o "semana", no ambos')
+
+    try:
+        if dia:
+            return [date.fromisoformat(dia)]
+        semana_iso = SEMANA_ISO.fullmatch(semana or '')
+        if semana_iso:
+            inicio = date.fromisocalendar(int(semana_iso[1]), int(semana_iso[2]), 1)
+        else:
+            inicio = date.fromisoformat(semana) if semana else hoy
+    except ValueError:
+        raise ValueError('Formato de fecha inválido. Use: AAAA-MM-DD o AAAA-Www')
+
+    lunes = inicio - timedelta(days=inicio.weekday())
+    return [lunes + timedelta(days=i) for i in range(7)]
+
+
+def _resumen(cita):
+    return {
+        'id': cita['id'],
+        'hora': cita['hora'].isoformat(),
+        'estado': cita['estado'],
+        'paciente': cita['paciente_id'],
+        'paciente_nombre': f"{cita['paciente__user__first_name']} {cita['paciente__user__last_name']}".strip(),
+        'motivo': cita['motivo'],
+    }
+
+
+def armar_dia(medico, fecha, citas, duracion=None):
+    """Grilla de ``fecha`` a partir de las citas (ordenadas por hora) de ese día."""
+    duracion = duracion or duracion_slot()
+    slots = [{'hora': slot.isoformat(), 'libre': True, 'citas': []} for slot in slots_del_medico(medico, duracion)]
+    # Citas fuera de la jornada actual (p. ej. si cambió el horario del médico)
+    fuera_de_horario = []
+
+    for cita in citas:
+        resumen = _resumen(cita)
+        indices = [i for i in indices_ocupados(medico, cita['hora'], duracion) if 0 <= i < len(slots)]
+        if not indices:
+            fuera_de_horario.append(resumen)
+            continue
+        for indice in indices:
+            slots[indice]['libre'] = False
+            slots[indice]['citas'].append(resumen)
+
+    return {
+        'fecha': fecha.isoformat(),
+        'libres': sum(1 for slot in slots if slot['libre']),
+        'ocupados': sum(1 for slot in slots if not slot['libre']),
+        'slots': slots,
+        'fuera_de_horario': fuera_de_horario,
+    }
+
+
+def _citas_por_dia(medico, desde, hasta):
+    """Una consulta: citas del médico entre ``desde`` y ``hasta``, agrupadas por fecha."""
+    from citas.models import Cita
+
+    citas = Cita.objects.filter(
+        medico_id=medico.id,
+        fecha__range=(desde, hasta),
+        estado__in=ESTADOS_AGENDA,
+    ).order_by('fecha', 'hora', 'id').values(
+        'id', 'fecha', 'hora', 'estado', 'motivo', 'paciente_id',
+        'paciente__user__first_name', 'paciente__user__last_name',
+    )
+
+    por_dia = {}
+    for cita in citas:
+        por_dia.setdefault(cita['fecha'], []).append(cita)
+    return por_dia
+
+
+def agenda_del_medico(medico, dias):
+    """
+    Grillas de ``dias`` para ``medico`` desde la caché; los que faltan se
+    arman con una sola consulta y se guardan. Devuelve ``(dias, armados)``.
+    """
+    version = _version(medico)
+    claves = {fecha: _clave(medico.id, fecha) for fecha in dias}
+    guardados = cache.get_many(list(claves.values()))
+
+    resultado = {}
+    for fecha, clave in claves.items():
+        guardado = guardados.get(clave)
+        if guardado is not None and guardado[0] == version:
+            resultado[fecha] = guardado[1]
+
+    faltantes = [fecha for fecha in dias if fecha not in resultado]
+    contar('agenda', 'aciertos', len(resultado))
+    contar('agenda', 'fallos', len(faltantes))
+    if faltantes:
+        por_dia = _citas_por_dia(medico, min(faltantes), max(faltantes))
+        nuevos = {}
+        for fecha in faltantes:
+            resultado[fecha] = armar_dia(medico, fecha, por_dia.get(fecha, []))
+            nuevos[claves[fecha]] = (version, resultado[fecha])
+        cache.set_many(nuevos, settings.AGENDA_CACHE_SEGUNDOS)
+
+    return [resultado[fecha] for fecha in dias], len(faltantes)
+
+
+def serializar_agenda(medico, dias):
+    return {
+        'medico': medico.id,
+        'medico_nombre': f"Dr. {medico.user.first_name} {medico.user.last_name}".strip() if medico.user else "Sin médico",
+        'horario_inicio': medico.horario_inicio.isoformat(),
+        'horario_fin': medico.horario_fin.isoformat(),
+        'duracion_minutos': duracion_slot(),
+        'dias': dias,
+    }
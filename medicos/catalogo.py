@@ -0,0 +1,32 @@
+# medicos/catalogo.py
+"""
+Listados de especialidades y de médicos servidos desde la caché (ver
+citas_medicas/cache.py), ya serializados.
+
+- Especialidades: una entrada que se borra al guardar o borrar cualquier
+  especialidad.
+- Médicos: la clave incluye el validador del listado (cantidad y última
+  modificación, ver citas_medicas/condicionales.py), que ya se consulta
+  para el ETag: cualquier cambio lleva a una clave nueva y la anterior se
+  descarta al vencer o por LRU, sin invalidación explícita.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from citas_medicas.cache import obtener_o_calcular
+
+CLAVE_ESPECIALIDADES = 'catalogo:especialidades'
+
+
+def especialidades(serializar):
+    return obtener_o_calcular('especialidades', CLAVE_ESPECIALIDADES, serializar, settings.CATALOGO_CACHE_SEGUNDOS)
+
+
+def invalidar_especialidades():
+    transaction.on_commit(lambda: cache.delete(CLAVE_ESPECIALIDADES))
+
+
+def medicos(cantidad, ultima, serializar):
+    clave = f'catalogo:medicos:{cantidad}:{ultima.isoformat() if ultima else ""}'
+    return obtener_o_calcular('medicos', clave, serializar, settings.CATALOGO_CACHE_SEGUNDOS)
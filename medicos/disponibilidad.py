@@ -0,0 +1,238 @@
+# medicos/disponibilidad.py
+"""
+Cálculo de horarios libres de los médicos.
+
+La jornada de cada médico (``horario_inicio`` a ``horario_fin``) se divide en
+slots de ``CITAS_DURACION_SLOT_MINUTOS``. Para cada (médico, día) los slots
+ocupados se guardan como un entero usado de bitmap, de modo que los libres
+salen de una sola operación ``completo & ~ocupados``. Los bitmaps se
+cachean por (médico, día); los que faltan se leen con una única consulta
+sobre el índice (medico, fecha, hora). Cada cambio de una cita borra su día
+junto con el de la agenda (ver ``invalidar_agenda`` en medicos/agenda.py).
+"""
+from datetime import date, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from citas_medicas.cache import contar
+
+
+def duracion_slot():
+    return settings.CITAS_DURACION_SLOT_MINUTOS
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def slots_del_medico(medico, duracion=None):
+    """Horas de inicio de cada slot dentro de la jornada del médico."""
+    duracion = duracion or duracion_slot()
+    inicio = _minutos(medico.horario_inicio)
+    fin = _minutos(medico.horario_fin)
+    return [
+        time(m // 60, m % 60)
+        for m in range(inicio, fin - duracion + 1, duracion)
+    ]
+
+
+def indices_ocupados(medico, hora, duracion=None):
+    """
+    Índices de los slots que se solapan con una cita que empieza a ``hora``.
+
+    Las citas alineadas ocupan un solo slot; una cita desfasada (p. ej. 08:15
+    con slots de 30 min) se solapa con dos.
+    """
+    duracion = duracion or duracion_slot()
+    desplazamiento = _minutos(hora) - _minutos(medico.horario_inicio)
+    primero = desplazamiento // duracion
+    if desplazamiento % duracion:
+        return (primero, primero + 1)
+    return (primero,)
+
+
+def _mascara_pasado(slots, fecha, ahora):
+    """Bits de los slots que ya empezaron (no se pueden reservar)."""
+    hoy = ahora.date()
+    if fecha < hoy:
+        return (1 << len(slots)) - 1
+    if fecha > hoy:
+        return 0
+    hora_actual = ahora.time()
+    mascara = 0
+    for i, slot in enumerate(slots):
+        if slot <= hora_actual:
+            mascara |= 1 << i
+    return mascara
+
+
+def _bits_a_horas(bits, slots):
+    horas = []
+    i = 0
+    while bits:
+        if bits & 1:
+            horas.append(slots[i])
+        bits >>= 1
+        i += 1
+    return horas
+
+
+def clave_ocupacion(medico_id, fecha):
+    return f'ocupacion:{medico_id}:{fecha.isoformat()}'
+
+
+def _version_ocupacion(medico, duracion):
+    # Los índices de los slots dependen del inicio de la jornada y la duración
+    return (medico.horario_inicio.isoformat(), duracion)
+
+
+def ocupacion(medicos, desde, hasta, duracion=None):
+    """
+    Devuelve ``{(medico_id, fecha): bitmap}`` con los slots ocupados.
+
+    Lee de la caché los días ya calculados; los que faltan salen de una sola
+    consulta por rango sobre ``Cita`` y se guardan (también los días sin
+    citas, con bitmap 0).
+    """
+    from citas.models import Cita
+
+    duracion = duracion or duracion_slot()
+    por_id = {medico.id: medico for medico in medicos}
+    dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    claves = {(medico_id, fecha): clave_ocupacion(medico_id, fecha) for medico_id in por_id for fecha in dias}
+    guardados = cache.get_many(list(claves.values()))
+
+    ocupados = {}
+    faltantes = {}
+    for (medico_id, fecha), clave in claves.items():
+        version = _version_ocupacion(por_id[medico_id], duracion)
+        guardado = guardados.get(clave)
+        if guardado is not None and guardado[0] == version:
+            ocupados[(medico_id, fecha)] = guardado[1]
+        else:
+            faltantes[(medico_id, fecha)] = 0
+
+    contar('disponibilidad', 'aciertos', len(ocupados))
+    contar('disponibilidad', 'fallos', len(faltantes))
+    if not faltantes:
+        return ocupados
+
+    fechas = [fecha for _, fecha in faltantes]
+    citas = Cita.objects.filter(
+        medico_id__in=list({medico_id for medico_id, _ in faltantes}),
+        fecha__range=(min(fechas), max(fechas)),
+        estado__in=Cita.ESTADOS_ACTIVOS,
+    ).values_list('medico_id', 'fecha', 'hora')
+
+    for medico_id, fecha, hora in citas:
+        if (medico_id, fecha) not in faltantes:
+            continue
+        medico = por_id[medico_id]
+        bits = faltantes[(medico_id, fecha)]
+        for indice in indices_ocupados(medico, hora, duracion):
+            if indice >= 0:
+                bits |= 1 << indice
+        faltantes[(medico_id, fecha)] = bits
+
+    cache.set_many(
+        {
+            claves[par]: (_version_ocupacion(por_id[par[0]], duracion), bits)
+            for par, bits in faltantes.items()
+        },
+        settings.DISPONIBILIDAD_CACHE_SEGUNDOS,
+    )
+    ocupados.update(faltantes)
+    return ocupados
+
+
+def calcular_disponibilidad(medicos, desde, hasta, duracion=None, ahora=None):
+    """
+    Slots libres de varios médicos entre ``desde`` y ``hasta`` (inclusive).
+
+    Devuelve ``{medico_id: [(fecha, [hora, ...]), ...]}``; los días sin
+    slots libres se omiten.
+    """
+    duracion = duracion or duracion_slot()
+    ahora = ahora or timezone.localtime()
+    medicos = list(medicos)
+    ocupados = ocupacion(medicos, desde, hasta, duracion)
+
+    dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    resultado = {}
+
+    for medico in medicos:
+        slots = slots_del_medico(medico, duracion)
+        completo = (1 << len(slots)) - 1
+        libres_medico = []
+
+        for fecha in dias:
+            bloqueados = ocupados.get((medico.id, fecha), 0) | _mascara_pasado(slots, fecha, ahora)
+            libres = completo & ~bloqueados
+            if libres:
+                libres_medico.append((fecha, _bits_a_horas(libres, slots)))
+
+        resultado[medico.id] = libres_medico
+
+    return resultado
+
+
+def siguientes_disponibles(medico, fecha, hora, cantidad=3, dias=14, duracion=None, ahora=None):
+    """Primeros ``cantidad`` slots libres del médico a partir de (fecha, hora)."""
+    duracion = duracion or duracion_slot()
+    ahora = ahora or timezone.localtime()
+    desde = max(fecha, ahora.date())
+    hasta = desde + timedelta(days=dias - 1)
+
+    libres = calcular_disponibilidad([medico], desde, hasta, duracion, ahora)[medico.id]
+
+    sugerencias = []
+    for dia, horas in libres:
+        for slot in horas:
+            if dia == fecha and slot <= hora:
+                continue
+            sugerencias.append((dia, slot))
+            if len(sugerencias) == cantidad:
+                return sugerencias
+    return sugerencias
+
+
+def rango_desde_parametros(params, ahora=None):
+    """
+    Lee ``desde``/``hasta`` (YYYY-MM-DD) de la query string.
+
+    Por defecto devuelve la semana que empieza hoy. Lanza ``ValueError`` con
+    un mensaje para el cliente si el rango no es válido.
+    """
+    hoy = (ahora or timezone.localtime()).date()
+
+    try:
+        desde = date.fromisoformat(params['desde']) if params.get('desde') else hoy
+        hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else desde + timedelta(days=6)
+    except ValueError:
+        raise ValueError('Formato de fecha inválido. Use: AAAA-MM-DD')
+
+    if hasta < desde:
+        raise ValueError('La fecha "hasta" debe ser posterior a "desde"')
+
+    max_dias = settings.CITAS_DISPONIBILIDAD_MAX_DIAS
+    if (hasta - desde).days + 1 > max_dias:
+        raise ValueError(f'El rango no puede superar {max_dias} días')
+
+    return max(desde, hoy), hasta
+
+
+def serializar_disponibilidad(medico, libres, desde, hasta):
+    return {
+        'medico': medico.id,
+        'medico_nombre': f"Dr. {medico.user.first_name} {medico.user.last_name}".strip() if medico.user else "Sin médico",
+        'especialidad_nombre': medico.especialidad.nombre if medico.especialidad else None,
+        'duracion_minutos': duracion_slot(),
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': [
+            {'fecha': fecha.isoformat(), 'horas': [slot.isoformat() for slot in horas]}
+            for fecha, horas in libres
+        ],
+    }
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medico',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,5 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from autenticacion.identidad import invalidar_identidad
+from autenticacion.models import cambio_nombre
+from .catalogo import invalidar_especialidades
 
 class Especialidad(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
@@ -14,6 +20,37 @@ class Medico(models.Model):
     telefono = models.CharField(max_length=20)
     horario_inicio = models.TimeField()
     horario_fin = models.TimeField()
+    actualizado_en = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.user.get_full_name()} - {self.especialidad.nombre if self.especialidad else 'Sin especialidad'}"
\ No newline at end of file
+        return f"{self.user.get_full_name()} - {self.especialidad.nombre if self.especialidad else 'Sin especialidad'}"
+
+@receiver(post_save, sender=Medico)
+@receiver(post_delete, sender=Medico)
+def invalidar_identidad_medico(sender, instance, **kwargs):
+    invalidar_identidad(instance.user_id)
+
+# El nombre del usuario y la especialidad se muestran en el médico: cambian
+# su ETag (ver citas_medicas/condicionales.py)
+@receiver(post_save, sender=User)
+def tocar_medico_usuario(sender, instance, created, **kwargs):
+    if not cambio_nombre(instance, created):
+        return
+    Medico.objects.filter(user_id=instance.pk).update(actualizado_en=timezone.now())
+
+@receiver(post_save, sender=Especialidad)
+def tocar_medicos_especialidad(sender, instance, created, **kwargs):
+    if not created:
+        Medico.objects.filter(especialidad_id=instance.pk).update(actualizado_en=timezone.now())
+
+# Al borrar una especialidad, SET_NULL la quita de sus médicos con un UPDATE
+# directo que no cambia actualizado_en
+@receiver(pre_delete, sender=Especialidad)
+def tocar_medicos_especialidad_borrada(sender, instance, **kwargs):
+    Medico.objects.filter(especialidad_id=instance.pk).update(actualizado_en=timezone.now())
+
+# Listado de especialidades cacheado (ver medicos/catalogo.py)
+@receiver(post_save, sender=Especialidad)
+@receiver(post_delete, sender=Especialidad)
+def invalidar_catalogo_especialidades(sender, instance, **kwargs):
+    invalidar_especialidades()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from django.contrib.auth.models import User
+from autenticacion.credenciales import olvidar_credenciales
+from autenticacion.usernames import base_de_username, crear_usuario
 from .models import Medico, Especialidad
 import re
 
@@ -49,24 +50,12 @@ class MedicoSerializer(serializers.ModelSerializer):
         except Especialidad.DoesNotExist:
             raise serializers.ValidationError({"especialidad_id": "La especialidad no existe."})
         
-        nombres = nombre_completo.split(' ')
-        if len(nombres) >= 2:
-            base_username = f"{nombres[0].lower()}.{nombres[1].lower()}"
-        else:
-            base_username = nombres[0].lower()
-        
-        username = base_username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        
-        user = User.objects.create_user(
-            username=username,
+        # Siguiente username libre en una consulta (ver autenticacion/usernames.py)
+        user = crear_usuario(
+            base_de_username(nombre_completo),
             password=password,
             first_name=nombre_completo.split(' ')[0] if ' ' in nombre_completo else nombre_completo,
-            last_name=nombre_completo.split(' ')[1] if ' ' in nombre_completo else '',
-            email=f"{username}@clinica.com"
+            last_name=nombre_completo.split(' ')[1] if ' ' in nombre_completo else ''
         )
         
         medico = Medico.objects.create(
@@ -96,6 +85,7 @@ class MedicoSerializer(serializers.ModelSerializer):
             user = instance.user
             user.set_password(password)
             user.save()
+            olvidar_credenciales(user.get_username())
         
         if nombre_completo:
             user = instance.user
@@ -1,3 +1,212 @@
-from django.test import TestCase
+# medicos/tests.py
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from django.utils import timezone
+
+from citas.models import Cita
+from citas.tests import CitasTestCase, crear_usuario
+
+from .agenda import agenda_del_medico, dias_desde_parametros
+from .disponibilidad import calcular_disponibilidad, slots_del_medico
+from .models import Especialidad, Medico
+
+
+class AgendaTests(CitasTestCase):
+    """``/api/medicos/medicos/{id}/agenda/`` (ver medicos/agenda.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.paciente = self.pacientes[0].paciente
+        self.url = f'/api/medicos/medicos/{self.medico.id}/agenda/'
+
+    def agenda(self, consulta=None):
+        respuesta = self.cliente(self.admin).get(self.url, consulta or {'dia': self.fecha.isoformat()})
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return respuesta.data
+
+    def slot(self, dia, hora):
+        return next(slot for slot in dia['slots'] if slot['hora'] == hora)
+
+    def test_grilla_del_dia(self):
+        citas = ((time(9), 'confirmada'), (time(10, 15), 'pendiente'), (time(11), 'cancelada'), (time(18), 'pendiente'))
+        for hora, estado in citas:
+            Cita.objects.create(paciente=self.paciente, medico=self.medico, fecha=self.fecha, hora=hora, estado=estado)
+
+        datos = self.agenda()
+
+        self.assertEqual(
+            (datos['horario_inicio'], datos['horario_fin'], datos['duracion_minutos']), ('08:00:00', '17:00:00', 30),
+        )
+        [dia] = datos['dias']
+        self.assertEqual(dia['fecha'], self.fecha.isoformat())
+        self.assertEqual(len(dia['slots']), 18)
+        self.assertEqual((dia['libres'], dia['ocupados']), (15, 3))
+        self.assertEqual([c['estado'] for c in self.slot(dia, '09:00:00')['citas']], ['confirmada'])
+        # Desfasada: ocupa los dos slots con los que se solapa
+        self.assertFalse(self.slot(dia, '10:00:00')['libre'])
+        self.assertFalse(self.slot(dia, '10:30:00')['libre'])
+        # Cancelada: libera el slot y no se muestra
+        self.assertEqual(self.slot(dia, '11:00:00'), {'hora': '11:00:00', 'libre': True, 'citas': []})
+        self.assertEqual([c['hora'] for c in dia['fuera_de_horario']], ['18:00:00'])
+        self.assertEqual(self.slot(dia, '09:00:00')['citas'][0]['paciente_nombre'], 'paciente0 Prueba')
+
+    def test_semana(self):
+        datos = self.agenda({'semana': '2024-W01'})
+        self.assertEqual([d['fecha'] for d in datos['dias']], [f'2024-01-0{i}' for i in range(1, 8)])
+
+        self.assertEqual(self.agenda({'semana': '2024-01-03'})['dias'][0]['fecha'], '2024-01-01')
+        self.assertEqual(self.agenda({'semana': '2020-W53'})['dias'][-1]['fecha'], '2021-01-03')
+
+    def test_parametros(self):
+        miercoles = timezone.make_aware(datetime(2024, 1, 3, 10))
+        self.assertEqual(dias_desde_parametros({'dia': '2024-01-03'}), [date(2024, 1, 3)])
+        self.assertEqual(dias_desde_parametros({}, ahora=miercoles)[0], date(2024, 1, 1))
+
+        cliente = self.cliente(self.admin)
+        for consulta in ({'semana': '2024-W54'}, {'semana': '2024-w01'}, {'dia': 'hoy'},
+                         {'dia': '2024-01-01', 'semana': '2024-W01'}):
+            with self.subTest(consulta=consulta):
+                self.assertEqual(cliente.get(self.url, consulta).status_code, 400)
+
+    def test_cache_invalidada_al_reservar_y_cancelar(self):
+        paciente = self.cliente(self.pacientes[0])
+        self.assertTrue(self.slot(self.agenda()['dias'][0], '13:00:00')['libre'])
+        self.assertEqual(agenda_del_medico(self.medico, [self.fecha])[1], 0)
+
+        cita_id = self.reservar(paciente, hora=time(13)).data['id']
+        self.assertFalse(self.slot(self.agenda()['dias'][0], '13:00:00')['libre'])
+
+        self.cliente(self.admin).put(f'/api/citas/{cita_id}/cancelar/')
+        self.assertTrue(self.slot(self.agenda()['dias'][0], '13:00:00')['libre'])
+
+        self.cliente(self.admin).post('/api/citas/bulk/', [{
+            'paciente': self.paciente.id, 'medico': self.medico.id,
+            'fecha': self.fecha.isoformat(), 'hora': '14:00:00', 'motivo': 'control',
+        }], format='json')
+        self.assertFalse(self.slot(self.agenda()['dias'][0], '14:00:00')['libre'])
+
+    def test_cambio_de_horario_descarta_la_cache(self):
+        self.agenda()
+
+        self.medico.horario_fin = time(12)
+        self.medico.save()
+
+        self.assertEqual(len(self.agenda()['dias'][0]['slots']), 8)
+
+    def test_permisos(self):
+        otro = crear_usuario('otro.medico', 'medico')
+        Medico.objects.create(user=otro, telefono='0', horario_inicio=time(8), horario_fin=time(17))
+        consulta = {'dia': self.fecha.isoformat()}
+
+        self.assertEqual(self.cliente(self.pacientes[0]).get(self.url, consulta).status_code, 403)
+        self.assertEqual(self.cliente(otro).get(self.url, consulta).status_code, 403)
+        self.assertEqual(self.cliente(self.medico.user).get(self.url, consulta).status_code, 200)
+        self.assertEqual(self.cliente(self.admin).get(self.url, consulta).status_code, 200)
+
+
+class DisponibilidadTests(CitasTestCase):
+    """Slots libres por médico y por especialidad (ver medicos/disponibilidad.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/medicos/medicos/{self.medico.id}/disponibilidad/'
+        self.rango = {'desde': self.fecha.isoformat(), 'hasta': self.fecha.isoformat()}
+
+    def libres(self, consulta=None, user=None):
+        respuesta = self.cliente(user or self.pacientes[0]).get(self.url, consulta or self.rango)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return {dia['fecha']: [hora[:5] for hora in dia['horas']] for dia in respuesta.data['dias']}
+
+    def test_limites_de_la_jornada(self):
+        self.assertEqual(slots_del_medico(self.medico)[0], time(8))
+        self.assertEqual(slots_del_medico(self.medico)[-1], time(16, 30))
+
+        # Un slot que terminaría después de horario_fin no se ofrece
+        self.medico.horario_inicio, self.medico.horario_fin = time(8), time(9, 45)
+        self.medico.save()
+
+        self.assertEqual(self.libres(), {self.fecha.isoformat(): ['08:00', '08:30', '09:00']})
+
+    def test_ocupados_y_cancelados(self):
+        paciente = self.pacientes[0].paciente
+        citas = ((time(9), 'pendiente'), (time(10), 'confirmada'), (time(11), 'cancelada'), (time(12, 15), 'pendiente'))
+        for hora, estado in citas:
+            Cita.objects.create(paciente=paciente, medico=self.medico, fecha=self.fecha, hora=hora, estado=estado)
+
+        horas = self.libres()[self.fecha.isoformat()]
+
+        self.assertNotIn('09:00', horas)
+        self.assertNotIn('10:00', horas)
+        self.assertIn('11:00', horas)
+        self.assertNotIn('12:00', horas)
+        self.assertNotIn('12:30', horas)
+        self.assertEqual(len(horas), 18 - 4)
+
+    def test_reservar_y_cancelar_invalidan_la_cache(self):
+        self.assertIn('13:00', self.libres()[self.fecha.isoformat()])
+
+        cita_id = self.reservar(self.cliente(self.pacientes[0]), hora=time(13)).data['id']
+        self.assertNotIn('13:00', self.libres()[self.fecha.isoformat()])
+
+        self.cliente(self.admin).put(f'/api/citas/{cita_id}/cancelar/')
+        self.assertIn('13:00', self.libres()[self.fecha.isoformat()])
+
+    def test_hoy_sin_horas_pasadas(self):
+        hoy = date(2024, 1, 3)
+        ahora = timezone.make_aware(datetime(2024, 1, 3, 10, 10))
+
+        libres = calcular_disponibilidad([self.medico], hoy - timedelta(days=1), hoy + timedelta(days=1), ahora=ahora)
+        libres = dict(libres[self.medico.id])
+
+        self.assertNotIn(hoy - timedelta(days=1), libres)
+        self.assertEqual(libres[hoy][0], time(10, 30))
+        self.assertEqual(libres[hoy + timedelta(days=1)][0], time(8))
+
+        # A las 16:30 ya no queda nada libre hoy: el día se omite
+        tarde = timezone.make_aware(datetime(2024, 1, 3, 16, 30))
+        self.assertEqual(calcular_disponibilidad([self.medico], hoy, hoy, ahora=tarde)[self.medico.id], [])
+
+    def test_desde_y_hasta(self):
+        hasta = self.fecha + timedelta(days=2)
+        datos = self.libres({'desde': self.fecha.isoformat(), 'hasta': hasta.isoformat()})
+        self.assertEqual(list(datos), [(self.fecha + timedelta(days=i)).isoformat() for i in range(3)])
+
+        # Sin parámetros, la semana que empieza hoy; un desde pasado empieza hoy
+        hoy = timezone.localdate()
+        cliente = self.cliente(self.admin)
+        respuesta = cliente.get(self.url).data
+        self.assertEqual((respuesta['desde'], respuesta['hasta']), (str(hoy), str(hoy + timedelta(days=6))))
+        respuesta = cliente.get(self.url, {'desde': str(hoy - timedelta(days=2)), 'hasta': str(hoy)}).data
+        self.assertEqual((respuesta['desde'], respuesta['hasta']), (str(hoy), str(hoy)))
+
+        for consulta in ({'desde': hasta.isoformat(), 'hasta': self.fecha.isoformat()},
+                         {'desde': self.fecha.isoformat(), 'hasta': (self.fecha + timedelta(days=31)).isoformat()},
+                         {'desde': 'mañana'}):
+            with self.subTest(consulta=consulta):
+                self.assertEqual(cliente.get(self.url, consulta).status_code, 400)
+
+    def test_por_especialidad(self):
+        general = self.medico.especialidad
+        otro = Medico.objects.create(
+            user=crear_usuario('otro.medico', 'medico'), especialidad=general, telefono='0',
+            horario_inicio=time(14), horario_fin=time(16),
+        )
+        Medico.objects.create(
+            user=crear_usuario('pediatra', 'medico'), especialidad=Especialidad.objects.create(nombre='Pediatría'),
+            telefono='0', horario_inicio=time(8), horario_fin=time(9),
+        )
+        Cita.objects.create(paciente=self.pacientes[0].paciente, medico=otro, fecha=self.fecha, hora=time(14))
+        cliente = self.cliente(self.pacientes[0])
+        url = '/api/medicos/medicos/disponibilidad/'
+
+        datos = cliente.get(url, {**self.rango, 'especialidad': general.id}).data
+
+        self.assertEqual([m['medico'] for m in datos], [self.medico.id, otro.id])
+        self.assertEqual({m['especialidad_nombre'] for m in datos}, {'Medicina general'})
+        self.assertEqual(datos[1]['dias'], [
+            {'fecha': self.fecha.isoformat(), 'horas': ['14:30:00', '15:00:00', '15:30:00']},
+        ])
+        self.assertEqual(len(cliente.get(url, self.rango).data), 3)
+        for especialidad in ('abc', '²'):
+            with self.subTest(especialidad=especialidad):
+                self.assertEqual(cliente.get(url, {**self.rango, 'especialidad': especialidad}).status_code, 400)
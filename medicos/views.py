@@ -4,28 +4,49 @@ from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.decorators import action
 from django.db import transaction
 import logging
+import re
+from autenticacion.identidad import obtener_identidad
+from citas_medicas.condicionales import (
+    agregar_validadores, calcular_etag, condicional_detalle, no_modificado, validador_lista,
+)
 from .models import Medico, Especialidad
 from .serializers import MedicoSerializer, EspecialidadSerializer
+from . import agenda, catalogo, disponibilidad
 
 logger = logging.getLogger(__name__)
 
 class EsAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'admin'
+        return request.user.is_authenticated and obtener_identidad(request).es_admin
 
 class PermisoMedicos(BasePermission):
+    # Consultas de horarios libres abiertas a cualquier usuario con perfil
+    acciones_consulta = ('disponibilidad', 'disponibilidad_especialidad')
+    # La agenda la ven el propio médico y los administradores
+    acciones_medico = ('agenda',)
+    
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
         
-        return hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'admin'
+        identidad = obtener_identidad(request)
+        if not identidad.tiene_perfil:
+            return False
+        
+        if getattr(view, 'action', None) in self.acciones_consulta:
+            return True
+        
+        if getattr(view, 'action', None) in self.acciones_medico and identidad.es_medico:
+            return True
+        
+        return identidad.es_admin
 
 class PermisoEspecialidades(BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
         
-        return hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'admin'
+        return obtener_identidad(request).es_admin
 
 class EspecialidadViewSet(viewsets.ModelViewSet):
     queryset = Especialidad.objects.all()
@@ -35,10 +56,11 @@ class EspecialidadViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         try:
             logger.info(f"📋 LIST especialidades solicitado por {request.user.username}")
-            especialidades = self.get_queryset()
-            serializer = self.get_serializer(especialidades, many=True)
-            logger.info(f"✅ Retornando {len(serializer.data)} especialidades")
-            return Response(serializer.data)
+            datos = catalogo.especialidades(
+                lambda: self.get_serializer(self.get_queryset(), many=True).data
+            )
+            logger.info(f"✅ Retornando {len(datos)} especialidades")
+            return Response(datos)
         except Exception as e:
             logger.error(f"❌ Error obteniendo especialidades: {str(e)}")
             return Response(
@@ -54,10 +76,18 @@ class MedicoViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         try:
             logger.info(f"📋 LIST médicos solicitado por {request.user.username}")
-            medicos = self.get_queryset()
-            serializer = self.get_serializer(medicos, many=True)
-            logger.info(f"✅ Retornando {len(serializer.data)} médicos")
-            return Response(serializer.data)
+            # Validador a mano (no condicional_lista): la cantidad también es parte de la clave de caché
+            cantidad, ultima = validador_lista(self.get_queryset())
+            etag = calcular_etag(request, cantidad, ultima.isoformat() if ultima else '')
+            respuesta_304 = no_modificado(request, etag, ultima, solo_etag=True)
+            if respuesta_304:
+                return respuesta_304
+            
+            datos = catalogo.medicos(
+                cantidad, ultima, lambda: self.get_serializer(self.get_queryset(), many=True).data
+            )
+            logger.info(f"✅ Retornando {len(datos)} médicos")
+            return agregar_validadores(Response(datos), etag, ultima)
         except Exception as e:
             logger.error(f"❌ Error obteniendo médicos: {str(e)}")
             return Response(
@@ -65,6 +95,16 @@ class MedicoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def retrieve(self, request, *args, **kwargs):
+        no_modificado, etag, ultima = condicional_detalle(request, self.get_queryset(), kwargs.get('pk'))
+        if no_modificado:
+            return no_modificado
+        
+        respuesta = super().retrieve(request, *args, **kwargs)
+        if etag:
+            agregar_validadores(respuesta, etag, ultima)
+        return respuesta
+
     def create(self, request, *args, **kwargs):
         try:
             logger.info(f"➕ CREATE médico solicitado por {request.user.username}")
@@ -83,4 +123,64 @@ class MedicoViewSet(viewsets.ModelViewSet):
             return Response(
                 {'error': f'Error al crear médico: {str(e)}'}, 
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+    # ==================== DISPONIBILIDAD ====================
+
+    @action(detail=True, methods=['get'])
+    def disponibilidad(self, request, pk=None):
+        medico = self.get_object()
+        
+        try:
+            desde, hasta = disponibilidad.rango_desde_parametros(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        libres = disponibilidad.calcular_disponibilidad([medico], desde, hasta)
+        return Response(disponibilidad.serializar_disponibilidad(medico, libres[medico.id], desde, hasta))
+
+    @action(detail=False, methods=['get'], url_path='disponibilidad', url_name='disponibilidad-lista')
+    def disponibilidad_especialidad(self, request):
+        try:
+            desde, hasta = disponibilidad.rango_desde_parametros(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        medicos = self.get_queryset()
+        especialidad = request.query_params.get('especialidad')
+        if especialidad:
+            if not re.fullmatch(r'[0-9]{1,18}', especialidad):
+                return Response({'error': 'Especialidad inválida'}, status=status.HTTP_400_BAD_REQUEST)
+            medicos = medicos.filter(especialidad_id=especialidad)
+        
+        medicos = list(medicos.order_by('id'))
+        libres = disponibilidad.calcular_disponibilidad(medicos, desde, hasta)
+        
+        logger.info(f"📅 Disponibilidad de {len(medicos)} médicos ({desde} a {hasta}) para {request.user.username}")
+        return Response([
+            disponibilidad.serializar_disponibilidad(medico, libres[medico.id], desde, hasta)
+            for medico in medicos
+        ])
+
+    # ==================== AGENDA ====================
+
+    @action(detail=True, methods=['get'])
+    def agenda(self, request, pk=None):
+        """
+        Grilla de slots del médico por día (``?dia=``) o semana (``?semana=``),
+        cacheada por (médico, día); ver medicos/agenda.py.
+        """
+        identidad = obtener_identidad(request)
+        if identidad.es_medico and str(identidad.medico_id) != str(pk):
+            return Response({'error': 'Solo puede ver su propia agenda'}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            dias = agenda.dias_desde_parametros(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        medico = self.get_object()
+        grillas, armados = agenda.agenda_del_medico(medico, dias)
+        
+        logger.info(f"📅 Agenda del médico {medico.id} ({dias[0]} a {dias[-1]}, {armados} días armados) para {request.user.username}")
+        return Response(agenda.serializar_agenda(medico, grillas))
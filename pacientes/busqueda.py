@@ -0,0 +1,86 @@
+# pacientes/busqueda.py
+"""
+Búsqueda de pacientes por DNI, nombre o teléfono (``/api/pacientes/?q=``).
+
+Cada paciente tiene varias claves precalculadas en ``ClaveBusqueda`` (una
+fila por clave, índice ``(clave, paciente)``):
+
+- DNI sin guiones: ``001120190001a``
+- teléfono, solo dígitos
+- ``nombreapellido`` y ``apellidonombre``
+
+Las claves son minúsculas, sin tildes y solo con ``[0-9a-z]``, así que el
+orden es el mismo con cualquier collation y un prefijo se expresa como el
+rango ``clave >= 'abc' AND clave < 'abd'``: PostgreSQL y SQLite lo
+resuelven con el índice B-tree, ya en el orden de la paginación.
+
+Las claves se regeneran en ``Paciente.save()`` y al guardar el ``User``.
+Quien cree pacientes con ``bulk_create`` (que no llama a ``save()``) debe
+crear también sus ``ClaveBusqueda`` (ver ``ClaveBusqueda.para_paciente``).
+"""
+import unicodedata
+
+ALFABETO = '0123456789abcdefghijklmnopqrstuvwxyz'
+LARGO_CLAVE = 150
+LARGO_MINIMO = 2
+LARGO_MAXIMO = 100
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y solo letras y dígitos: ``'Núñez-Díaz 2'`` → ``'nunezdiaz2'``."""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto.lower() if c in ALFABETO)
+
+
+def claves_busqueda(dni, telefono, first_name, last_name):
+    """Claves (sin repetir ni vacías) de un paciente."""
+    nombre = normalizar(first_name)
+    apellido = normalizar(last_name)
+    claves = [
+        normalizar(dni),
+        ''.join(c for c in (telefono or '') if c.isdigit()),
+        nombre + apellido,
+        apellido + nombre,
+    ]
+    return list(dict.fromkeys(clave[:LARGO_CLAVE] for clave in claves if clave))
+
+
+def termino_busqueda(texto):
+    """
+    Normaliza el texto de ``?q=``. Lanza ``ValueError`` con un mensaje para el
+    cliente si es demasiado corto o largo.
+    """
+    if len(texto or '') > LARGO_MAXIMO:
+        raise ValueError(f'La búsqueda no puede superar {LARGO_MAXIMO} caracteres')
+    termino = normalizar(texto)
+    if len(termino) < LARGO_MINIMO:
+        raise ValueError(f'La búsqueda debe tener al menos {LARGO_MINIMO} letras o dígitos')
+    return termino
+
+
+def fin_de_prefijo(prefijo):
+    """Menor clave mayor que todas las que empiezan por ``prefijo`` (None si no hay)."""
+    while prefijo and prefijo[-1] == ALFABETO[-1]:
+        prefijo = prefijo[:-1]
+    if not prefijo:
+        return None
+    return prefijo[:-1] + ALFABETO[ALFABETO.index(prefijo[-1]) + 1]
+
+
+def buscar_claves(texto, visibles=None):
+    """
+    ``ClaveBusqueda`` cuyo prefijo coincide con ``texto``, con el paciente y su
+    usuario precargados. ``visibles`` restringe a esos pacientes (None = todos).
+    """
+    from .models import ClaveBusqueda
+
+    termino = termino_busqueda(texto)
+    claves = ClaveBusqueda.objects.filter(clave__gte=termino).select_related('paciente__user')
+    fin = fin_de_prefijo(termino)
+    if fin is not None:
+        claves = claves.filter(clave__lt=fin)
+    if visibles is not None:
+        claves = claves.filter(paciente__in=visibles)
+    return claves
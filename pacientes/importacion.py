@@ -0,0 +1,272 @@
+# pacientes/importacion.py
+"""
+Importación masiva de pacientes desde CSV o NDJSON (comando
+``importar_pacientes`` y ``POST /api/pacientes/importar/``).
+
+El archivo se lee fila a fila (nunca se carga entero) y se procesa por
+lotes. En cada lote:
+
+- se validan los campos y el formato del DNI como en PacienteSerializer, y
+  los DNI ya registrados se buscan con una sola consulta;
+- los usernames (``nombre.apellido`` + sufijo) se resuelven en bloque con
+  ``AsignadorUsernames``: una consulta por base distinta en toda la
+  importación, no una por candidato;
+- las contraseñas propias de cada fila se hashean en paralelo; las filas
+  sin contraseña comparten un único hash (o quedan con una contraseña
+  inutilizable hasta que un administrador la asigne);
+- User, PerfilUsuario, grupo, Paciente y ClaveBusqueda se insertan con
+  ``bulk_create`` en una transacción, sin disparar las señales post_save.
+
+Los errores se informan por fila (línea del archivo): una fila inválida no
+impide que se importen las demás.
+"""
+import csv
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, transaction
+
+from autenticacion.models import PerfilUsuario
+from autenticacion.usernames import AsignadorUsernames, base_de_username
+from .models import ClaveBusqueda, Paciente
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'ndjson')
+COLUMNAS = ('nombre', 'dni', 'telefono', 'direccion', 'fecha_nacimiento', 'password')
+FORMATO_DNI = re.compile(r'^\d{3}-\d{6}-\d{4}[A-Z]?$')
+TAMANO_LOTE = 1000
+REINTENTOS = 3
+
+
+def formato_de_archivo(nombre):
+    """``'csv'`` o ``'ndjson'`` según la extensión, o None."""
+    extension = os.path.splitext(nombre or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return None
+
+
+def leer_filas(texto, formato):
+    """
+    Genera ``(linea, fila)`` desde un archivo de texto. ``fila`` es un dict, o
+    un ``str`` con el error si la línea no se pudo leer.
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(texto)
+        faltantes = [c for c in ('nombre', 'dni', 'telefono', 'direccion') if c not in (lector.fieldnames or [])]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+
+    for linea, contenido in enumerate(texto, start=1):
+        if not contenido.strip():
+            continue
+        try:
+            fila = json.loads(contenido)
+        except ValueError:
+            yield linea, 'JSON inválido'
+            continue
+        yield linea, fila if isinstance(fila, dict) else 'Se esperaba un objeto'
+
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def validar_fila(fila):
+    """Devuelve ``(datos, errores)``; ``errores`` es un dict campo → mensaje."""
+    errores = {}
+    datos = {campo: _texto(fila, campo) for campo in COLUMNAS}
+
+    for campo in ('nombre', 'dni', 'telefono', 'direccion'):
+        if not datos[campo]:
+            errores[campo] = 'Este campo es requerido.'
+
+    if datos['dni'] and not FORMATO_DNI.match(datos['dni']):
+        errores['dni'] = 'Formato de DNI inválido. Use: 000-000000-0000A'
+    if len(datos['telefono']) > 20:
+        errores['telefono'] = 'Asegúrese de que este campo no tenga más de 20 caracteres.'
+
+    nombres = datos['nombre'].split()
+    if any(len(parte) > 150 for parte in (nombres[0] if nombres else '', ' '.join(nombres[1:]))):
+        errores['nombre'] = 'El nombre es demasiado largo.'
+
+    if datos['fecha_nacimiento']:
+        try:
+            datos['fecha_nacimiento'] = date.fromisoformat(datos['fecha_nacimiento'])
+        except ValueError:
+            errores['fecha_nacimiento'] = 'Formato de fecha inválido. Use: AAAA-MM-DD'
+    else:
+        datos['fecha_nacimiento'] = None
+
+    if datos['password'] and len(datos['password']) < 6:
+        errores['password'] = 'Asegúrese de que este campo tenga al menos 6 caracteres.'
+
+    return datos, errores
+
+
+class Importacion:
+    """
+    Importa filas por lotes y acumula el resumen. Uso::
+
+        importacion = Importacion(password_inicial='...')
+        importacion.importar(leer_filas(archivo, 'csv'))
+        importacion.resumen()
+    """
+
+    def __init__(self, password_inicial=None, tamano_lote=TAMANO_LOTE, al_terminar_lote=None):
+        self.tamano_lote = tamano_lote
+        self.al_terminar_lote = al_terminar_lote
+        # Un solo hash (PBKDF2) para todas las filas sin contraseña propia
+        self.hash_compartido = make_password(password_inicial) if password_inicial else None
+        self.grupo = Group.objects.get_or_create(name='paciente')[0]
+        self.dnis_vistos = set()
+        self.usernames = AsignadorUsernames()
+        self.filas = 0
+        self.creados = 0
+        self.errores = []
+
+    def importar(self, filas):
+        lote = []
+        for linea, fila in filas:
+            self.filas += 1
+            if isinstance(fila, str):
+                self._error(linea, None, {'non_field_errors': fila})
+                continue
+            lote.append((linea, fila))
+            if len(lote) >= self.tamano_lote:
+                self._procesar_lote(lote)
+                lote = []
+        if lote:
+            self._procesar_lote(lote)
+        return self.resumen()
+
+    def resumen(self):
+        return {
+            'filas': self.filas,
+            'creados': self.creados,
+            'con_errores': len(self.errores),
+            'errores': sorted(self.errores, key=lambda error: error['fila']),
+        }
+
+    def _error(self, linea, dni, errores):
+        self.errores.append({'fila': linea, 'dni': dni, 'errores': errores})
+
+    # ==================== LOTE ====================
+
+    def _procesar_lote(self, lote):
+        validas = []
+        for linea, fila in lote:
+            datos, errores = validar_fila(fila)
+            if not errores and datos['dni'] in self.dnis_vistos:
+                errores = {'dni': 'DNI repetido en el archivo.'}
+            if errores:
+                self._error(linea, datos['dni'] or None, errores)
+                continue
+            self.dnis_vistos.add(datos['dni'])
+            validas.append((linea, datos))
+
+        hashes = self._hashes([datos for _, datos in validas])
+
+        for intento in range(1, REINTENTOS + 1):
+            try:
+                creados, rechazadas = self._insertar(validas, hashes)
+                break
+            except IntegrityError as e:
+                # Otra petición registró el mismo DNI o username entre la
+                # validación y el INSERT: se vuelve a resolver el lote.
+                self.usernames.olvidar()
+                logger.warning(f"⚠️ Conflicto importando lote (intento {intento}): {str(e)}")
+        else:
+            for linea, datos in validas:
+                self._error(linea, datos['dni'], {'non_field_errors': 'Conflicto al guardar; reintente la importación.'})
+            creados, rechazadas = 0, []
+
+        for linea, dni, errores in rechazadas:
+            self._error(linea, dni, errores)
+        self.creados += creados
+        logger.info(f"✅ Lote importado: {creados} pacientes de {len(lote)} filas")
+        if self.al_terminar_lote:
+            self.al_terminar_lote(self)
+
+    def _hashes(self, filas):
+        """Hash de cada fila: el propio (en paralelo), el compartido o uno inutilizable."""
+        propias = [datos['password'] for datos in filas if datos['password']]
+        if propias:
+            # hashlib.pbkdf2_hmac libera el GIL: los hilos usan todos los núcleos
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as hilos:
+                calculados = iter(list(hilos.map(make_password, propias)))
+        hashes = []
+        for datos in filas:
+            if datos['password']:
+                hashes.append(next(calculados))
+            else:
+                hashes.append(self.hash_compartido or make_password(None))
+        return hashes
+
+    def _insertar(self, validas, hashes):
+        """Inserta el lote; devuelve ``(creados, rechazadas)``."""
+        existentes = set(
+            Paciente.objects.filter(dni__in=[datos['dni'] for _, datos in validas]).values_list('dni', flat=True)
+        )
+        filas = []
+        rechazadas = []
+        for (linea, datos), hash_password in zip(validas, hashes):
+            if datos['dni'] in existentes:
+                rechazadas.append((linea, datos['dni'], {'dni': 'Ya existe un paciente con este DNI.'}))
+                continue
+            filas.append((datos, hash_password))
+        if not filas:
+            return 0, rechazadas
+
+        usernames = self.usernames.asignar([base_de_username(datos['nombre']) for datos, _ in filas])
+
+        with transaction.atomic():
+            usuarios = []
+            for (datos, hash_password), username in zip(filas, usernames):
+                nombres = datos['nombre'].split()
+                usuarios.append(User(
+                    username=username,
+                    email=f'{username}@clinica.com',
+                    first_name=nombres[0],
+                    last_name=' '.join(nombres[1:]),
+                    password=hash_password,
+                ))
+            usuarios = User.objects.bulk_create(usuarios)
+            PerfilUsuario.objects.bulk_create(
+                [PerfilUsuario(user_id=u.id, tipo_usuario='paciente') for u in usuarios]
+            )
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=u.id, group_id=self.grupo.id) for u in usuarios]
+            )
+            pacientes = Paciente.objects.bulk_create([
+                Paciente(
+                    user_id=u.id,
+                    dni=datos['dni'],
+                    telefono=datos['telefono'],
+                    direccion=datos['direccion'],
+                    fecha_nacimiento=datos['fecha_nacimiento'],
+                )
+                for u, (datos, _) in zip(usuarios, filas)
+            ])
+            # bulk_create no pasa por Paciente.save(): claves de búsqueda a mano
+            ClaveBusqueda.objects.bulk_create([
+                clave
+                for paciente, u in zip(pacientes, usuarios)
+                for clave in ClaveBusqueda.para_paciente(
+                    paciente.id, paciente.dni, paciente.telefono, u.first_name, u.last_name,
+                )
+            ])
+        return len(pacientes), rechazadas
@@ -0,0 +1,60 @@
+# pacientes/management/commands/importar_pacientes.py
+import json
+import time as reloj
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.importacion import FORMATOS, TAMANO_LOTE, Importacion, formato_de_archivo, leer_filas
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa pacientes desde un CSV (columnas nombre, dni, telefono, '
+        'direccion y opcionalmente fecha_nacimiento y password) o NDJSON '
+        '(un objeto por línea con las mismas claves). Los errores se '
+        'informan por fila y no detienen la importación.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto, según la extensión')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por lote')
+        parser.add_argument(
+            '--password-inicial',
+            help='Contraseña para las filas sin password; sin ella quedan con una contraseña inutilizable',
+        )
+        parser.add_argument('--errores', help='Escribe los errores por fila (NDJSON) en este archivo')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_de_archivo(options['archivo'])
+        if formato is None:
+            raise CommandError('No se reconoce el formato; use --formato csv|ndjson')
+
+        inicio = reloj.perf_counter()
+        importacion = Importacion(
+            password_inicial=options['password_inicial'],
+            tamano_lote=options['lote'],
+            al_terminar_lote=self._progreso,
+        )
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as texto:
+                resumen = importacion.importar(leer_filas(texto, formato))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['errores']:
+            with open(options['errores'], 'w', encoding='utf-8') as salida:
+                for error in resumen['errores']:
+                    salida.write(json.dumps(error, ensure_ascii=False) + '\n')
+        else:
+            for error in resumen['errores'][:20]:
+                self.stdout.write(self.style.WARNING(f"Fila {error['fila']}: {error['errores']}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resumen['creados']} pacientes importados de {resumen['filas']} filas "
+            f"({resumen['con_errores']} con errores) en {reloj.perf_counter() - inicio:.1f}s"
+        ))
+
+    def _progreso(self, importacion):
+        self.stdout.write(f'  Filas: {importacion.filas} ({importacion.creados} importadas)')
+        self.stdout.flush()
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_claves(apps, schema_editor):
+    from pacientes.busqueda import claves_busqueda
+
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    ClaveBusqueda = apps.get_model('pacientes', 'ClaveBusqueda')
+    filas = []
+    for paciente in Paciente.objects.select_related('user').iterator(chunk_size=2000):
+        user = paciente.user
+        filas.extend(
+            ClaveBusqueda(paciente_id=paciente.id, clave=clave)
+            for clave in claves_busqueda(
+                paciente.dni, paciente.telefono,
+                user.first_name if user else '', user.last_name if user else '',
+            )
+        )
+        if len(filas) >= 5000:
+            ClaveBusqueda.objects.bulk_create(filas)
+            filas = []
+    ClaveBusqueda.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=150)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claves_busqueda', to='pacientes.paciente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['clave', 'paciente'], name='paciente_clave_busqueda_idx')],
+            },
+        ),
+        migrations.RunPython(crear_claves, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User, Group
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from autenticacion.identidad import invalidar_identidad
+from autenticacion.models import cambio_nombre
+from .busqueda import LARGO_CLAVE, claves_busqueda
 
 class Paciente(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -14,11 +18,45 @@ class Paciente(models.Model):
 
     def __str__(self):
         return f"{self.dni} - {self.user.username if self.user else 'Sin Usuario'}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.guardar_claves_busqueda()
+    
+    def guardar_claves_busqueda(self, user=None):
+        """Regenera las claves de /api/pacientes/?q= (ver pacientes/busqueda.py)."""
+        user = user or self.user
+        ClaveBusqueda.objects.filter(paciente_id=self.pk).delete()
+        ClaveBusqueda.objects.bulk_create(ClaveBusqueda.para_paciente(
+            self.pk, self.dni, self.telefono,
+            user.first_name if user else '', user.last_name if user else '',
+        ))
+
+class ClaveBusqueda(models.Model):
+    """Clave normalizada (DNI, teléfono o nombre) de un paciente para la búsqueda."""
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='claves_busqueda')
+    clave = models.CharField(max_length=LARGO_CLAVE)
+    
+    class Meta:
+        indexes = [
+            # Prefijo como rango sobre clave, ya en el orden de la paginación
+            models.Index(fields=['clave', 'paciente'], name='paciente_clave_busqueda_idx'),
+        ]
+    
+    @classmethod
+    def para_paciente(cls, paciente_id, dni, telefono, first_name, last_name):
+        """Filas sin guardar, para ``bulk_create``."""
+        return [
+            cls(paciente_id=paciente_id, clave=clave)
+            for clave in claves_busqueda(dni, telefono, first_name, last_name)
+        ]
 
 @receiver(post_save, sender=Paciente)
 def crear_usuario_paciente(sender, instance, created, **kwargs):
     """Crear usuario automáticamente cuando se crea un paciente sin usuario"""
     
+    invalidar_identidad(instance.user_id)
+    
     if created and not instance.user:
         username = f"paciente_{instance.dni}"
         username = username.replace(' ', '').replace('-', '') 
@@ -53,4 +91,20 @@ def crear_usuario_paciente(sender, instance, created, **kwargs):
 def eliminar_usuario_paciente(sender, instance, **kwargs):
     """Eliminar usuario cuando se elimina un paciente"""
     if instance.user:
-        instance.user.delete()
\ No newline at end of file
+        instance.user.delete()
+
+@receiver(post_delete, sender=Paciente)
+def invalidar_identidad_paciente(sender, instance, **kwargs):
+    invalidar_identidad(instance.user_id)
+
+@receiver(post_save, sender=User)
+def tocar_paciente_usuario(sender, instance, created, **kwargs):
+    """
+    El nombre del usuario se muestra en el paciente: cambia su ETag (ver
+    citas_medicas/condicionales.py) y sus claves de búsqueda.
+    """
+    if not cambio_nombre(instance, created):
+        return
+    if Paciente.objects.filter(user_id=instance.pk).update(actualizado_en=timezone.now()):
+        for paciente in Paciente.objects.filter(user_id=instance.pk).only('id', 'dni', 'telefono'):
+            paciente.guardar_claves_busqueda(user=instance)
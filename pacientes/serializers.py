@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Paciente
-from django.contrib.auth.models import User
+from autenticacion.credenciales import olvidar_credenciales
+from autenticacion.usernames import base_de_username, crear_usuario
 import re
 
 class PacienteSerializer(serializers.ModelSerializer):
@@ -48,27 +49,15 @@ class PacienteSerializer(serializers.ModelSerializer):
         password = validated_data.pop('password')
         validated_data.pop('confirm_password')
         
-        nombres = nombre.split(' ')
-        if len(nombres) >= 2:
-            base_username = f"{nombres[0].lower()}.{nombres[1].lower()}"
-        else:
-            base_username = nombres[0].lower()
-        
-        username = base_username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        
-        user = User.objects.create_user(
-            username=username,
+        # Siguiente username libre en una consulta (ver autenticacion/usernames.py)
+        user = crear_usuario(
+            base_de_username(nombre),
             password=password,
             first_name=nombre.split(' ')[0] if ' ' in nombre else nombre,
-            last_name=nombre.split(' ')[1] if ' ' in nombre else '',
-            email=f"{username}@clinica.com"
+            last_name=nombre.split(' ')[1] if ' ' in nombre else ''
         )
         
-        paciente = Paciente.objects.create(user=user, **validated_data)
+        paciente = Paciente.objects.create(user=user, dni=dni, **validated_data)
         
         from autenticacion.models import PerfilUsuario
         if hasattr(user, 'perfil'):
@@ -89,6 +78,7 @@ class PacienteSerializer(serializers.ModelSerializer):
             user = instance.user
             user.set_password(password)
             user.save()
+            olvidar_credenciales(user.get_username())
         
         if nombre:
             user = instance.user
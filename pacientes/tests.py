@@ -1,3 +1,240 @@
+# pacientes/tests.py
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from citas.tests import crear_usuario
+
+from .models import ClaveBusqueda, Paciente
+
+ENCABEZADO = 'nombre,dni,telefono,direccion,fecha_nacimiento\n'
+
+
+def crear_paciente(username, first_name, last_name, dni, telefono=''):
+    user = crear_usuario(username, 'paciente')
+    user.first_name, user.last_name = first_name, last_name
+    user.save()
+    return Paciente.objects.create(user=user, dni=dni, telefono=telefono)
+
+
+class PacientesTestCase(TestCase):
+    """La identidad de cada usuario se cachea: cada prueba empieza con la caché vacía."""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+
+class ImportacionTests(PacientesTestCase):
+    """``POST /api/pacientes/importar/`` (ver pacientes/importacion.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = APIClient()
+        self.admin.force_authenticate(crear_usuario('admin', 'admin', is_staff=True))
+        self.existente = Paciente.objects.create(
+            user=crear_usuario('existente', 'paciente'), dni='001-000000-0000A',
+        )
+
+    def importar(self, contenido, nombre='pacientes.csv', cliente=None):
+        archivo = SimpleUploadedFile(nombre, contenido.encode('utf-8'))
+        return (cliente or self.admin).post('/api/pacientes/importar/', {'archivo': archivo}, format='multipart')
+
+    def test_filas_validas_e_invalidas(self):
+        respuesta = self.importar(ENCABEZADO + (
+            'Ana Pérez,001-010190-0001A,8888-1111,Managua,1990-01-01\n'
+            'Sin Dni,,8888,León,\n'
+            'Mal Formato,123,8888,León,\n'
+            'Fecha Mala,001-010190-0002A,8888,León,1990-13-01\n'
+            ',001-010190-0003A,,León,\n'
+            'Luis Gómez,001-010190-0004A,8888-2222,Granada,\n'
+        ))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            (respuesta.data['filas'], respuesta.data['creados'], respuesta.data['con_errores']), (6, 2, 4),
+        )
+        errores = {error['fila']: error['errores'] for error in respuesta.data['errores']}
+        self.assertEqual(sorted(errores), [3, 4, 5, 6])
+        self.assertEqual(list(errores[3]), ['dni'])
+        self.assertIn('Formato de DNI', errores[4]['dni'])
+        self.assertEqual(list(errores[5]), ['fecha_nacimiento'])
+        self.assertEqual(set(errores[6]), {'nombre', 'telefono'})
+        self.assertTrue(Paciente.objects.filter(dni='001-010190-0004A', user__username='luis.gómez').exists())
+
+    def test_dni_existente_y_repetido_en_el_archivo(self):
+        respuesta = self.importar(ENCABEZADO + (
+            'Ana Pérez,001-000000-0000A,8888,Managua,\n'
+            'Ana Pérez,001-010190-0001A,8888,Managua,\n'
+            'Otra Ana,001-010190-0001A,8888,Managua,\n'
+        ))
+
+        self.assertEqual(respuesta.data['creados'], 1)
+        self.assertEqual(
+            [(error['fila'], error['dni'], error['errores']['dni']) for error in respuesta.data['errores']],
+            [
+                (2, '001-000000-0000A', 'Ya existe un paciente con este DNI.'),
+                (4, '001-010190-0001A', 'DNI repetido en el archivo.'),
+            ],
+        )
+        self.assertEqual(Paciente.objects.get(dni='001-000000-0000A'), self.existente)
+
+    def test_usernames_repetidos_en_un_lote(self):
+        User.objects.create_user('luis.gomez', password='x')
+
+        self.importar(ENCABEZADO + ''.join(
+            f'{nombre},001-010190-000{i}A,8888,Managua,\n'
+            for i, nombre in enumerate(['Maria Lopez', 'Maria Lopez', 'Luis Gomez', 'Maria Lopez Ruiz'])
+        ))
+
+        self.assertEqual(
+            list(Paciente.objects.filter(dni__startswith='001-010190').order_by('dni').values_list(
+                'user__username', flat=True,
+            )),
+            ['maria.lopez', 'maria.lopez1', 'luis.gomez1', 'maria.lopez2'],
+        )
+
+    def test_claves_de_busqueda_y_perfil(self):
+        self.importar(ENCABEZADO + 'María López,001-010190-0001A,8888-1111,Managua,\n')
+
+        paciente = Paciente.objects.select_related('user__perfil').get(dni='001-010190-0001A')
+        self.assertEqual(
+            set(ClaveBusqueda.objects.filter(paciente=paciente).values_list('clave', flat=True)),
+            {'0010101900001a', '88881111', 'marialopez', 'lopezmaria'},
+        )
+        self.assertEqual(paciente.user.perfil.tipo_usuario, 'paciente')
+        self.assertTrue(paciente.user.groups.filter(name='paciente').exists())
+        self.assertFalse(paciente.user.has_usable_password())
+
+    def test_ndjson_con_lineas_invalidas(self):
+        lineas = [
+            json.dumps({'nombre': 'Ana Pérez', 'dni': '001-010190-0001A', 'telefono': '8888', 'direccion': 'León'}),
+            '{roto',
+            '',
+            '[1, 2]',
+        ]
+
+        respuesta = self.importar('\n'.join(lineas) + '\n', nombre='pacientes.ndjson')
+
+        self.assertEqual(respuesta.data['creados'], 1)
+        self.assertEqual(
+            [(error['fila'], error['errores']) for error in respuesta.data['errores']],
+            [(2, {'non_field_errors': 'JSON inválido'}), (4, {'non_field_errors': 'Se esperaba un objeto'})],
+        )
+
+    def test_columnas_faltantes(self):
+        respuesta = self.importar('nombre,dni\nAna Pérez,001-010190-0001A\n')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('telefono', respuesta.data['error'])
+
+    def test_solo_administradores(self):
+        paciente = APIClient()
+        paciente.force_authenticate(self.existente.user)
+        contenido = ENCABEZADO + 'Ana Pérez,001-010190-0001A,8888,Managua,\n'
+
+        self.assertEqual(self.importar(contenido, cliente=paciente).status_code, 403)
+        self.assertIn(self.importar(contenido, cliente=APIClient()).status_code, (401, 403))
+        self.assertFalse(Paciente.objects.filter(dni='001-010190-0001A').exists())
+
+
+class BusquedaTests(PacientesTestCase):
+    """``GET /api/pacientes/?q=`` por prefijo de las claves (ver pacientes/busqueda.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.maria = crear_paciente('maria', 'María', 'López', '001-010190-0001A', '8888-1234')
+        self.mario = crear_paciente('mario', 'Mario', 'Núñez', '002-020290-0002B', '7777-0000')
+        self.luis = crear_paciente('luis', 'Luis', 'Mármol', '001-030390-0003C', '8888-9999')
+        self.admin = APIClient()
+        self.admin.force_authenticate(crear_usuario('admin', 'admin', is_staff=True))
+
+    def buscar(self, texto, cliente=None):
+        respuesta = (cliente or self.admin).get('/api/pacientes/', {'q': texto})
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return [paciente['id'] for paciente in respuesta.data['results']]
+
+    def test_nombre_y_apellido(self):
+        self.assertEqual(self.buscar('María Ló'), [self.maria.id])
+        self.assertEqual(self.buscar('mari'), [self.maria.id, self.mario.id])
+        self.assertEqual(self.buscar('López Mar'), [self.maria.id])
+        self.assertEqual(self.buscar('marmol luis'), [self.luis.id])
+
+    def test_sin_tildes(self):
+        self.assertEqual(self.buscar('maria'), [self.maria.id])
+        self.assertEqual(self.buscar('NUNEZ'), [self.mario.id])
+        self.assertEqual(self.buscar('ñúñ'), [self.mario.id])
+
+    def test_dni_y_telefono(self):
+        self.assertEqual(self.buscar('001-0'), [self.maria.id, self.luis.id])
+        self.assertEqual(self.buscar('0010303'), [self.luis.id])
+        self.assertEqual(self.buscar('8888-12'), [self.maria.id])
+        self.assertEqual(self.buscar('8888'), [self.maria.id, self.luis.id])
+
+    def test_un_paciente_por_resultado(self):
+        # Ana Ana coincide por nombre+apellido y apellido+nombre: una sola clave
+        ana = crear_paciente('ana', 'Ana', 'Ana', '003-000000-0000A')
+        otra = crear_paciente('ana2', 'Ana', 'Anaya', '003-000000-0001A')
+
+        self.assertEqual(self.buscar('anaana'), [ana.id, otra.id])
+
+    def test_busqueda_demasiado_corta(self):
+        for texto in ('', 'a', ' é ', '-!-'):
+            with self.subTest(texto=texto):
+                respuesta = self.admin.get('/api/pacientes/', {'q': texto})
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn('al menos 2', respuesta.data['error'])
+        self.assertEqual(self.admin.get('/api/pacientes/', {'q': 'x' * 101}).status_code, 400)
+
+    def test_paciente_solo_se_encuentra_a_si_mismo(self):
+        paciente = APIClient()
+        paciente.force_authenticate(self.maria.user)
+
+        self.assertEqual(self.buscar('mar', cliente=paciente), [self.maria.id])
+        self.assertEqual(self.buscar('luis', cliente=paciente), [])
+        self.assertEqual(self.buscar('001-0', cliente=paciente), [self.maria.id])
+
+    def test_claves_regeneradas_al_cambiar_el_nombre(self):
+        user = self.maria.user
+        user.last_name = 'Zelaya'
+        user.save()
+
+        self.assertEqual(self.buscar('marialo'), [])
+        self.assertEqual(self.buscar('zelaya'), [self.maria.id])
+
+        self.maria.telefono = '5555-0000'
+        self.maria.save()
+        self.assertEqual(self.buscar('5555'), [self.maria.id])
+        self.assertEqual(self.buscar('88881'), [])
+
+
+class StreamingTests(PacientesTestCase):
+    """``GET /api/pacientes/?stream=`` (ver citas_medicas/streaming.py)."""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            crear_paciente(f'paciente{i}', 'Ñoño', f'Pérez {i}', f'001-010190-000{i}A', '8888')
+        self.admin = APIClient()
+        self.admin.force_authenticate(crear_usuario('admin', 'admin', is_staff=True))
+
+    def test_igual_al_listado(self):
+        normal = self.admin.get('/api/pacientes/')
+        esperado = sorted(json.loads(normal.content), key=lambda p: p['id'])
+
+        arreglo = self.admin.get('/api/pacientes/', {'stream': '1'})
+        ndjson = self.admin.get('/api/pacientes/', {'stream': 'ndjson'})
 
-# Create your tests here.
+        self.assertEqual(arreglo['Content-Type'], 'application/json')
+        self.assertEqual(ndjson['Content-Type'], 'application/x-ndjson')
+        cuerpo = b''.join(arreglo.streaming_content)
+        self.assertIn('Ñoño'.encode('utf-8'), cuerpo)
+        self.assertEqual(sorted(json.loads(cuerpo), key=lambda p: p['id']), esperado)
+        lineas = b''.join(ndjson.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(sorted(map(json.loads, lineas), key=lambda p: p['id']), esperado)
@@ -1,36 +1,62 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework.settings import api_settings
 from django.db import transaction
+import io
 import logging
+from autenticacion.autenticacion import AutenticacionPorVista
+from autenticacion.identidad import obtener_identidad
+from citas_medicas.condicionales import (
+    agregar_validadores, calcular_etag, condicional_detalle, condicional_lista, no_modificado,
+)
+from citas_medicas.paginacion import PaginacionCursorCompuesto
+from citas_medicas.streaming import NDJSONRenderer, modo_streaming, representar_en_lotes, respuesta_streaming
+from .busqueda import buscar_claves
+from .importacion import FORMATOS, Importacion, formato_de_archivo, leer_filas
 from .models import Paciente
 from .serializers import PacienteSerializer
 
 logger = logging.getLogger(__name__)
 
+class BusquedaCursorPagination(PaginacionCursorCompuesto):
+    # Debe coincidir con el índice paciente_clave_busqueda_idx
+    ordering = ('clave', 'paciente_id')
+    page_size = 20
+    max_page_size = 100
+    
+    def solicitada(self, request):
+        # Las búsquedas siempre se paginan
+        return True
+
 class PermisoPacientes(BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
         
-        return hasattr(request.user, 'perfil')
+        return obtener_identidad(request).tiene_perfil
     
     def has_object_permission(self, request, view, obj):
         if not request.user.is_authenticated:
             return False
         
-        if request.user.perfil.tipo_usuario == 'admin':
+        identidad = obtener_identidad(request)
+        
+        if identidad.es_admin:
             return True
         
-        if request.user.perfil.tipo_usuario == 'paciente':
-            return obj.user == request.user
+        if identidad.es_paciente:
+            return obj.id == identidad.paciente_id
         
         return False
 
-class PacienteViewSet(viewsets.ModelViewSet):
+class PacienteViewSet(AutenticacionPorVista, viewsets.ModelViewSet):
     serializer_class = PacienteSerializer
     permission_classes = [IsAuthenticated, PermisoPacientes]
     
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+    
     queryset = Paciente.objects.all()
     
     def get_queryset(self):
@@ -39,35 +65,50 @@ class PacienteViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return Paciente.objects.none()
         
-        if hasattr(user, 'perfil') and user.perfil.tipo_usuario == 'admin':
+        identidad = obtener_identidad(self.request)
+        
+        if identidad.es_admin:
             return Paciente.objects.all().select_related('user')
         
-        if hasattr(user, 'perfil') and user.perfil.tipo_usuario == 'paciente':
-            try:
-                return Paciente.objects.filter(user=user).select_related('user')
-            except Paciente.DoesNotExist:
-                return Paciente.objects.none()
+        if identidad.es_paciente and identidad.paciente_id is not None:
+            return Paciente.objects.filter(id=identidad.paciente_id).select_related('user')
         
         return Paciente.objects.none()
     
     def list(self, request, *args, **kwargs):
         try:
-            logger.info(f"📋 LIST pacientes solicitado por {request.user.username} ({request.user.perfil.tipo_usuario})")
-            
-            if request.user.perfil.tipo_usuario == 'paciente':
-                try:
-                    paciente = Paciente.objects.get(user=request.user)
-                    serializer = self.get_serializer(paciente)
-                    logger.info(f"👤 Paciente viendo su propio perfil - ID: {paciente.id}")
-                    return Response([serializer.data])
-                except Paciente.DoesNotExist:
+            identidad = obtener_identidad(request)
+            logger.info(f"📋 LIST pacientes solicitado por {request.user.username} ({identidad.tipo_usuario})")
+            
+            texto = request.query_params.get('q')
+            if texto is not None:
+                return self._buscar(request, identidad, texto)
+            
+            no_modificado, etag, ultima = condicional_lista(request, self.get_queryset())
+            if no_modificado:
+                logger.info(f"✅ Pacientes sin cambios (304) para {identidad.tipo_usuario}")
+                return no_modificado
+            
+            modo = modo_streaming(request)
+            if modo:
+                logger.info(f"📡 Enviando pacientes en streaming ({modo}) para {identidad.tipo_usuario}")
+                filas = representar_en_lotes(self.get_serializer_class(), self.get_queryset(), self.get_serializer_context())
+                return agregar_validadores(respuesta_streaming(filas, modo), etag, ultima)
+            
+            if identidad.es_paciente:
+                paciente = self.get_queryset().first()
+                if paciente is None:
                     logger.warning(f"⚠️ Paciente {request.user.username} no tiene perfil de paciente")
                     return Response([], status=status.HTTP_200_OK)
+                
+                serializer = self.get_serializer(paciente)
+                logger.info(f"👤 Paciente viendo su propio perfil - ID: {paciente.id}")
+                return agregar_validadores(Response([serializer.data]), etag, ultima)
             
             pacientes = self.get_queryset()
             serializer = self.get_serializer(pacientes, many=True)
             logger.info(f"✅ Retornando {len(serializer.data)} pacientes para admin")
-            return Response(serializer.data)
+            return agregar_validadores(Response(serializer.data), etag, ultima)
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo pacientes: {str(e)}")
@@ -76,11 +117,91 @@ class PacienteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['post'], url_path='importar')
+    def importar(self, request):
+        """
+        Importación masiva (multipart): ``archivo`` CSV o NDJSON y, opcional,
+        ``password_inicial`` para las filas sin password. Ver pacientes/importacion.py.
+        """
+        try:
+            if not obtener_identidad(request).es_admin:
+                return Response(
+                    {'error': 'Solo los administradores pueden importar pacientes'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            
+            archivo = request.FILES.get('archivo')
+            if archivo is None:
+                return Response({'error': 'Envíe el archivo en el campo "archivo"'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            formato = request.query_params.get('formato') or formato_de_archivo(archivo.name)
+            if formato not in FORMATOS:
+                return Response(
+                    {'error': f"Formato no reconocido. Use ?formato={'|'.join(FORMATOS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            logger.info(f"📥 IMPORTAR pacientes ({formato}, {archivo.size} bytes) solicitado por {request.user.username}")
+            
+            importacion = Importacion(password_inicial=request.data.get('password_inicial') or None)
+            texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            try:
+                resumen = importacion.importar(leer_filas(texto, formato))
+            except (ValueError, UnicodeDecodeError) as e:
+                resumen = importacion.resumen()
+                resumen['error'] = str(e)
+                return Response(resumen, status=status.HTTP_400_BAD_REQUEST)
+            
+            logger.info(f"✅ Importados {resumen['creados']} de {resumen['filas']} pacientes")
+            return Response(resumen)
+            
+        except Exception as e:
+            logger.error(f"❌ Error importando pacientes: {str(e)}")
+            return Response(
+                {'error': f'Error al importar pacientes: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def _buscar(self, request, identidad, texto):
+        """
+        ``?q=``: página de pacientes en el orden de la clave que coincidió
+        (ver pacientes/busqueda.py). El ETag sale de las filas de la página,
+        sin contar todos los resultados.
+        """
+        try:
+            claves = buscar_claves(texto, None if identidad.es_admin else self.get_queryset())
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        paginador = BusquedaCursorPagination()
+        pagina = paginador.paginate_queryset(claves, request, view=self)
+        # Un paciente puede coincidir por más de una clave
+        pacientes = list({clave.paciente_id: clave.paciente for clave in pagina}.values())
+        
+        ultima = max((p.actualizado_en for p in pacientes if p.actualizado_en), default=None)
+        etag = calcular_etag(request, paginador.hay_siguiente, *(
+            f"{p.id}:{p.actualizado_en.isoformat() if p.actualizado_en else ''}" for p in pacientes
+        ))
+        no_mod = no_modificado(request, etag, ultima, solo_etag=True)
+        if no_mod:
+            return no_mod
+        
+        serializer = self.get_serializer(pacientes, many=True)
+        logger.info(f"🔎 Búsqueda {texto!r}: {len(pacientes)} pacientes para {identidad.tipo_usuario}")
+        return agregar_validadores(paginador.get_paginated_response(serializer.data), etag, ultima)
+
     def retrieve(self, request, *args, **kwargs):
         try:
+            no_modificado, etag, ultima = condicional_detalle(request, self.get_queryset(), kwargs.get('pk'))
+            if no_modificado:
+                return no_modificado
+            
             instance = self.get_object()
             serializer = self.get_serializer(instance)
-            return Response(serializer.data)
+            respuesta = Response(serializer.data)
+            if etag:
+                agregar_validadores(respuesta, etag, ultima)
+            return respuesta
         except Exception as e:
             logger.error(f"❌ Error obteniendo paciente: {str(e)}")
             return Response(
@@ -92,7 +213,7 @@ class PacienteViewSet(viewsets.ModelViewSet):
         try:
             logger.info(f"➕ CREATE paciente solicitado por {request.user.username}")
             
-            if not hasattr(request.user, 'perfil') or request.user.perfil.tipo_usuario != 'admin':
+            if not obtener_identidad(request).es_admin:
                 return Response(
                     {'error': 'Solo los administradores pueden crear pacientes'},
                     status=status.HTTP_403_FORBIDDEN
@@ -140,7 +261,7 @@ class PacienteViewSet(viewsets.ModelViewSet):
             instance = self.get_object()
             logger.info(f"🗑️ DELETE paciente {instance.id} solicitado por {request.user.username}")
             
-            if not hasattr(request.user, 'perfil') or request.user.perfil.tipo_usuario != 'admin':
+            if not obtener_identidad(request).es_admin:
                 return Response(
                     {'error': 'Solo los administradores pueden eliminar pacientes'},
                     status=status.HTTP_403_FORBIDDEN